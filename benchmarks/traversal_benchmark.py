@@ -0,0 +1,99 @@
+"""
+Files visited by the note scanner before and after the shared traversal.
+
+Builds a synthetic vault (notes plus a .git folder, Logseq backups and
+version files, node_modules and a trash folder, all of a realistic relative
+size) and compares the old rglob('*') listing with Traversal.walk:
+entries visited, note files returned and wall time.
+
+    python -m benchmarks.traversal_benchmark [--notes 2000] [--path DIR]
+
+With --path the given folder is measured instead of a synthetic one.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from src.utils.readers import is_supported, is_supported_name
+from src.utils.traversal import Traversal
+
+
+def build_vault(root: Path, notes: int) -> None:
+    for i in range(notes):
+        folder = root / f"area-{i % 20}"
+        folder.mkdir(exist_ok=True)
+        (folder / f"note-{i}.md").write_text(f"# Note {i}\n\nSome text.\n", encoding='utf-8')
+    
+    # Noise in the proportions of a few years of use.
+    for i in range(notes * 3):
+        folder = root / ".git" / "objects" / f"{i % 256:02x}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"{i:038x}").write_bytes(b"x")
+    for i in range(notes):
+        folder = root / "logseq" / "bak" / "pages" / f"note-{i}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / "2024-01-01T00_00_00.000Z.Desktop.md").write_text("old\n", encoding='utf-8')
+    for i in range(notes // 2):
+        folder = root / "logseq" / "version-files" / "base"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"page-{i}.md").write_text("old\n", encoding='utf-8')
+    for i in range(notes * 2):
+        folder = root / "node_modules" / f"pkg-{i % 100}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"README-{i}.md").write_text("readme\n", encoding='utf-8')
+    for i in range(notes // 4):
+        folder = root / ".recycle"
+        folder.mkdir(exist_ok=True)
+        (folder / f"deleted-{i}.md").write_text("gone\n", encoding='utf-8')
+
+
+def measure_rglob(root: Path):
+    started = time.perf_counter()
+    visited = 0
+    files = 0
+    for path in root.rglob('*'):
+        visited += 1
+        if is_supported(path) and path.is_file():
+            files += 1
+    return visited, files, time.perf_counter() - started
+
+
+def measure_traversal(root: Path):
+    started = time.perf_counter()
+    counts = {}
+    files = sum(1 for _ in Traversal().walk(root, accept=is_supported_name, counts=counts))
+    # Entries read: the files yielded or ignored, plus every directory looked at.
+    visited = counts['files'] + counts['ignored_files'] + counts['directories'] + counts['pruned_directories']
+    return visited, files, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=2000, help="Notes in the synthetic vault")
+    parser.add_argument('--path', type=Path, help="Measure this folder instead")
+    args = parser.parse_args()
+    
+    temp_dir = None
+    root = args.path
+    if root is None:
+        temp_dir = Path(tempfile.mkdtemp())
+        root = temp_dir
+        build_vault(root, args.notes)
+    
+    try:
+        # Warm the dentry cache so both runs measure the walk, not the disk.
+        measure_rglob(root)
+        results = {'rglob': measure_rglob(root), 'traversal': measure_traversal(root)}
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir)
+    
+    print(f"{'scanner':<10} {'visited':>9} {'notes':>7} {'seconds':>8}")
+    for name, (visited, files, seconds) in results.items():
+        print(f"{name:<10} {visited:>9} {files:>7} {seconds:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
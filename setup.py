@@ -8,7 +8,9 @@ setup(
     package_dir={"": "src"},
     python_requires=">=3.8",
     install_requires=[
-        "mcp>=1.0.0",
+        "mcp>=1.8.0",
+        "starlette",
+        "uvicorn",
         "aiohttp",
         "pydantic",
         "python-dotenv",
@@ -1,8 +1,20 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 
+from .prompt import prepare_content
+
 
 class BaseModelClient(ABC):
+    # Token budget for the content pasted into summarize/extract_info prompts (None: no limit)
+    max_prompt_tokens: Optional[int] = None
+    
+    def prepare_content(self, content: str, query: Optional[str] = None) -> str:
+        """
+        Strip Logseq metadata noise from content and fit it into max_prompt_tokens,
+        preferring the blocks relevant to query when it has to drop some.
+        """
+        return prepare_content(content, self.max_prompt_tokens, query)
+    
     @abstractmethod
     async def generate(self, prompt: str, **kwargs) -> str:
         pass
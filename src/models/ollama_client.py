@@ -1,66 +1,133 @@
 import aiohttp
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 from .base import BaseModelClient
+from ..utils.single_flight import flight_key
 
 
 class OllamaClient(BaseModelClient):
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.1"):
+    """
+    Client for a local Ollama server.
+    keep_alive asks Ollama to keep the model loaded between requests. With
+    reuse_context, a document is first sent on its own with num_predict=0, and
+    the context Ollama returns for it (the processed document, no answer) is kept
+    for up to max_contexts documents; every summarize/extract_info call on the
+    document then sends only its instruction on top of that context. The first
+    and later calls send the same prompt, so the answer does not depend on which
+    question came first. Identical concurrent calls are coalesced by the
+    scheduler (see ModelScheduler), not here.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.1",
+                 max_prompt_tokens: Optional[int] = None, keep_alive: Optional[str] = None,
+                 reuse_context: bool = True, max_contexts: int = 16):
         self.base_url = base_url.rstrip('/')
         self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_alive = keep_alive
+        self.reuse_context = reuse_context
+        self.max_contexts = max_contexts
+        
+        self._contexts: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.context_hits = 0
+        self.primed_documents = 0
     
     async def generate(self, prompt: str, **kwargs) -> str:
-        url = f"{self.base_url}/api/generate"
-        
+        result = await self._generate(prompt, **kwargs)
+        return result.get('response', '')
+    
+    async def _generate(self, prompt: str, context: Optional[List[int]] = None, **options) -> Dict[str, Any]:
+        """POST /api/generate and return the whole response."""
         payload = {
             "model": self.model,
             "prompt": prompt,
             "stream": False,
-            **kwargs
+            **options
         }
-        
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        if context is not None:
+            payload["context"] = context
+        return await self._post("/api/generate", payload)
+    
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
+            async with session.post(f"{self.base_url}{path}", json=payload) as response:
                 if response.status != 200:
                     raise Exception(f"Ollama API error: {response.status}")
                 
-                result = await response.json()
-                return result.get('response', '')
+                return await response.json()
+    
+    async def _generate_on_document(self, content: str, instruction: str) -> str:
+        """
+        Answer instruction about content. With reuse_context, the instruction is sent
+        on top of the cached context of the document alone; otherwise, and when
+        Ollama returns no context, both go in one prompt.
+        """
+        document = f"Content:\n{content}"
+        if not self.reuse_context:
+            return await self.generate(f"{document}\n\n{instruction}")
+        
+        key = flight_key(self.model, content)
+        context = self._contexts.get(key)
+        if context is not None:
+            self._contexts.move_to_end(key)
+            self.context_hits += 1
+        else:
+            primed = await self._generate(document, options={"num_predict": 0})
+            context = primed.get('context')
+            if not context:
+                return await self.generate(f"{document}\n\n{instruction}")
+            self.primed_documents += 1
+            self._contexts[key] = context
+            while len(self._contexts) > self.max_contexts:
+                self._contexts.popitem(last=False)
+        
+        return await self.generate(instruction, context=context)
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'cached_contexts': len(self._contexts),
+            'primed_documents': self.primed_documents,
+            'context_hits': self.context_hits
+        }
+    
+    async def warm(self, keep_alive: str = "30m") -> Dict[str, Any]:
+        """
+        Load the model into memory without generating anything (Ollama treats an
+        empty prompt as a load request) and keep it loaded for keep_alive.
+        """
+        payload = {"model": self.model, "prompt": "", "stream": False, "keep_alive": keep_alive}
+        result = await self._post("/api/generate", payload)
+        return {'model': self.model, 'load_seconds': result.get('load_duration', 0) / 1e9}
     
     async def summarize(self, content: str, max_length: Optional[int] = None) -> str:
+        content = self.prepare_content(content)
         length_instruction = f" in approximately {max_length} words" if max_length else ""
         
-        prompt = f"""Summarize the following content clearly and concisely{length_instruction}:
-
-{content}
+        instruction = f"""Summarize the content above clearly and concisely{length_instruction}.
 
 Summary:"""
         
-        return await self.generate(prompt)
+        return await self._generate_on_document(content, instruction)
     
     async def extract_info(self, content: str, query: str) -> str:
-        prompt = f"""Extract relevant information from the following content related to: {query}
-
-Content:
-{content}
+        content = self.prepare_content(content, query=query)
+        instruction = f"""Extract relevant information from the content above related to: {query}
 
 Extracted information:"""
         
-        return await self.generate(prompt)
+        return await self._generate_on_document(content, instruction)
     
     async def chat(self, messages: list, **kwargs) -> str:
-        url = f"{self.base_url}/api/chat"
-        
         payload = {
             "model": self.model,
             "messages": messages,
             "stream": False,
             **kwargs
         }
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status != 200:
-                    raise Exception(f"Ollama API error: {response.status}")
-                
-                result = await response.json()
-                return result.get('message', {}).get('content', '')
+        result = await self._post("/api/chat", payload)
+        return result.get('message', {}).get('content', '')
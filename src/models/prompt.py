@@ -0,0 +1,162 @@
+"""
+Prompt preparation for model calls.
+Strips Logseq metadata that carries no meaning for a model, condenses whitespace,
+and fits content into a token budget before it is pasted into a prompt.
+"""
+import math
+import re
+from typing import Dict, Optional, Any
+
+from ..utils.logseq_parser import LogseqParser
+from ..utils.logseq_index import split_blocks, tokenize
+
+
+# Block properties Logseq writes for its own bookkeeping.
+NOISE_PROPERTIES = {
+    'collapsed', 'id', 'heading', 'background-color', 'logseq.order-list-type',
+    'card-last-interval', 'card-repeats', 'card-ease-factor', 'card-next-schedule',
+    'card-last-reviewed', 'card-last-score', 'created-at', 'updated-at'
+}
+
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+BLOCK_REF_PATTERN = re.compile(r'\(\([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\)\)')
+INLINE_SPACE_PATTERN = re.compile(r'[ \t]{2,}')
+FENCE_MARKERS = ('```', '~~~')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the token count of a BPE tokenizer: one token per ~4 characters
+    of each word, plus one per punctuation mark.
+    """
+    count = 0
+    for token in TOKEN_PATTERN.findall(text):
+        count += math.ceil(len(token) / 4) if len(token) > 4 else 1
+    return count
+
+
+def _opens_fence(text: str) -> bool:
+    """A fence marker that is not closed again on the same line."""
+    return text.startswith(FENCE_MARKERS) and text[:3] not in text[3:]
+
+
+def compact_content(content: str) -> str:
+    """
+    Remove Logseq bookkeeping (collapsed::, id:: and similar properties, block-ref UUIDs),
+    re-indent bullet and property lines with single spaces and collapse their repeated
+    whitespace, and collapse runs of blank lines. Other lines and fenced code blocks are
+    kept as they are, so code indentation and table padding survive.
+    """
+    lines = []
+    previous_blank = True
+    in_fence = False
+    
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if in_fence:
+            lines.append(line)
+            in_fence = not stripped.startswith(FENCE_MARKERS)
+            previous_blank = False
+            continue
+        
+        parsed = LogseqParser.parse_property_line(line)
+        if parsed and parsed[0].lower() in NOISE_PROPERTIES:
+            continue
+        
+        if not stripped:
+            if not previous_blank:
+                lines.append('')
+            previous_blank = True
+            continue
+        previous_blank = False
+        
+        is_bullet = LogseqParser.is_bullet_line(line)
+        if not is_bullet and not parsed:
+            lines.append(line)
+            in_fence = _opens_fence(stripped)
+            continue
+        
+        # A fence can open on a bullet ('- ```python'); its body is left alone.
+        in_fence = is_bullet and _opens_fence(stripped[1:].lstrip())
+        level = LogseqParser.indent_level(line)
+        body = BLOCK_REF_PATTERN.sub('(ref)', stripped)
+        if not in_fence:
+            body = INLINE_SPACE_PATTERN.sub(' ', body)
+        indent = ' ' * level if line[:1] in ('\t', ' ') else ''
+        lines.append(indent + body)
+    
+    return '\n'.join(lines).strip('\n')
+
+
+def select_blocks(content: str, max_tokens: int, query: Optional[str] = None) -> str:
+    """
+    Fit content into max_tokens.
+    With a query, the blocks sharing the most terms with it are kept (in document order);
+    without one, blocks are kept from the top. Dropped spans are marked with '...'.
+    """
+    blocks = split_blocks(content)
+    if not blocks:
+        return content
+    
+    # Slice the raw lines of each block so indentation survives untouched.
+    lines = content.split('\n')
+    starts = [block['line'] - 1 for block in blocks] + [len(lines)]
+    texts = ['\n'.join(lines[starts[i]:starts[i + 1]]).rstrip() for i in range(len(blocks))]
+    costs = [estimate_tokens(text) for text in texts]
+    
+    if query:
+        query_terms = tokenize(query)
+        scores = [len(query_terms & tokenize(text)) for text in texts]
+        order = sorted(range(len(blocks)), key=lambda i: (-scores[i], i))
+    else:
+        order = list(range(len(blocks)))
+    
+    kept = set()
+    used = 0
+    for i in order:
+        if used + costs[i] > max_tokens:
+            if query:
+                continue
+            break
+        kept.add(i)
+        used += costs[i]
+    
+    if not kept:
+        # A single oversized block: keep its head.
+        return texts[order[0]][:max_tokens * 4] + '\n...'
+    
+    output = []
+    skipped = False
+    for i in range(len(blocks)):
+        if i in kept:
+            if skipped:
+                output.append('...')
+                skipped = False
+            output.append(texts[i])
+        else:
+            skipped = True
+    if skipped:
+        output.append('...')
+    
+    return '\n'.join(output)
+
+
+def prepare_content(content: str, max_tokens: Optional[int] = None,
+                    query: Optional[str] = None) -> str:
+    """
+    Compact content and, if a budget is given, trim it to fit.
+    """
+    compacted = compact_content(content)
+    if max_tokens is None or estimate_tokens(compacted) <= max_tokens:
+        return compacted
+    return select_blocks(compacted, max_tokens, query)
+
+
+def compaction_stats(original: str, prepared: str) -> Dict[str, Any]:
+    before = estimate_tokens(original)
+    after = estimate_tokens(prepared)
+    return {
+        'tokens_before': before,
+        'tokens_after': after,
+        'saved_ratio': round(1 - after / before, 3) if before else 0.0
+    }
@@ -4,10 +4,12 @@ from .base import BaseModelClient
 
 
 class RemoteClient(BaseModelClient):
-    def __init__(self, api_key: str, model: str = "claude-3.5-sonnet", provider: str = "anthropic"):
+    def __init__(self, api_key: str, model: str = "claude-3.5-sonnet", provider: str = "anthropic",
+                 max_prompt_tokens: Optional[int] = None):
         self.api_key = api_key
         self.model = model
         self.provider = provider
+        self.max_prompt_tokens = max_prompt_tokens
         
         # Set base URL based on provider
         provider_urls = {
@@ -43,6 +45,7 @@ class RemoteClient(BaseModelClient):
                 return result['choices'][0]['message']['content']
     
     async def summarize(self, content: str, max_length: Optional[int] = None) -> str:
+        content = self.prepare_content(content)
         length_instruction = f" in approximately {max_length} words" if max_length else ""
         
         prompt = f"""Summarize the following content clearly and concisely{length_instruction}:
@@ -54,6 +57,7 @@ Summary:"""
         return await self.generate(prompt)
     
     async def extract_info(self, content: str, query: str) -> str:
+        content = self.prepare_content(content, query=query)
         prompt = f"""Extract relevant information from the following content related to: {query}
 
 Content:
@@ -0,0 +1,258 @@
+"""
+Request scheduler in front of the model clients.
+Each provider gets a lane with a concurrency limit, a priority queue
+(interactive before batch) and a bounded depth. Local requests that would wait
+too long are routed to the remote provider when one is configured. Identical
+summarize/extract_info requests arriving while one is queued or running share
+its result instead of taking a queue slot of their own.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .base import BaseModelClient
+from ..utils.profiling import section
+from ..utils.single_flight import SingleFlight, flight_key
+
+
+PRIORITIES = {
+    'interactive': 0,
+    'batch': 1
+}
+
+
+class SchedulerBackpressureError(Exception):
+    """Raised when a provider queue is full and no fallback can take the request."""
+
+
+class ProviderLane:
+    """Concurrency slots for one provider, handed out in priority order."""
+    
+    def __init__(self, name: str, client: BaseModelClient, max_concurrency: int = 1,
+                 max_queue_depth: int = 32, ewma_alpha: float = 0.2):
+        self.name = name
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.ewma_alpha = ewma_alpha
+        
+        self._in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_latency: Optional[float] = None
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        return sum(
+            1 for entry in self._waiters
+            if not entry[2].done() and (priority is None or entry[0] == priority)
+        )
+    
+    def estimated_wait(self) -> float:
+        """Expected queueing delay for a new request, from queue depth and average latency."""
+        if self._in_flight < self.max_concurrency and not self.queue_depth():
+            return 0.0
+        latency = self.avg_latency or 0.0
+        return (self.queue_depth() + 1) * latency / self.max_concurrency
+    
+    async def acquire(self, priority: int, timeout: Optional[float] = None) -> float:
+        """
+        Wait for a slot and return how long it took.
+        Raises SchedulerBackpressureError when the queue is full and
+        asyncio.TimeoutError when no slot frees up within timeout.
+        """
+        if self._in_flight < self.max_concurrency and not self.queue_depth():
+            self._in_flight += 1
+            return 0.0
+        
+        if self.queue_depth() >= self.max_queue_depth:
+            self.rejected += 1
+            raise SchedulerBackpressureError(
+                f"{self.name} queue is full ({self.max_queue_depth} requests waiting)"
+            )
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        started = time.monotonic()
+        
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us as we gave up on it; pass it on.
+                self.release()
+            raise
+        
+        waited = time.monotonic() - started
+        self.avg_wait += self.ewma_alpha * (waited - self.avg_wait)
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+    
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; in-flight count is unchanged.
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+    
+    def record(self, latency: float, ok: bool) -> None:
+        if ok:
+            self.completed += 1
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            else:
+                self.avg_latency += self.ewma_alpha * (latency - self.avg_latency)
+        else:
+            self.failed += 1
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self._in_flight,
+            'max_concurrency': self.max_concurrency,
+            'queued': self.queue_depth(),
+            'queued_by_priority': {
+                name: self.queue_depth(priority) for name, priority in PRIORITIES.items()
+            },
+            'max_queue_depth': self.max_queue_depth,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'avg_latency_seconds': self.avg_latency,
+            'avg_wait_seconds': self.avg_wait,
+            'max_wait_seconds': self.max_wait,
+            'estimated_wait_seconds': self.estimated_wait()
+        }
+
+
+class ModelScheduler:
+    """
+    Routes model calls through per-provider lanes.
+
+    Args:
+        clients: Provider name ('local', 'remote') to client
+        limits: Provider name to {'max_concurrency', 'max_queue_depth'}
+        fallback_after: Seconds a local request may wait before it is sent to the remote provider
+            (None disables fallback)
+    """
+    
+    def __init__(self, clients: Dict[str, Optional[BaseModelClient]],
+                 limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 fallback_after: Optional[float] = 5.0,
+                 fallback_from: str = 'local', fallback_to: str = 'remote'):
+        limits = limits or {}
+        self.lanes: Dict[str, ProviderLane] = {}
+        for name, client in clients.items():
+            if client is None:
+                continue
+            lane_limits = limits.get(name, {})
+            self.lanes[name] = ProviderLane(
+                name,
+                client,
+                max_concurrency=lane_limits.get('max_concurrency', 1 if name == 'local' else 4),
+                max_queue_depth=lane_limits.get('max_queue_depth', 32)
+            )
+        
+        self.fallback_after = fallback_after
+        self.fallback_from = fallback_from
+        self.fallback_to = fallback_to
+        self.fallbacks = 0
+        self.flights = SingleFlight()
+    
+    def _fallback_lane(self, provider: str) -> Optional[ProviderLane]:
+        if self.fallback_after is None or provider != self.fallback_from:
+            return None
+        return self.lanes.get(self.fallback_to)
+    
+    async def submit(self, provider: str, operation: Callable[[BaseModelClient], Awaitable[Any]],
+                     priority: str = 'interactive') -> Any:
+        """
+        Run operation(client) on the provider's lane, queueing by priority.
+        Falls back to the remote lane when the local queue is full or its wait
+        exceeds fallback_after.
+        """
+        if provider not in self.lanes:
+            raise ValueError(f"Provider '{provider}' is not available")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}. Use one of: {', '.join(PRIORITIES)}")
+        
+        lane = self.lanes[provider]
+        fallback = self._fallback_lane(provider)
+        rank = PRIORITIES[priority]
+        
+        if fallback is not None and lane.estimated_wait() > self.fallback_after:
+            self.fallbacks += 1
+            lane = fallback
+            fallback = None
+        
+        with section('model_queue', blocking=False):
+            try:
+                await lane.acquire(rank, timeout=self.fallback_after if fallback is not None else None)
+            except SchedulerBackpressureError:
+                if fallback is None:
+                    raise
+                self.fallbacks += 1
+                lane = fallback
+                await lane.acquire(rank)
+            except asyncio.TimeoutError:
+                lane.timed_out += 1
+                self.fallbacks += 1
+                lane = fallback
+                await lane.acquire(rank)
+        
+        started = time.monotonic()
+        ok = False
+        try:
+            with section('model_io', blocking=False):
+                result = await operation(lane.client)
+            ok = True
+            return result
+        finally:
+            lane.record(time.monotonic() - started, ok)
+            lane.release()
+    
+    async def summarize(self, provider: str, content: str, max_length: Optional[int] = None,
+                        priority: str = 'interactive') -> str:
+        # The first request's priority applies to requests that join it.
+        return await self.flights.run(
+            flight_key('summarize', provider, content, max_length),
+            lambda: self.submit(
+                provider, lambda client: client.summarize(content=content, max_length=max_length), priority
+            )
+        )
+    
+    async def extract_info(self, provider: str, content: str, query: str,
+                           priority: str = 'interactive') -> str:
+        return await self.flights.run(
+            flight_key('extract_info', provider, content, query),
+            lambda: self.submit(
+                provider, lambda client: client.extract_info(content=content, query=query), priority
+            )
+        )
+    
+    def metrics(self) -> Dict[str, Any]:
+        providers = {}
+        for name, lane in self.lanes.items():
+            providers[name] = lane.metrics()
+            if hasattr(lane.client, 'metrics'):
+                providers[name]['client'] = lane.client.metrics()
+        return {
+            'providers': providers,
+            'fallbacks': self.fallbacks,
+            'fallback_after_seconds': self.fallback_after,
+            'coalescing': self.flights.metrics()
+        }
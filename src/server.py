@@ -1,36 +1,179 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import contextlib
+import functools
+import json
 import logging
-import sys
+import threading
+from datetime import date
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+import uvicorn
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.routing import Route
+from mcp.types import InitializedNotification, Tool, TextContent
 
 from .utils.config import Config
-from .tools.notes_tools import NotesTools
-from .tools.logseq_tools import LogseqTools
+from .tools.vaults import VaultRegistry
+from .tools.notes_tools import COLLAPSE_THRESHOLD
 from .models.ollama_client import OllamaClient
 from .models.remote_client import RemoteClient
+from .models.scheduler import ModelScheduler, PRIORITIES
+from .utils.corpus_export import COMPRESSIONS, CorpusExporter
+from .utils.logseq_parser import CompactOutline
+from .utils.minhash import collapse_near_duplicates
+from .utils.pagination import MIN_PAGE_BYTES, CursorStore, decode_position, encode_position
+from .utils.profiling import MODES as PROFILE_MODES, Profiler, to_thread
+from .utils.retrieval import format_context, format_citations, format_location
+from .utils.traversal import Traversal
+from .utils.warmup import WarmupPipeline, prefetch_files
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+VAULT_PROPERTY = {
+    "type": "string",
+    "description": "Name of the vault root to use (default: the first configured root)"
+}
+
+PRIORITY_PROPERTY = {
+    "type": "string",
+    "description": "Scheduling lane: 'interactive' requests are served before 'batch' ones",
+    "enum": list(PRIORITIES),
+    "default": "interactive"
+}
+
+BLOCK_SELECTOR_PROPERTIES = {
+    "line": {
+        "type": "integer",
+        "description": "A line inside the block (line numbers as returned by query_logseq)"
+    },
+    "block_id": {
+        "type": "string",
+        "description": "The block's id:: property"
+    },
+    "match": {
+        "type": "string",
+        "description": "The block's first-line text (case-insensitive, must match a single block)"
+    }
+}
+
+PAGE_TITLE_PROPERTY = {
+    "type": "string",
+    "description": "Page title or alias, or a journal date (YYYY_MM_DD)"
+}
+
+TIMEOUT_PROPERTY = {
+    "type": "number",
+    "description": "Seconds before the request is abandoned and its work cancelled (default: server.request_timeout)"
+}
+
+PAGINATION_PROPERTIES = {
+    "cursor": {
+        "type": "string",
+        "description": "next_cursor from the previous page; the other arguments are then ignored"
+    },
+    "page_bytes": {
+        "type": "integer",
+        "description": "Byte budget for this page of results, about 4 bytes per token (default: pagination.page_bytes)"
+    }
+}
+
+PROFILE_PROPERTY = {
+    "type": "string",
+    "enum": list(PROFILE_MODES),
+    "description": (
+        "Profile this call: 'timing' reports wall and CPU time per section (notes scan, Logseq parsing, "
+        "model queue and I/O); 'cprofile' adds the top functions, 'tracemalloc' the top allocations"
+    )
+}
+
+# Journal text sent to the model per summarize call of get_journal_range (about 8k tokens).
+JOURNAL_CHUNK_BYTES = 32768
+
+# Tools returning a JSON page: {total, offset, returned, next_cursor, ..., items}.
+PAGINATED_TOOLS = (
+    "search_notes", "find_duplicate_notes", "list_recent_notes",
+    "find_logseq_pages", "list_logseq_templates", "query_logseq", "list_logseq_tasks"
+)
+
+
+def _json_default(value: Any) -> Any:
+    """Outlines are materialized only here, when the response is encoded."""
+    if isinstance(value, CompactOutline):
+        return value.to_list()
+    return str(value)
+
+
+class SessionManagerEndpoint:
+    """ASGI endpoint handing HTTP requests to the MCP session manager."""
+    
+    def __init__(self, manager: StreamableHTTPSessionManager):
+        self.manager = manager
+    
+    async def __call__(self, scope, receive, send):
+        await self.manager.handle_request(scope, receive, send)
+
 
 class NotesLogseqServer:
     def __init__(self, config_path: str = "config.json"):
         self.config = Config(config_path)
-        self.notes = NotesTools(self.config.get_notes_path())
-        self.logseq = LogseqTools(self.config.get_logseq_path())
+        index_config = self.config.get_index_config()
+        self.vaults = VaultRegistry(
+            self.config.get_roots(),
+            index_max_age=index_config['max_age'],
+            max_workers=index_config['max_workers'],
+            max_file_size=index_config['max_file_size'],
+            cache_dir=index_config['cache_dir'],
+            traversal=Traversal(
+                ignore=index_config['ignore'],
+                default_ignores=index_config['default_ignores'],
+                include_hidden=index_config['include_hidden'],
+                follow_symlinks=index_config['follow_symlinks']
+            )
+        )
+        self.notes = self.vaults.default.notes
+        self.logseq = self.vaults.default.logseq
         
         self.ollama_client = None
         self.remote_client = None
         
         self._init_model_clients()
         
+        scheduler_config = self.config.get_scheduler_config()
+        self.scheduler = ModelScheduler(
+            {'local': self.ollama_client, 'remote': self.remote_client},
+            limits=scheduler_config['limits'],
+            fallback_after=scheduler_config['fallback_after']
+        )
+        
+        self.server_config = self.config.get_server_config()
+        self.request_timeout = self.server_config['request_timeout']
+        
+        pagination_config = self.config.get_pagination_config()
+        self.cursors = CursorStore(
+            ttl=pagination_config['ttl'],
+            max_snapshots=pagination_config['max_snapshots'],
+            page_bytes=pagination_config['page_bytes']
+        )
+        
+        self.warmup = self._build_warmup()
+        
+        profiling_config = self.config.get_profiling_config()
+        self.profiler = Profiler(profiling_config['directory'], keep=profiling_config['keep'],
+                                 top=profiling_config['top'])
+        self.profiler.configure(profiling_config['mode'], profiling_config['tools'])
+        
+        export_config = self.config.get_export_config()
+        self.exporter = CorpusExporter(export_config['directory'], keep=export_config['keep'])
+        self.export_compression = export_config['compression']
+        
         self.server = Server("notes-logseq-mcp")
         self._register_handlers()
     
@@ -39,7 +182,11 @@ class NotesLogseqServer:
             ollama_config = self.config.get_model_config('local')
             self.ollama_client = OllamaClient(
                 base_url=ollama_config['base_url'],
-                model=ollama_config['model']
+                model=ollama_config['model'],
+                max_prompt_tokens=ollama_config.get('max_prompt_tokens'),
+                keep_alive=ollama_config.get('keep_alive'),
+                reuse_context=ollama_config.get('reuse_context', True),
+                max_contexts=ollama_config.get('max_cached_contexts', 16)
             )
             logger.info("Ollama client initialized")
         except Exception as e:
@@ -50,19 +197,76 @@ class NotesLogseqServer:
             if remote_config['api_key'] != 'YOUR_API_KEY':
                 self.remote_client = RemoteClient(
                     api_key=remote_config['api_key'],
-                    model=remote_config['model']
+                    model=remote_config['model'],
+                    max_prompt_tokens=remote_config.get('max_prompt_tokens')
                 )
                 logger.info("Remote client initialized")
         except Exception as e:
             logger.warning(f"Could not initialize Remote client: {e}")
     
+    def _build_warmup(self) -> WarmupPipeline:
+        """
+        Steps run in the background once a client has connected: indexes and
+        templates first (the first searches need them), then the page cache for
+        the most recently modified files, then optionally the local model.
+        """
+        warmup_config = self.config.get_warmup_config()
+        pipeline = WarmupPipeline(enabled=warmup_config['enabled'])
+        
+        for vault in self.vaults.vaults.values():
+            if vault.notes is not None:
+                pipeline.add(f"{vault.name}: notes index", lambda notes=vault.notes: {
+                    'files': len(notes.index.entries(pause=pipeline.yield_to_foreground))
+                })
+            if vault.logseq is not None:
+                pipeline.add(f"{vault.name}: logseq index", functools.partial(
+                    self._warm_logseq_index, vault.logseq, pipeline.yield_to_foreground
+                ))
+                pipeline.add(f"{vault.name}: templates", lambda logseq=vault.logseq: {
+                    'templates': len(logseq.list_available_templates())
+                })
+        
+        if warmup_config['prefetch_files']:
+            pipeline.add("recent files", lambda: prefetch_files(
+                self._recent_files(warmup_config['prefetch_files']),
+                max_bytes=warmup_config['prefetch_bytes'],
+                pause=pipeline.yield_to_foreground
+            ))
+        if warmup_config['warm_model'] and self.ollama_client:
+            pipeline.add("local model", functools.partial(self.ollama_client.warm, warmup_config['keep_alive']))
+        return pipeline
+    
+    @staticmethod
+    def _warm_logseq_index(logseq, pause) -> Dict[str, Any]:
+        # Paused between files with the index lock released, so a request is never stuck behind the build.
+        logseq.index.ensure_fresh(pause=pause)
+        logseq.journals.ensure_fresh(pause=pause)
+        return logseq.index.stats()
+    
+    def _recent_files(self, limit: int) -> list:
+        """Paths of the most recently modified notes and Logseq pages across all vaults."""
+        files = []
+        for vault in self.vaults.vaults.values():
+            if vault.notes is not None:
+                files.extend((entry['mtime'], entry['path']) for entry in vault.notes.index.entries())
+            if vault.logseq is not None:
+                with vault.logseq.index.lock:
+                    files.extend((page['mtime'], page['path']) for page in vault.logseq.index.pages.values())
+        files.sort(key=lambda item: item[0], reverse=True)
+        return [path for _, path in files[:limit]]
+    
     def _register_handlers(self):
+        async def on_initialized(notification: InitializedNotification) -> None:
+            self.warmup.start()
+        
+        self.server.notification_handlers[InitializedNotification] = on_initialized
+        
         @self.server.list_tools()
         async def list_tools() -> list[Tool]:
-            return [
+            tools = [
                 Tool(
                     name="search_notes",
-                    description="Search for text in markdown notes. Returns matching files with context.",
+                    description="Search for text in notes (.md, .txt, .org and gzip-compressed notes). Returns matching files with match spans and optional context lines.",
                     inputSchema={
                         "type": "object",
                         "properties": {
@@ -70,6 +274,11 @@ class NotesLogseqServer:
                                 "type": "string",
                                 "description": "Search query to find in notes"
                             },
+                            "vaults": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Vault roots to search (default: all configured roots)"
+                            },
                             "case_sensitive": {
                                 "type": "boolean",
                                 "description": "Whether search should be case sensitive",
@@ -79,17 +288,67 @@ class NotesLogseqServer:
                                 "type": "integer",
                                 "description": "Maximum number of results to return",
                                 "default": 20
-                            }
+                            },
+                            "context_before": {
+                                "type": "integer",
+                                "description": "Lines of context to include before each matching line",
+                                "default": 0
+                            },
+                            "context_after": {
+                                "type": "integer",
+                                "description": "Lines of context to include after each matching line",
+                                "default": 0
+                            },
+                            "collapse_duplicates": {
+                                "type": "boolean",
+                                "description": "Fold near-duplicate notes into the best-ranked copy (listed under 'duplicates')",
+                                "default": False
+                            },
+                            "timeout": TIMEOUT_PROPERTY,
+                            **PAGINATION_PROPERTIES
                         },
                         "required": ["query"]
                     }
                 ),
+                Tool(
+                    name="find_duplicate_notes",
+                    description="Find near-duplicate notes (e.g. articles clipped twice) or repeated blocks, using MinHash signatures over word shingles. Pass path to list the notes similar to one note.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "threshold": {
+                                "type": "number",
+                                "description": "Minimum estimated similarity (0-1)",
+                                "default": 0.8
+                            },
+                            "level": {
+                                "type": "string",
+                                "enum": ["note", "block"],
+                                "description": "Compare whole notes, or blocks (paragraphs and bullets, including repeats within one note)",
+                                "default": "note"
+                            },
+                            "path": {
+                                "type": "string",
+                                "description": "Relative path of a note to find copies of"
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Maximum number of clusters (or notes, with path) to return",
+                                "default": 20
+                            },
+                            "timeout": TIMEOUT_PROPERTY,
+                            **PAGINATION_PROPERTIES
+                        }
+                    }
+                ),
                 Tool(
                     name="get_note_content",
                     description="Get the full content of a specific note file by its relative path.",
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "path": {
                                 "type": "string",
                                 "description": "Relative path to the note file (e.g., 'folder/note.md')"
@@ -104,11 +363,13 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "limit": {
                                 "type": "integer",
                                 "description": "Number of recent notes to return",
                                 "default": 10
-                            }
+                            },
+                            **PAGINATION_PROPERTIES
                         }
                     }
                 ),
@@ -118,6 +379,7 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "title": {
                                 "type": "string",
                                 "description": "Title of the Logseq page"
@@ -141,6 +403,7 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "content": {
                                 "type": "string",
                                 "description": "Content to add to the journal"
@@ -159,6 +422,8 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "priority": PRIORITY_PROPERTY,
+                            "timeout": TIMEOUT_PROPERTY,
                             "content": {
                                 "type": "string",
                                 "description": "Content to summarize"
@@ -179,13 +444,15 @@ class NotesLogseqServer:
                 ),
                 Tool(
                     name="extract_information",
-                    description="Extract specific information from content using AI.",
+                    description="Extract specific information using AI. Either pass the content directly, or omit it to retrieve the most relevant blocks from notes/Logseq server-side (optionally restricted to paths or a search pattern); the answer then lists its sources as file:line citations.",
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "priority": PRIORITY_PROPERTY,
+                            "timeout": TIMEOUT_PROPERTY,
                             "content": {
                                 "type": "string",
-                                "description": "Content to extract information from"
+                                "description": "Content to extract information from (omit to retrieve it from the vault)"
                             },
                             "query": {
                                 "type": "string",
@@ -196,9 +463,35 @@ class NotesLogseqServer:
                                 "description": "Model provider to use: 'local' (Ollama) or 'remote'",
                                 "enum": ["local", "remote"],
                                 "default": "local"
+                            },
+                            "vault": VAULT_PROPERTY,
+                            "source": {
+                                "type": "string",
+                                "description": "Where to retrieve blocks from when content is omitted",
+                                "enum": ["notes", "logseq", "all"],
+                                "default": "notes"
+                            },
+                            "paths": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Relative note paths to retrieve from"
+                            },
+                            "search": {
+                                "type": "string",
+                                "description": "Only retrieve from notes matching this search pattern"
+                            },
+                            "top_k": {
+                                "type": "integer",
+                                "description": "Number of blocks to send to the model",
+                                "default": 8
+                            },
+                            "collapse_duplicates": {
+                                "type": "boolean",
+                                "description": "Send only one of each group of near-duplicate retrieved blocks",
+                                "default": False
                             }
                         },
-                        "required": ["content", "query"]
+                        "required": ["query"]
                     }
                 ),
                 Tool(
@@ -207,20 +500,67 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "title": {
                                 "type": "string",
-                                "description": "Title of the Logseq page to analyze"
+                                "description": "Title of the Logseq page to analyze (an alias also works)"
+                            },
+                            "fuzzy": {
+                                "type": "boolean",
+                                "description": "If no page has this exact title, use the closest matching title",
+                                "default": True
+                            },
+                            "outline": {
+                                "type": "string",
+                                "enum": ["full", "summary", "none"],
+                                "description": "full: every outline line; summary: block counts per level and the first headings and top-level blocks (use for long pages); none: leave the outline out",
+                                "default": "full"
+                            },
+                            "top": {
+                                "type": "integer",
+                                "description": "Headings and top-level blocks listed by the summary outline",
+                                "default": 10
                             }
                         },
                         "required": ["title"]
                     }
                 ),
+                Tool(
+                    name="find_logseq_pages",
+                    description="Find Logseq pages by title, alias or namespace segment. Handles typos and partial titles; use it to get the exact page name before reading or updating a page.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "query": {
+                                "type": "string",
+                                "description": "Full or partial page title"
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": ["auto", "exact", "prefix", "fuzzy"],
+                                "description": "'prefix' for autocomplete, 'fuzzy' for typos, 'auto' for both",
+                                "default": "auto"
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Maximum number of pages to return",
+                                "default": 10
+                            },
+                            **PAGINATION_PROPERTIES
+                        },
+                        "required": ["query"]
+                    }
+                ),
                 Tool(
                     name="list_logseq_templates",
                     description="List all available templates in Logseq. Use this to find appropriate templates for new pages.",
                     inputSchema={
                         "type": "object",
-                        "properties": {}
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            **PAGINATION_PROPERTIES
+                        }
                     }
                 ),
                 Tool(
@@ -229,6 +569,7 @@ class NotesLogseqServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
+                            "vault": VAULT_PROPERTY,
                             "title": {
                                 "type": "string",
                                 "description": "Title of the Logseq page"
@@ -254,100 +595,766 @@ class NotesLogseqServer:
                         },
                         "required": ["title", "content"]
                     }
+                ),
+                Tool(
+                    name="bulk_upsert_logseq_pages",
+                    description="Create or update many Logseq pages (or journal entries) in one call, with the same formatting and template rules as create_smart_logseq_page. Use this for imports instead of many single calls.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "pages": {
+                                "type": "array",
+                                "description": "Pages to write, applied in order when several target the same page",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "title": {
+                                            "type": "string",
+                                            "description": "Page title"
+                                        },
+                                        "date": {
+                                            "type": "string",
+                                            "description": "Journal date (YYYY_MM_DD) instead of a title; content is appended"
+                                        },
+                                        "content": {
+                                            "type": "string",
+                                            "description": "Content to add"
+                                        },
+                                        "template_name": {
+                                            "type": "string",
+                                            "description": "Template for this page if new (overrides the batch template)"
+                                        },
+                                        "preserve_structure": {
+                                            "type": "boolean",
+                                            "default": True
+                                        },
+                                        "overwrite": {
+                                            "type": "boolean",
+                                            "default": False
+                                        }
+                                    },
+                                    "required": ["content"]
+                                }
+                            },
+                            "template_name": {
+                                "type": "string",
+                                "description": "Template for new pages that do not name their own"
+                            },
+                            "timeout": TIMEOUT_PROPERTY
+                        },
+                        "required": ["pages"]
+                    }
+                ),
+                Tool(
+                    name="update_logseq_block",
+                    description="Replace the text of one block on an existing Logseq page, keeping its position, indentation, children and properties. Only that block is rewritten; select it by line, block_id or match.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "title": PAGE_TITLE_PROPERTY,
+                            "content": {
+                                "type": "string",
+                                "description": "New block text; further lines become continuation lines (e.g. properties)"
+                            },
+                            **BLOCK_SELECTOR_PROPERTIES
+                        },
+                        "required": ["title", "content"]
+                    }
+                ),
+                Tool(
+                    name="insert_under_logseq_section",
+                    description="Insert content as child blocks of a section (a block or '## ' heading) on an existing Logseq page, without touching the rest of the page.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "title": PAGE_TITLE_PROPERTY,
+                            "section": {
+                                "type": "string",
+                                "description": "Section text, e.g. 'Notes' for '- ## Notes' (case-insensitive)"
+                            },
+                            "content": {
+                                "type": "string",
+                                "description": "Lines to insert; each becomes a bullet and relative indentation is kept"
+                            },
+                            "position": {
+                                "type": "string",
+                                "enum": ["start", "end"],
+                                "description": "Insert as the first or after the last child of the section",
+                                "default": "end"
+                            },
+                            "create": {
+                                "type": "boolean",
+                                "description": "Append the section at the end of the page if it does not exist",
+                                "default": True
+                            }
+                        },
+                        "required": ["title", "section", "content"]
+                    }
+                ),
+                Tool(
+                    name="replace_logseq_property",
+                    description="Set or remove a property on an existing Logseq page (page property by default, or a block property when a block is selected), editing only that line.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "title": PAGE_TITLE_PROPERTY,
+                            "key": {
+                                "type": "string",
+                                "description": "Property name, e.g. 'status'"
+                            },
+                            "value": {
+                                "type": ["string", "null"],
+                                "description": "New value; null removes the property"
+                            },
+                            **BLOCK_SELECTOR_PROPERTIES
+                        },
+                        "required": ["title", "key", "value"]
+                    }
+                ),
+                Tool(
+                    name="list_logseq_tasks",
+                    description=(
+                        "List Logseq tasks (TODO, DOING, LATER, NOW, DONE blocks) across pages and journals "
+                        "with their priority, SCHEDULED and DEADLINE dates, page and line. Answered from the "
+                        "in-memory index. Ranges: a date (2024-01-31), 'today', 'this-week', '7d', or 'start..end'."
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "markers": {
+                                "type": "array",
+                                "items": {"type": "string", "enum": ["TODO", "DOING", "LATER", "NOW", "DONE"]},
+                                "description": "Task markers to include (default: the open ones, TODO, DOING, LATER and NOW)"
+                            },
+                            "priorities": {
+                                "type": "array",
+                                "items": {"type": "string", "enum": ["A", "B", "C"]},
+                                "description": "Only tasks with one of these [#A]/[#B]/[#C] priorities"
+                            },
+                            "page": {
+                                "type": "string",
+                                "description": "Only tasks on the page with this title"
+                            },
+                            "scheduled": {
+                                "type": "string",
+                                "description": "Only tasks SCHEDULED in this range"
+                            },
+                            "deadline": {
+                                "type": "string",
+                                "description": "Only tasks with a DEADLINE in this range"
+                            },
+                            "journal_date": {
+                                "type": "string",
+                                "description": "Only tasks on journal pages in this range"
+                            },
+                            "overdue": {
+                                "type": "boolean",
+                                "description": "Only tasks whose deadline (or scheduled date) is before today",
+                                "default": False
+                            },
+                            "sort": {
+                                "type": "string",
+                                "enum": ["due", "priority", "page", "recent"],
+                                "description": "'due': earliest deadline/scheduled date first; 'recent': recently modified pages first",
+                                "default": "due"
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Maximum number of tasks to return",
+                                "default": 100
+                            },
+                            **PAGINATION_PROPERTIES
+                        }
+                    }
+                ),
+                Tool(
+                    name="query_logseq",
+                    description=(
+                        "Query Logseq blocks using the in-memory index. Clauses are ANDed: words, "
+                        "'tag:name' or '#name', 'task:TODO,DOING', 'prop:key=value' (or 'key::value'), "
+                        "'page:name', 'date:RANGE' (journal date) and 'modified:RANGE' (file mtime). "
+                        "RANGE is a date (2024-01-31), 'today', 'this-week', 'last-week', 'this-month', "
+                        "'7d', '2w', or 'start..end'. Prefix a clause with '-' to exclude it. "
+                        "Example: task:TODO tag:project modified:this-week prop:status=active"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY,
+                            "query": {
+                                "type": "string",
+                                "description": "Query string"
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Maximum number of blocks to return",
+                                "default": 50
+                            },
+                            "timeout": TIMEOUT_PROPERTY,
+                            **PAGINATION_PROPERTIES
+                        },
+                        "required": ["query"]
+                    }
+                ),
+                Tool(
+                    name="get_journal_range",
+                    description="Return or summarize the Logseq journal entries of a date span (e.g. 'last 2 weeks', 'this-month', '2024-01-01..2024-01-31'). Entries come back in pages of about page_bytes with their block counts; large journals are split at top-level blocks and next_cursor continues the span. With summarize=true the entries go straight to the model in chunks without being sent back first.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "priority": PRIORITY_PROPERTY,
+                            "timeout": TIMEOUT_PROPERTY,
+                            "vault": VAULT_PROPERTY,
+                            "range": {
+                                "type": "string",
+                                "description": "Date span: 'today', 'this-week', 'last-week', 'this-month', '7d', 'last 2 weeks', or 'start..end'"
+                            },
+                            "start": {
+                                "type": "string",
+                                "description": "Start date (YYYY-MM-DD), used when range is omitted"
+                            },
+                            "end": {
+                                "type": "string",
+                                "description": "End date (YYYY-MM-DD), used when range is omitted"
+                            },
+                            "newest_first": {
+                                "type": "boolean",
+                                "description": "Return the most recent entries first",
+                                "default": False
+                            },
+                            "summarize": {
+                                "type": "boolean",
+                                "description": "Summarize the span with the model instead of returning it",
+                                "default": False
+                            },
+                            "model_provider": {
+                                "type": "string",
+                                "description": "Model provider for summarize: 'local' (Ollama) or 'remote'",
+                                "enum": ["local", "remote"],
+                                "default": "local"
+                            },
+                            "max_length": {
+                                "type": "integer",
+                                "description": "Maximum length of summary in words"
+                            },
+                            **PAGINATION_PROPERTIES
+                        }
+                    }
+                ),
+                Tool(
+                    name="get_model_queue_metrics",
+                    description="Show model scheduler metrics: in-flight and queued requests per provider and priority, latency, wait times, rejections, local-to-remote fallbacks, coalesced duplicate requests and reused Ollama contexts.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {}
+                    }
+                ),
+                Tool(
+                    name="refresh_index",
+                    description="Rebuild the cached file index of one vault root, or of all roots. Other roots keep serving queries while one refreshes.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vault": VAULT_PROPERTY
+                        }
+                    }
+                ),
+                Tool(
+                    name="set_profiling",
+                    description="Profile every call (or the calls to some tools) until turned off; each profiled response ends with a summary, and cprofile/tracemalloc output is written to the profiling directory. Any single call can also be profiled with its 'profile' argument.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "mode": {
+                                "type": "string",
+                                "enum": ["off", *PROFILE_MODES],
+                                "description": "Profiling mode for subsequent calls",
+                                "default": "off"
+                            },
+                            "tools": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Only profile these tools (default: all)"
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="get_warmup_status",
+                    description="Show the background warm-up (index builds, page-cache prefetch, model load) started when the server accepted its first client: overall state and per-step timings.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {}
+                    }
+                ),
+                Tool(
+                    name="list_vaults",
+                    description="List the configured vault roots and the state of their indexes.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {}
+                    }
+                ),
+                Tool(
+                    name="export_corpus",
+                    description="Write the notes and Logseq pages of one or more vaults to a single compressed JSONL bundle (path, mtime, properties and content per document) for batch jobs, instead of reading notes one call at a time. Returns the bundle path and a snapshot_id; pass it as 'since' next time to export only what changed, plus deletions.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "vaults": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Vault names to export (default: all)"
+                            },
+                            "since": {
+                                "type": "string",
+                                "description": "snapshot_id of an earlier export; only documents new or changed since then are written"
+                            },
+                            "sources": {
+                                "type": "array",
+                                "items": {"type": "string", "enum": ["notes", "logseq"]},
+                                "description": "What to export (default: both)"
+                            },
+                            "compression": {
+                                "type": "string",
+                                "enum": list(COMPRESSIONS),
+                                "description": "auto: zstd if the zstandard package is installed, else gzip (default: export.compression)"
+                            },
+                            "timeout": TIMEOUT_PROPERTY
+                        }
+                    }
                 )
             ]
+            for tool in tools:
+                tool.inputSchema["properties"]["profile"] = PROFILE_PROPERTY
+            return tools
         
         @self.server.call_tool()
         async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             try:
-                if name == "search_notes":
-                    results = self.notes.search_notes(
+                capture = self.profiler.begin(name, arguments.get("profile"))
+            except ValueError as e:
+                return [TextContent(type="text", text=f"Error: {str(e)}")]
+            if capture is None:
+                return await execute(name, arguments)
+            
+            try:
+                result = await execute(name, arguments)
+            finally:
+                snapshot = capture.deactivate()
+            summary = await asyncio.to_thread(self.profiler.finish, capture, snapshot)
+            return result + [TextContent(type="text", text=json.dumps({"profile": summary}, indent=2))]
+        
+        async def execute(name: str, arguments: Dict[str, Any]) -> list[TextContent]:
+            timeout = arguments.get("timeout", self.request_timeout)
+            cancel = threading.Event()
+            # Clients that skip the initialized notification start warm-up with their first call.
+            self.warmup.start()
+            try:
+                with self.warmup.foreground():
+                    return await asyncio.wait_for(dispatch(name, arguments, cancel), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {name} timed out after {timeout} seconds")
+                return [TextContent(type="text", text=f"Error: {name} timed out after {timeout} seconds")]
+            except Exception as e:
+                logger.error(f"Error executing tool {name}: {e}")
+                return [TextContent(type="text", text=f"Error: {str(e)}")]
+            finally:
+                # Worker threads outlive a timed-out or client-cancelled request; this stops their scans.
+                cancel.set()
+        
+        async def dispatch(name: str, arguments: Dict[str, Any], cancel: threading.Event) -> list[TextContent]:
+            if name in PAGINATED_TOOLS and arguments.get("cursor"):
+                page = self.cursors.next_page(name, arguments["cursor"], arguments.get("page_bytes"))
+                return [TextContent(type="text", text=page)]
+            
+            if name == "search_notes":
+                errors = []
+                results = await to_thread(
+                    self.vaults.search_notes,
+                    query=arguments["query"],
+                    case_sensitive=arguments.get("case_sensitive", False),
+                    max_results=arguments.get("max_results", 20),
+                    vaults=arguments.get("vaults"),
+                    errors=errors,
+                    context_before=max(0, arguments.get("context_before", 0)),
+                    context_after=max(0, arguments.get("context_after", 0)),
+                    cancel=cancel,
+                    collapse_duplicates=arguments.get("collapse_duplicates", False)
+                )
+                meta = {"unreadable_files_skipped": errors} if errors else None
+                return self._first_page(name, results, arguments, meta)
+            
+            elif name == "find_duplicate_notes":
+                notes = self.vaults.get_notes(arguments.get("vault"))
+                results = await to_thread(
+                    notes.find_duplicates,
+                    threshold=arguments.get("threshold", 0.8),
+                    level=arguments.get("level", "note"),
+                    path=arguments.get("path"),
+                    limit=arguments.get("limit", 20)
+                )
+                if not results:
+                    return [TextContent(type="text", text="No near-duplicates found.")]
+                return self._first_page(name, results, arguments)
+            
+            elif name == "get_note_content":
+                notes = self.vaults.get_notes(arguments.get("vault"))
+                result = await to_thread(notes.get_note_content, arguments["path"])
+                return [TextContent(type="text", text=result["content"])]
+            
+            elif name == "list_recent_notes":
+                notes = self.vaults.get_notes(arguments.get("vault"))
+                results = await to_thread(
+                    notes.list_recent_notes,
+                    limit=arguments.get("limit", 10)
+                )
+                return self._first_page(name, results, arguments)
+            
+            elif name == "create_logseq_page":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                result = await to_thread(
+                    logseq.create_page,
+                    title=arguments["title"],
+                    content=arguments["content"],
+                    overwrite=arguments.get("overwrite", False)
+                )
+                return [TextContent(type="text", text=f"Page created: {result['path']}")]
+            
+            elif name == "create_logseq_journal":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                result = await to_thread(
+                    logseq.create_journal_entry,
+                    content=arguments["content"],
+                    date=arguments.get("date")
+                )
+                return [TextContent(type="text", text=f"Journal entry created: {result['path']}")]
+            
+            elif name == "summarize_content":
+                provider = arguments.get("model_provider", "local")
+                self._get_model_client(provider)
+                
+                summary = await self.scheduler.summarize(
+                    provider,
+                    content=arguments["content"],
+                    max_length=arguments.get("max_length"),
+                    priority=arguments.get("priority", "interactive")
+                )
+                return [TextContent(type="text", text=summary)]
+            
+            elif name == "extract_information":
+                provider = arguments.get("model_provider", "local")
+                self._get_model_client(provider)
+                
+                if arguments.get("content") is not None:
+                    info = await self.scheduler.extract_info(
+                        provider,
+                        content=arguments["content"],
                         query=arguments["query"],
-                        case_sensitive=arguments.get("case_sensitive", False),
-                        max_results=arguments.get("max_results", 20)
+                        priority=arguments.get("priority", "interactive")
                     )
-                    return [TextContent(type="text", text=str(results))]
+                    return [TextContent(type="text", text=info)]
                 
-                elif name == "get_note_content":
-                    result = self.notes.get_note_content(arguments["path"])
-                    return [TextContent(type="text", text=result["content"])]
+                blocks = await to_thread(self._retrieve_blocks, arguments, cancel)
+                if not blocks:
+                    return [TextContent(type="text", text="No relevant content found for that query.")]
                 
-                elif name == "list_recent_notes":
-                    results = self.notes.list_recent_notes(
-                        limit=arguments.get("limit", 10)
-                    )
-                    return [TextContent(type="text", text=str(results))]
+                info = await self.scheduler.extract_info(
+                    provider,
+                    content=format_context(blocks),
+                    query=arguments["query"],
+                    priority=arguments.get("priority", "interactive")
+                )
+                return [TextContent(type="text", text=f"{info}\n\nSources:\n{format_citations(blocks)}")]
+            
+            elif name == "get_logseq_page_context":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                context = await to_thread(
+                    logseq.get_page_context, arguments["title"], fuzzy=arguments.get("fuzzy", True),
+                    outline=arguments.get("outline", "full"), top=arguments.get("top", 10)
+                )
+                if context is None:
+                    text = f"Page '{arguments['title']}' does not exist."
+                    suggestions = await to_thread(logseq.find_pages, arguments["title"], limit=5, mode="fuzzy")
+                    if suggestions:
+                        text += " Similar pages: " + ", ".join(f"'{s['title']}'" for s in suggestions)
+                    return [TextContent(type="text", text=text)]
                 
-                elif name == "create_logseq_page":
-                    result = self.logseq.create_page(
-                        title=arguments["title"],
-                        content=arguments["content"],
-                        overwrite=arguments.get("overwrite", False)
-                    )
-                    return [TextContent(type="text", text=f"Page created: {result['path']}")]
+                # Compact separators: on long pages indentation would add more bytes than the outline itself.
+                return [TextContent(type="text", text=json.dumps(context, ensure_ascii=False, default=_json_default))]
+            
+            elif name == "find_logseq_pages":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                results = await to_thread(
+                    logseq.find_pages,
+                    arguments["query"],
+                    limit=arguments.get("limit", 10),
+                    mode=arguments.get("mode", "auto")
+                )
+                if not results:
+                    return [TextContent(type="text", text=f"No pages match '{arguments['query']}'.")]
+                return self._first_page(name, results, arguments)
+            
+            elif name == "list_logseq_templates":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                templates = await to_thread(logseq.list_available_templates)
+                if not templates:
+                    return [TextContent(type="text", text="No templates found in Logseq.")]
+                return self._first_page(name, sorted(templates, key=str.lower), arguments)
+            
+            elif name == "create_smart_logseq_page":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                result = await to_thread(
+                    logseq.create_page_with_context,
+                    title=arguments["title"],
+                    content=arguments["content"],
+                    template_name=arguments.get("template_name"),
+                    preserve_structure=arguments.get("preserve_structure", True),
+                    overwrite=arguments.get("overwrite", False)
+                )
                 
-                elif name == "create_logseq_journal":
-                    result = self.logseq.create_journal_entry(
-                        content=arguments["content"],
-                        date=arguments.get("date")
-                    )
-                    return [TextContent(type="text", text=f"Journal entry created: {result['path']}")]
+                status = "updated" if result["was_existing"] else "created"
+                template_info = f" using template '{result['used_template']}'" if result.get("used_template") else ""
+                return [TextContent(type="text", text=f"Page {status}: {result['path']}{template_info}")]
+            
+            elif name == "bulk_upsert_logseq_pages":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                pages = arguments["pages"]
+                for position, page in enumerate(pages):
+                    if not page.get("title") and not page.get("date"):
+                        raise ValueError(f"Page {position} needs a title or a date")
+                result = await to_thread(
+                    logseq.bulk_upsert_pages,
+                    pages,
+                    template_name=arguments.get("template_name")
+                )
                 
-                elif name == "summarize_content":
-                    provider = arguments.get("model_provider", "local")
-                    client = self._get_model_client(provider)
-                    
-                    summary = await client.summarize(
-                        content=arguments["content"],
-                        max_length=arguments.get("max_length")
+                text = (
+                    f"Processed {result['total']} pages: {result['created']} created, "
+                    f"{result['updated']} updated, {len(result['failed'])} failed"
+                )
+                if result["missing_templates"]:
+                    text += f"\nTemplates not found (default formatting used): {', '.join(result['missing_templates'])}"
+                if result["failed"]:
+                    failures = "\n".join(f"- {f['title']}: {f['error']}" for f in result["failed"])
+                    text += f"\n\nFailed:\n{failures}"
+                return [TextContent(type="text", text=text)]
+            
+            elif name in ("update_logseq_block", "insert_under_logseq_section", "replace_logseq_property"):
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                selector = {key: arguments.get(key) for key in BLOCK_SELECTOR_PROPERTIES}
+                if name == "update_logseq_block":
+                    result = await to_thread(
+                        logseq.update_block, arguments["title"], arguments["content"], **selector
                     )
-                    return [TextContent(type="text", text=summary)]
-                
-                elif name == "extract_information":
-                    provider = arguments.get("model_provider", "local")
-                    client = self._get_model_client(provider)
-                    
-                    info = await client.extract_info(
-                        content=arguments["content"],
-                        query=arguments["query"]
+                    action = f"Block at line {result['line']} updated"
+                elif name == "insert_under_logseq_section":
+                    result = await to_thread(
+                        logseq.insert_under_section,
+                        arguments["title"],
+                        arguments["section"],
+                        arguments["content"],
+                        position=arguments.get("position", "end"),
+                        create=arguments.get("create", True)
                     )
-                    return [TextContent(type="text", text=info)]
-                
-                elif name == "get_logseq_page_context":
-                    context = self.logseq.get_page_context(arguments["title"])
-                    if context is None:
-                        return [TextContent(type="text", text=f"Page '{arguments['title']}' does not exist.")]
-                    
-                    import json
-                    return [TextContent(type="text", text=json.dumps(context, indent=2))]
+                    action = f"Section '{arguments['section']}' {'created' if result['created_section'] else 'extended'}"
+                else:
+                    result = await to_thread(
+                        logseq.replace_property, arguments["title"], arguments["key"], arguments["value"], **selector
+                    )
+                    verb = "removed" if arguments["value"] is None else "set"
+                    action = f"Property '{arguments['key']}' {verb}"
                 
-                elif name == "list_logseq_templates":
-                    templates = self.logseq.list_available_templates()
-                    if not templates:
-                        return [TextContent(type="text", text="No templates found in Logseq.")]
-                    
-                    template_list = "\n".join([f"- {t}" for t in templates])
-                    return [TextContent(type="text", text=f"Available templates:\n{template_list}")]
+                if not result["changed"]:
+                    action += " (no change, file not written)"
+                return [TextContent(type="text", text=f"{action}: {result['path']}")]
+            
+            elif name == "query_logseq":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                result = await to_thread(
+                    logseq.query,
+                    arguments["query"],
+                    limit=arguments.get("limit", 50)
+                )
+                blocks = result.pop("blocks")
+                return self._first_page(name, blocks, arguments, result)
+            
+            elif name == "list_logseq_tasks":
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
+                result = await to_thread(
+                    logseq.list_tasks,
+                    markers=arguments.get("markers"),
+                    priorities=arguments.get("priorities"),
+                    page=arguments.get("page"),
+                    scheduled=arguments.get("scheduled"),
+                    deadline=arguments.get("deadline"),
+                    journal_date=arguments.get("journal_date"),
+                    overdue=arguments.get("overdue", False),
+                    sort=arguments.get("sort", "due"),
+                    limit=arguments.get("limit", 100)
+                )
+                tasks = result.pop("tasks")
+                return self._first_page(name, tasks, arguments, result)
+            
+            elif name == "get_journal_range":
+                if arguments.get("cursor"):
+                    position = decode_position(name, arguments["cursor"])
+                    arguments = {**position, "page_bytes": arguments.get("page_bytes")}
+                logseq = self.vaults.get_logseq(arguments.get("vault"))
                 
-                elif name == "create_smart_logseq_page":
-                    result = self.logseq.create_page_with_context(
-                        title=arguments["title"],
-                        content=arguments["content"],
-                        template_name=arguments.get("template_name"),
-                        preserve_structure=arguments.get("preserve_structure", True),
-                        overwrite=arguments.get("overwrite", False)
-                    )
-                    
-                    status = "updated" if result["was_existing"] else "created"
-                    template_info = f" using template '{result['used_template']}'" if result.get("used_template") else ""
-                    return [TextContent(type="text", text=f"Page {status}: {result['path']}{template_info}")]
+                if arguments.get("summarize", False):
+                    summary = await self._summarize_journal_range(logseq, arguments)
+                    if summary is None:
+                        return [TextContent(type="text", text="No journal entries in that range.")]
+                    return [TextContent(type="text", text=summary)]
                 
+                if "resume" in arguments:
+                    start, end = (date.fromisoformat(day) if day else None for day in arguments["span"])
+                    resume_day, resume_offset = arguments["resume"]
+                    resume = (date.fromisoformat(resume_day), resume_offset)
                 else:
-                    raise ValueError(f"Unknown tool: {name}")
+                    start, end = logseq.journal_span(arguments.get("range"), arguments.get("start"),
+                                                     arguments.get("end"))
+                    resume = None
+                page_bytes = max(arguments.get("page_bytes") or self.cursors.page_bytes, MIN_PAGE_BYTES)
+                page = await to_thread(
+                    logseq.journal_page, page_bytes, start, end,
+                    newest_first=arguments.get("newest_first", False), resume=resume
+                )
+                if not page["items"] and resume is None:
+                    return [TextContent(type="text", text="No journal entries in that range.")]
+                
+                next_position = page.pop("next")
+                page["next_cursor"] = encode_position(name, {
+                    "vault": arguments.get("vault"),
+                    "span": [start.isoformat() if start else None, end.isoformat() if end else None],
+                    "newest_first": arguments.get("newest_first", False),
+                    "resume": [next_position[0].isoformat(), next_position[1]]
+                }) if next_position else None
+                items = page.pop("items")
+                return [TextContent(type="text", text=json.dumps({**page, "items": items}, ensure_ascii=False))]
             
-            except Exception as e:
-                logger.error(f"Error executing tool {name}: {e}")
-                return [TextContent(type="text", text=f"Error: {str(e)}")]
+            elif name == "get_model_queue_metrics":
+                return [TextContent(type="text", text=json.dumps(self.scheduler.metrics(), indent=2))]
+            
+            elif name == "refresh_index":
+                stats = await to_thread(self.vaults.refresh, arguments.get("vault"))
+                
+                return [TextContent(type="text", text=json.dumps(stats, indent=2))]
+            
+            elif name == "set_profiling":
+                state = self.profiler.configure(arguments.get("mode", "off"), arguments.get("tools"))
+                return [TextContent(type="text", text=json.dumps(state, indent=2))]
+            
+            elif name == "get_warmup_status":
+                return [TextContent(type="text", text=json.dumps(self.warmup.status(), indent=2))]
+            
+            elif name == "list_vaults":
+                # Logseq, journal and duplicate index stats take their index locks, which a refresh may hold.
+                stats = await to_thread(self.vaults.stats)
+                return [TextContent(type="text", text=json.dumps(stats, indent=2))]
+            
+            elif name == "export_corpus":
+                names = arguments.get("vaults") or self.vaults.names()
+                result = await to_thread(
+                    self.exporter.export,
+                    [self.vaults.get(vault) for vault in names],
+                    since=arguments.get("since"),
+                    sources=tuple(arguments.get("sources") or ("notes", "logseq")),
+                    compression=arguments.get("compression", self.export_compression),
+                    cancel=cancel
+                )
+                return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            
+            else:
+                raise ValueError(f"Unknown tool: {name}")
+    
+    def _first_page(self, name: str, items: list, arguments: Dict[str, Any],
+                    meta: Optional[Dict[str, Any]] = None) -> list[TextContent]:
+        page = self.cursors.first_page(name, items, arguments.get("page_bytes"), meta)
+        return [TextContent(type="text", text=page)]
+    
+    def _retrieve_blocks(self, arguments: Dict[str, Any], cancel: Optional[threading.Event] = None) -> list:
+        query = arguments["query"]
+        top_k = arguments.get("top_k", 8)
+        source = arguments.get("source", "notes")
+        vault = self.vaults.get(arguments.get("vault"))
+        
+        blocks = []
+        if source in ("notes", "all") and vault.notes is not None:
+            blocks.extend(vault.notes.retrieve_blocks(
+                query,
+                top_k=top_k,
+                paths=arguments.get("paths"),
+                search=arguments.get("search"),
+                cancel=cancel
+            ))
+        if source in ("logseq", "all") and vault.logseq is not None:
+            blocks.extend(vault.logseq.retrieve_blocks(query, top_k=top_k))
+        
+        blocks.sort(key=lambda block: block['score'], reverse=True)
+        if arguments.get("collapse_duplicates", False):
+            blocks = collapse_near_duplicates(
+                blocks, text=lambda block: block['text'], threshold=COLLAPSE_THRESHOLD, key=format_location
+            )
+        return blocks[:top_k]
+    
+    async def _summarize_journal_range(self, logseq, arguments: Dict[str, Any]) -> Optional[str]:
+        """
+        Summarize a journal span in chunks of at most JOURNAL_CHUNK_BYTES, read one
+        part at a time, then summarize the chunk summaries (folding them again
+        whenever they outgrow a chunk), so memory stays bounded by the chunk size.
+        """
+        provider = arguments.get("model_provider", "local")
+        self._get_model_client(provider)
+        
+        async def summarize(content: str) -> str:
+            return await self.scheduler.summarize(
+                provider,
+                content=content,
+                max_length=arguments.get("max_length"),
+                priority=arguments.get("priority", "interactive")
+            )
+        
+        entries = logseq.iter_journal_range(
+            date_range=arguments.get("range"),
+            start=arguments.get("start"),
+            end=arguments.get("end"),
+            newest_first=arguments.get("newest_first", False),
+            max_bytes=JOURNAL_CHUNK_BYTES
+        )
+        partials: list = []
+        chunk: list = []
+        days: list = []
+        used = 0
+        try:
+            while True:
+                entry = await to_thread(next, entries, None)
+                size = 0 if entry is None else entry["next_offset"] - entry["offset"]
+                if chunk and (entry is None or used + size > JOURNAL_CHUNK_BYTES):
+                    summary = await summarize("\n\n".join(chunk))
+                    if entry is None and not partials:
+                        return summary
+                    partials.append(f"## {days[0]}..{days[-1]}\n{summary}")
+                    if sum(len(partial) for partial in partials) > JOURNAL_CHUNK_BYTES:
+                        partials = [await summarize("\n\n".join(partials))]
+                    chunk, days, used = [], [], 0
+                if entry is None:
+                    break
+                chunk.append(f"## {entry['date']}\n{entry['content']}" if entry["offset"] == 0 else entry["content"])
+                days.append(entry["date"])
+                used += size
+        finally:
+            entries.close()
+        
+        if not partials:
+            return None
+        return await summarize("\n\n".join(partials))
     
     def _get_model_client(self, provider: str):
         if provider == "local":
@@ -361,21 +1368,68 @@ class NotesLogseqServer:
         else:
             raise ValueError(f"Unknown provider: {provider}")
     
-    async def run(self):
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream,
-                write_stream,
-                self.server.create_initialization_options()
-            )
+    async def run(self, transport: Optional[str] = None):
+        """Serve over stdio (one client) or streamable HTTP (many concurrent clients, shared indexes)."""
+        transport = transport or self.server_config['transport']
+        if transport == "stdio":
+            async with stdio_server() as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options()
+                )
+        elif transport == "http":
+            await self.run_http()
+        else:
+            raise ValueError(f"Unknown transport: {transport}. Use 'stdio' or 'http'.")
+    
+    def create_http_app(self) -> Starlette:
+        """
+        ASGI app serving the MCP streamable HTTP transport at server.path.
+        Responses stream as SSE unless server.json_response is set. Every request
+        is handled in its own task, so slow tool calls do not block other clients.
+        """
+        manager = StreamableHTTPSessionManager(
+            app=self.server,
+            json_response=self.server_config['json_response'],
+            stateless=self.server_config['stateless']
+        )
+        
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            async with manager.run():
+                yield
+        
+        return Starlette(routes=[Route(self.server_config['path'], endpoint=SessionManagerEndpoint(manager))], lifespan=lifespan)
+    
+    async def run_http(self):
+        config = uvicorn.Config(
+            self.create_http_app(),
+            host=self.server_config['host'],
+            port=self.server_config['port'],
+            log_level=self.config.get_logging_level().lower()
+        )
+        logger.info(
+            f"Serving MCP over HTTP at http://{self.server_config['host']}:{self.server_config['port']}"
+            f"{self.server_config['path']}"
+        )
+        await uvicorn.Server(config).serve()
 
 
 async def main():
-    config_path = sys.argv[1] if len(sys.argv) > 1 else "config.json"
+    parser = argparse.ArgumentParser(description="Notes and Logseq MCP server")
+    parser.add_argument("config", nargs="?", default="config.json", help="Path to config.json")
+    parser.add_argument("--transport", choices=["stdio", "http"], help="Override server.transport")
+    parser.add_argument("--host", help="Override server.host")
+    parser.add_argument("--port", type=int, help="Override server.port")
+    args = parser.parse_args()
     
-    server = NotesLogseqServer(config_path)
-    await server.run()
-
+    server = NotesLogseqServer(args.config)
+    if args.host:
+        server.server_config['host'] = args.host
+    if args.port:
+        server.server_config['port'] = args.port
+    await server.run(args.transport)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,18 +1,55 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 from pathlib import Path
-from typing import Dict, Any, Optional, List
-from datetime import datetime
-from ..utils.file_utils import write_markdown_file, read_markdown_file
+from typing import Dict, Any, Optional, List, Iterator, Callable, Tuple
+from datetime import date, datetime
+from ..utils.file_utils import (
+    read_markdown_file, path_lock, read_versioned, write_if_unchanged, WriteConflictError
+)
 from ..utils.logseq_parser import LogseqParser
+from ..utils.logseq_index import LogseqIndex, is_page_name
+from ..utils.outline_map import OutlineCache, OutlineMap, indent_outline
+from ..utils.graph_snapshot import snapshot_path
+from ..utils.logseq_query import evaluate_query, parse_date_range
+from ..utils.logseq_tasks import list_tasks
+from ..utils.journal_index import JournalIndex
+from ..utils.retrieval import BlockScorer, query_terms
+from ..utils.traversal import Traversal
+
+
+logger = logging.getLogger(__name__)
+
+# Attempts at a read-modify-write before an external writer's conflict is reported.
+WRITE_RETRIES = 3
+
+# Minimum title similarity for a fuzzy fallback to pick a page on its own.
+FUZZY_RESOLVE_THRESHOLD = 0.6
+
+PROPERTY_KEY_PATTERN = re.compile(r'^\w+(?:-\w+)*$')
 
 
 class LogseqTools:
-    def __init__(self, logseq_path: Path):
+    def __init__(self, logseq_path: Path, index_max_age: Optional[float] = 30.0,
+                 cache_dir: Optional[Path] = None, traversal: Optional[Traversal] = None):
         self.logseq_path = logseq_path
         self.pages_path = logseq_path / "pages"
         self.journals_path = logseq_path / "journals"
+        self.traversal = traversal or Traversal()
         
         self.pages_path.mkdir(parents=True, exist_ok=True)
         self.journals_path.mkdir(parents=True, exist_ok=True)
+        
+        self.index = LogseqIndex(
+            logseq_path,
+            max_age=index_max_age,
+            snapshot_path=snapshot_path(cache_dir, logseq_path) if cache_dir is not None else None,
+            traversal=self.traversal
+        )
+        self.journals = JournalIndex(self.journals_path, traversal=self.traversal)
+        self.outlines = OutlineCache()
     
     def create_page(self, title: str, content: str, overwrite: bool = False) -> Dict[str, Any]:
         if not self.logseq_path.exists():
@@ -21,11 +58,12 @@ class LogseqTools:
         safe_title = self._sanitize_filename(title)
         page_path = self.pages_path / f"{safe_title}.md"
         
-        if page_path.exists() and not overwrite:
-            existing_content = read_markdown_file(page_path)
-            content = f"{existing_content}\n\n---\n\n{content}"
+        def merge(existing: Optional[str]) -> str:
+            if existing is not None and not overwrite:
+                return f"{existing}\n\n---\n\n{content}"
+            return content
         
-        write_markdown_file(page_path, content)
+        self._modify_file(page_path, merge)
         
         return {
             'title': title,
@@ -41,11 +79,12 @@ class LogseqTools:
         if not page_path.exists():
             return self.create_page(title, content)
         
-        if append:
-            existing_content = read_markdown_file(page_path)
-            content = f"{existing_content}\n\n{content}"
+        def merge(existing: Optional[str]) -> str:
+            if append and existing is not None:
+                return f"{existing}\n\n{content}"
+            return content
         
-        write_markdown_file(page_path, content)
+        self._modify_file(page_path, merge)
         
         return {
             'title': title,
@@ -60,11 +99,13 @@ class LogseqTools:
         
         journal_path = self.journals_path / f"{date}.md"
         
-        if journal_path.exists():
-            existing_content = read_markdown_file(journal_path)
-            content = f"{existing_content}\n\n{content}"
+        def merge(existing: Optional[str]) -> str:
+            if existing is not None:
+                return f"{existing}\n\n{content}"
+            return content
         
-        write_markdown_file(journal_path, content)
+        self._modify_file(journal_path, merge)
+        self.journals.update_file(journal_path)
         
         return {
             'date': date,
@@ -72,34 +113,104 @@ class LogseqTools:
             'created': datetime.now().isoformat()
         }
     
-    def get_page_context(self, title: str) -> Optional[Dict[str, Any]]:
+    def get_page_context(self, title: str, fuzzy: bool = False, outline: str = 'full',
+                         top: int = 10) -> Optional[Dict[str, Any]]:
         """
         Get context about an existing Logseq page.
         Returns structure, properties, and formatting information.
+        The title may also be an alias or differ in case; with fuzzy, a close
+        misspelling is resolved to the best matching page.
+        outline is 'full' (every line, as a CompactOutline), 'summary' (counts per
+        level and the first `top` headings and top-level blocks) or 'none'.
         """
-        safe_title = self._sanitize_filename(title)
-        page_path = self.pages_path / f"{safe_title}.md"
-        
-        if not page_path.exists():
+        if outline not in ('full', 'summary', 'none'):
+            raise ValueError(f"Unknown outline mode: {outline}. Use full, summary or none")
+        resolved = self.resolve_page(title, fuzzy=fuzzy)
+        if resolved is None:
             return None
+        page_path = Path(resolved['path'])
         
         content = read_markdown_file(page_path)
         analysis = LogseqParser.analyze_page_structure(content)
+        if outline == 'summary':
+            analysis['outline'] = analysis['outline'].summary(top)
+        elif outline == 'none':
+            del analysis['outline']
         
-        return {
-            'title': title,
+        context = {
+            'title': resolved['title'],
             'path': str(page_path),
             'exists': True,
             'analysis': analysis,
             'content': content
         }
+        if resolved['title'] != title:
+            context['resolved_from'] = title
+            context['match'] = {'matched': resolved['matched'], 'kind': resolved['kind'], 'score': resolved['score']}
+        return context
+    
+    def find_pages(self, query: str, limit: int = 10, mode: str = 'auto') -> List[Dict[str, Any]]:
+        """
+        Look up pages by title, alias or namespace segment.
+        mode is 'exact', 'prefix' (autocomplete), 'fuzzy' (trigram similarity)
+        or 'auto' (all three, best score per page).
+        """
+        if mode not in ('auto', 'exact', 'prefix', 'fuzzy'):
+            raise ValueError(f"Unknown mode: {mode}. Use auto, exact, prefix or fuzzy")
+        
+        self.index.ensure_fresh()
+        with self.index.lock:
+            titles = self.index.titles
+            if mode == 'exact':
+                matches = titles.exact(query)
+            elif mode == 'prefix':
+                matches = titles.prefix(query, limit)
+            elif mode == 'fuzzy':
+                matches = titles.fuzzy(query, limit)
+            else:
+                matches = titles.exact(query) + titles.prefix(query, limit) + titles.fuzzy(query, limit)
+            
+            best: Dict[str, Dict[str, Any]] = {}
+            for match in matches:
+                current = best.get(match['page_key'])
+                if current is None or match['score'] > current['score']:
+                    best[match['page_key']] = match
+            
+            ranked = sorted(best.values(), key=lambda match: (-match['score'], match['matched']))
+            results = []
+            for match in ranked[:limit]:
+                page = self.index.pages[match['page_key']]
+                results.append({
+                    'title': page['name'],
+                    'path': page['path'],
+                    'matched': match['matched'],
+                    'kind': match['kind'],
+                    'score': match['score']
+                })
+            return results
+    
+    def resolve_page(self, title: str, fuzzy: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Find the page a title refers to: its file name first, then an exact title or
+        alias match, then (with fuzzy) the best fuzzy match above FUZZY_RESOLVE_THRESHOLD.
+        """
+        page_path = self.pages_path / f"{self._sanitize_filename(title)}.md"
+        if page_path.exists():
+            return {'title': title, 'path': str(page_path), 'matched': title, 'kind': 'name', 'score': 1.0}
+        
+        matches = self.find_pages(title, limit=1, mode='exact')
+        if not matches and fuzzy:
+            matches = [m for m in self.find_pages(title, limit=1, mode='fuzzy') if m['score'] >= FUZZY_RESOLVE_THRESHOLD]
+        if matches and Path(matches[0]['path']).exists():
+            return matches[0]
+        return None
     
     def find_template(self, template_name: str) -> Optional[Dict[str, Any]]:
         """
         Find and analyze a template by name.
         Returns template structure and properties.
         """
-        templates = LogseqParser.find_templates(self.logseq_path)
+        templates = self._find_templates()
         
         # Try exact match first
         if template_name in templates:
@@ -129,9 +240,23 @@ class LogseqTools:
         """
         List all available templates in Logseq.
         """
-        templates = LogseqParser.find_templates(self.logseq_path)
+        templates = self._find_templates()
         return list(templates.keys())
     
+    def _find_templates(self) -> Dict[str, Path]:
+        """
+        Pages in templates/ plus indexed pages carrying a template property.
+        """
+        templates = {}
+        walk = self.traversal.walk(self.logseq_path / "templates", accept=is_page_name, recursive=False)
+        for name, entry in walk:
+            templates[name[:-len('.md')]] = Path(entry.path)
+        
+        self.index.ensure_fresh()
+        with self.index.lock:
+            templates.update(self.index.templates())
+        return templates
+    
     def create_page_with_context(self, 
                                   title: str, 
                                   content: str, 
@@ -151,40 +276,15 @@ class LogseqTools:
         safe_title = self._sanitize_filename(title)
         page_path = self.pages_path / f"{safe_title}.md"
         
-        # Check if page exists
-        page_exists = page_path.exists()
-        
-        if page_exists and not overwrite:
-            # Update existing page preserving structure
-            if preserve_structure:
-                existing_content = read_markdown_file(page_path)
-                existing_analysis = LogseqParser.analyze_page_structure(existing_content)
-                
-                # Format new content as outline
-                formatted_content = self._format_content_as_outline(content)
-                
-                # Append to existing content
-                final_content = f"{existing_content}\n\n{formatted_content}"
-            else:
-                # Simple append
-                existing_content = read_markdown_file(page_path)
-                final_content = f"{existing_content}\n\n{content}"
-        
-        elif template_name:
-            # Use template for new page
+        # Resolve the template before taking the page lock; it may read other pages.
+        template_info = None
+        if template_name and (overwrite or not page_path.exists()):
             template_info = self.find_template(template_name)
-            if template_info:
-                template_structure = template_info['structure']
-                final_content = LogseqParser.merge_with_template(template_structure, content)
-            else:
-                # Template not found, use default formatting
-                final_content = self._format_content_as_outline(content)
-        
-        else:
-            # New page without template
-            final_content = self._format_content_as_outline(content)
         
-        write_markdown_file(page_path, final_content)
+        merge = self._smart_merge(
+            content, template_info['structure'] if template_info else None, preserve_structure, overwrite
+        )
+        _, page_exists = self._modify_file(page_path, merge)
         
         return {
             'title': title,
@@ -195,6 +295,445 @@ class LogseqTools:
             'overwritten': overwrite
         }
     
+    def bulk_upsert_pages(self, pages: List[Dict[str, Any]], template_name: Optional[str] = None,
+                          max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Create or update many pages in one call, with create_page_with_context semantics.
+        
+        Each item has 'title' (a page) or 'date' (a journal, YYYY_MM_DD, always appended),
+        plus 'content' and optionally 'template_name', 'preserve_structure' and 'overwrite'.
+        Templates are resolved once, writes run in parallel on a thread pool (items for
+        the same file are applied in order by one worker) and the indexes are updated
+        once at the end. A failing item is reported without stopping the others.
+        """
+        template_names = {item.get('template_name', template_name) for item in pages} - {None}
+        templates = {name: self.find_template(name) for name in template_names}
+        
+        jobs = []
+        for position, item in enumerate(pages):
+            if item.get('date'):
+                file_path = self.journals_path / f"{self._sanitize_filename(item['date'])}.md"
+            else:
+                file_path = self.pages_path / f"{self._sanitize_filename(item['title'])}.md"
+            jobs.append((file_path, position, item))
+        
+        # Group by directory, then by file, keeping the submitted order within each file.
+        jobs.sort(key=lambda job: (str(job[0].parent), str(job[0]), job[1]))
+        groups = []
+        for directory, directory_jobs in groupby(jobs, key=lambda job: job[0].parent):
+            directory.mkdir(parents=True, exist_ok=True)
+            for file_path, file_jobs in groupby(directory_jobs, key=lambda job: job[0]):
+                groups.append((file_path, [(position, item) for _, position, item in file_jobs]))
+        
+        def write_group(file_path: Path, items: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+            outcomes = []
+            with path_lock(file_path):
+                for position, item in items:
+                    outcome = {'index': position, 'title': item.get('title') or item.get('date'), 'path': str(file_path)}
+                    try:
+                        if item.get('date'):
+                            merge = self._smart_merge(item['content'], None, False, False)
+                        else:
+                            template = templates.get(item.get('template_name', template_name))
+                            merge = self._smart_merge(
+                                item['content'],
+                                template['structure'] if template else None,
+                                item.get('preserve_structure', True),
+                                item.get('overwrite', False)
+                            )
+                        _, outcome['was_existing'] = self._modify_file(file_path, merge, update_index=False)
+                    except Exception as e:
+                        outcome['error'] = str(e)
+                    outcomes.append(outcome)
+            return outcomes
+        
+        workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-upsert") as pool:
+            futures = [pool.submit(write_group, file_path, items) for file_path, items in groups]
+            outcomes = sorted(
+                (outcome for future in futures for outcome in future.result()),
+                key=lambda outcome: outcome['index']
+            )
+        
+        written = [file_path for file_path, _ in groups]
+        self.index.update_files(written)
+        for file_path in written:
+            if file_path.parent == self.journals_path:
+                self.journals.update_file(file_path)
+        
+        failed = [outcome for outcome in outcomes if 'error' in outcome]
+        return {
+            'total': len(outcomes),
+            'created': sum(1 for outcome in outcomes if outcome.get('was_existing') is False),
+            'updated': sum(1 for outcome in outcomes if outcome.get('was_existing') is True),
+            'failed': failed,
+            'missing_templates': sorted(name for name, template in templates.items() if template is None),
+            'pages': outcomes
+        }
+    
+    def update_block(self, title: str, content: str, line: Optional[int] = None,
+                     block_id: Optional[str] = None, match: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Replace the text of one block, keeping its indentation, bullet, children and
+        any properties (such as id::) that content does not set itself.
+        
+        Args:
+            title: Page title or alias, or a journal date (YYYY_MM_DD)
+            content: New block text; extra lines become continuation lines
+            line: A line inside the block (as reported by query_logseq)
+            block_id: The block's id:: property
+            match: The block's first-line text (case-insensitive, must be unique)
+        """
+        def patch(existing: str, outline: OutlineMap) -> Tuple[int, int, str, Dict[str, Any]]:
+            position = outline.select(line=line, block_id=block_id, match=match)
+            start, end = outline.starts[position], outline.ends[position]
+            indent = outline.indents[position]
+            bullet = outline.bullets[position]
+            continuation = indent + ('  ' if bullet else '')
+            
+            new_lines = content.strip('\n').split('\n')
+            first = new_lines[0].strip()
+            if bullet and (first == '-' or first.startswith('- ')):
+                first = first[2:]
+            set_keys = {
+                parsed[0] for parsed in map(LogseqParser.parse_property_line, new_lines) if parsed is not None
+            }
+            kept = []
+            for old in existing[start:end].split('\n')[1:]:
+                parsed = LogseqParser.parse_property_line(old)
+                if parsed is not None and parsed[0] not in set_keys:
+                    kept.append(old)
+            
+            replacement = '\n'.join(
+                [f"{indent}- {first}" if bullet else f"{indent}{first}"] +
+                [continuation + text if text.strip() else '' for text in new_lines[1:]] +
+                kept
+            )
+            return start, end, replacement, {'line': outline.lines[position], 'previous': existing[start:end]}
+        
+        return self._patch_page(title, patch)
+    
+    def insert_under_section(self, title: str, section: str, content: str, position: str = 'end',
+                             create: bool = True) -> Dict[str, Any]:
+        """
+        Add content as child blocks of a section, leaving the rest of the page untouched.
+        
+        Args:
+            title: Page title or alias, or a journal date (YYYY_MM_DD)
+            section: Text of the section block or heading ('## ' markers and case are ignored)
+            content: Lines to insert; each becomes a bullet, relative indentation is kept
+            position: 'end' (after the section's last descendant) or 'start' (first child)
+            create: Append the section as a new top-level block when the page has none
+        """
+        if position not in ('start', 'end'):
+            raise ValueError(f"Unknown position: {position}. Use start or end")
+        
+        def patch(existing: str, outline: OutlineMap) -> Tuple[int, int, str, Dict[str, Any]]:
+            matches = outline.find_text(section)
+            if not matches:
+                if not create:
+                    raise ValueError(f"Section '{section}' not found in {title}")
+                lines = [f"- {section.strip()}"] + indent_outline(content, outline.indent_unit, outline.indent_unit)
+                text = '\n'.join(lines)
+                if existing.endswith('\n') or not existing:
+                    text += '\n'
+                else:
+                    text = '\n' + text
+                offset = len(existing)
+                return offset, offset, text, {'line': None, 'created_section': True}
+            
+            target = matches[0]
+            anchor = target if position == 'start' else outline.subtree_end(target)
+            lines = indent_outline(content, outline.child_indent(target), outline.indent_unit)
+            if not lines:
+                raise ValueError("Nothing to insert")
+            offset = outline.ends[anchor]
+            return offset, offset, '\n' + '\n'.join(lines), {
+                'line': outline.end_lines[anchor] + 1, 'created_section': False
+            }
+        
+        return self._patch_page(title, patch)
+    
+    def replace_property(self, title: str, key: str, value: Optional[str], line: Optional[int] = None,
+                         block_id: Optional[str] = None, match: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Set (or with value None, remove) a property in place: a page property by
+        default, or a block property when line, block_id or match selects a block.
+        """
+        if not PROPERTY_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid property name: {key}")
+        
+        def patch(existing: str, outline: OutlineMap) -> Tuple[int, int, str, Dict[str, Any]]:
+            if line is None and block_id is None and match is None:
+                position = outline.page_properties()
+                if position is None:
+                    # No page properties yet: they go before the first block.
+                    if value is None:
+                        return 0, 0, '', {'line': None, 'previous': None}
+                    separator = '\n\n' if existing.strip() else '\n'
+                    return 0, 0, f"{key}:: {value}{separator}", {'line': 1, 'previous': None}
+                prefix = ''
+                own_lines = existing[outline.starts[position]:outline.ends[position]].split('\n')
+                first_property = 0
+            else:
+                position = outline.select(line=line, block_id=block_id, match=match)
+                prefix = outline.indents[position] + ('  ' if outline.bullets[position] else '')
+                own_lines = existing[outline.starts[position]:outline.ends[position]].split('\n')
+                first_property = 1
+            
+            previous = None
+            for number in range(first_property, len(own_lines)):
+                parsed = LogseqParser.parse_property_line(own_lines[number])
+                if parsed is not None and parsed[0] == key:
+                    previous = parsed[1]
+                    line_prefix = own_lines[number][:len(own_lines[number]) - len(own_lines[number].lstrip())]
+                    if value is None:
+                        del own_lines[number]
+                    else:
+                        own_lines[number] = f"{line_prefix}{key}:: {value}"
+                    break
+            else:
+                if value is not None:
+                    own_lines.append(f"{prefix}{key}:: {value}")
+            
+            start, end = outline.starts[position], outline.ends[position]
+            if not own_lines:
+                # The last page property went; drop the blank lines that separated it too.
+                while end < len(existing) and existing[end] == '\n':
+                    end += 1
+            return start, end, '\n'.join(own_lines), {'line': outline.lines[position], 'previous': previous}
+        
+        result = self._patch_page(title, patch)
+        result['property'] = key
+        result['value'] = value
+        return result
+    
+    def query(self, query: str, limit: int = 50) -> Dict[str, Any]:
+        """
+        Run a query (see utils.logseq_query) against the in-memory block index.
+        """
+        self.index.ensure_fresh()
+        with self.index.lock:
+            return evaluate_query(self.index, query, limit=limit)
+    
+    def list_tasks(self, **filters) -> Dict[str, Any]:
+        """
+        List task blocks across pages and journals (see utils.logseq_tasks for the filters).
+        """
+        self.index.ensure_fresh()
+        with self.index.lock:
+            return list_tasks(self.index, **filters)
+    
+    def retrieve_blocks(self, query: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        """
+        Return the top-k Logseq blocks for a question.
+        Candidates come from the block index postings; only they are scored.
+        """
+        self.index.ensure_fresh()
+        scorer = BlockScorer(query)
+        
+        with self.index.lock:
+            candidates = {}
+            for term in set(query_terms(query)):
+                for page_key, block_indexes in self.index.lookup_term(term).items():
+                    candidates.setdefault(page_key, set()).update(block_indexes)
+            
+            for page_key, block_indexes in candidates.items():
+                page = self.index.pages[page_key]
+                for block_index in sorted(block_indexes):
+                    block = page['blocks'][block_index]
+                    scorer.add('\n'.join(block['lines']), {
+                        'path': page_key,
+                        'page': page['name'],
+                        'line': block['line'],
+                        'end_line': block['line'] + len(block['lines']) - 1
+                    })
+            
+            total_blocks = self.index.stats()['blocks']
+        
+        return scorer.top(top_k, total_blocks=total_blocks)
+    
+    def journal_span(self, date_range: Optional[str] = None, start: Optional[str] = None,
+                     end: Optional[str] = None) -> Tuple[Optional[date], Optional[date]]:
+        """
+        Resolve a range expression such as 'last 2 weeks', 'this-month' or
+        '2024-01-01..2024-01-31', or else start/end dates (YYYY-MM-DD or YYYY_MM_DD),
+        to inclusive (start, end) dates; None leaves that side open.
+        """
+        if date_range:
+            return parse_date_range(date_range)
+        return (parse_date_range(start)[0] if start else None,
+                parse_date_range(end)[1] if end else None)
+    
+    def iter_journal_range(self, date_range: Optional[str] = None, start: Optional[str] = None,
+                           end: Optional[str] = None, newest_first: bool = False,
+                           max_bytes: Optional[int] = None,
+                           resume: Optional[Tuple[date, int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream journal entries for a date span in date order.
+        
+        Args:
+            date_range: Range expression such as 'last 2 weeks', 'this-month' or '2024-01-01..2024-01-31'
+            start: Inclusive start date (YYYY-MM-DD or YYYY_MM_DD), used when date_range is omitted
+            end: Inclusive end date, used when date_range is omitted
+            newest_first: Yield the most recent entries first
+            max_bytes: Split journals larger than this at top-level blocks
+            resume: (date, byte offset) of the first part to yield, from an earlier item
+        """
+        start_date, end_date = self.journal_span(date_range, start, end)
+        return self.journals.iter_entries(start_date, end_date, reverse=newest_first,
+                                          max_bytes=max_bytes, resume=resume)
+    
+    def journal_page(self, page_bytes: int, start: Optional[date] = None, end: Optional[date] = None,
+                     newest_first: bool = False, resume: Optional[Tuple[date, int]] = None) -> Dict[str, Any]:
+        """
+        One page of a journal span: the entries, or block-aligned parts of large
+        ones, that fit in page_bytes (at least one part). 'next' is the
+        (date, offset) to resume from, None after the last part. Only the parts
+        on the page are read.
+        """
+        items = []
+        used = 0
+        next_position = None
+        entries = self.journals.iter_entries(start, end, reverse=newest_first, max_bytes=page_bytes, resume=resume)
+        try:
+            for entry in entries:
+                size = entry['next_offset'] - entry['offset']
+                if items and used + size > page_bytes:
+                    next_position = (date.fromisoformat(entry['date']), entry['offset'])
+                    break
+                items.append({
+                    'date': entry['date'],
+                    'block_count': entry['block_count'],
+                    'offset': entry['offset'],
+                    'content': entry['content']
+                })
+                used += size
+        finally:
+            entries.close()
+        
+        return {
+            'days': len(self.journals.span(start, end)),
+            'returned': len(items),
+            'next': next_position,
+            'items': items
+        }
+    
+    def corpus_entries(self) -> List[Dict[str, Any]]:
+        """
+        Every page for a corpus export: key ('pages/<file>' or 'journals/<file>')
+        as relative_path, with stat, content digest (hex), title, journal date and
+        page properties from the index, so unchanged pages are never read.
+        """
+        self.index.ensure_fresh()
+        with self.index.lock:
+            return [
+                {
+                    'relative_path': key,
+                    'path': record['path'],
+                    'mtime': record['mtime'],
+                    'size': record['size'],
+                    'digest': record['digest'].hex(),
+                    'title': record['name'],
+                    'journal_date': record['journal_date'].isoformat() if record['journal_date'] else None,
+                    'properties': record['page_properties']
+                }
+                for key, record in sorted(self.index.pages.items())
+            ]
+    
+    def refresh_index(self) -> Dict[str, Any]:
+        counts = self.index.refresh()
+        counts.update(self.index.stats())
+        self.journals.refresh()
+        return counts
+    
+    def _smart_merge(self, content: str, template_structure: Optional[Dict[str, Any]],
+                     preserve_structure: bool, overwrite: bool) -> Callable[[Optional[str]], str]:
+        """
+        Build the merge function used by create_page_with_context for one piece of content.
+        """
+        def merge(existing: Optional[str]) -> str:
+            if existing is None or overwrite:
+                if template_structure is not None:
+                    return LogseqParser.merge_with_template(template_structure, content)
+                return self._format_content_as_outline(content)
+            if preserve_structure:
+                # Append as an outline to keep the page's structure
+                return f"{existing}\n\n{self._format_content_as_outline(content)}"
+            # Simple append
+            return f"{existing}\n\n{content}"
+        return merge
+    
+    def _patch_page(self, title: str,
+                    patch: Callable[[str, OutlineMap], Tuple[int, int, str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Apply a block patch to an existing page or journal.
+        patch(content, outline) returns (start, end, replacement, details); only that
+        range is spliced, the outline map is updated for the next patch instead of
+        rebuilt, and nothing is written when the splice changes nothing.
+        
+        Only the parsing is incremental. I/O is proportional to the file, not to the
+        change: the whole page is read, hashed once (the digest read_versioned takes
+        for conflict detection also keys the outline cache), and written back whole
+        through a temporary file, and the new content is hashed once for the cache.
+        """
+        resolved = self.resolve_page(title)
+        if resolved is not None:
+            page_path = Path(resolved['path'])
+        else:
+            page_path = self.journals_path / f"{self._sanitize_filename(title)}.md"
+            if not page_path.exists():
+                raise FileNotFoundError(f"Page not found: {title}")
+        
+        details: Dict[str, Any] = {}
+        
+        def merge(existing: Optional[str], version: Optional[Tuple[int, int, bytes]]) -> str:
+            if existing is None:
+                raise FileNotFoundError(f"Page not found: {title}")
+            outline = self.outlines.get(str(page_path), existing, digest=version[2])
+            start, end, replacement, patch_details = patch(existing, outline)
+            content, new_outline = outline.splice(existing, start, end, replacement)
+            details.clear()
+            details.update(patch_details)
+            details['changed'] = content != existing
+            details['outline'] = new_outline
+            return content
+        
+        content, _ = self._modify_file(page_path, merge, versioned=True)
+        new_outline = details.pop('outline')
+        if details['changed']:
+            self.outlines.put(str(page_path), content, new_outline)
+        if page_path.parent == self.journals_path and details['changed']:
+            self.journals.update_file(page_path)
+        
+        return {'title': resolved['title'] if resolved else title, 'path': str(page_path), **details}
+    
+    def _modify_file(self, file_path: Path, merge: Callable[..., str],
+                     update_index: bool = True, versioned: bool = False) -> Tuple[str, bool]:
+        """
+        Read-modify-write a page under its path lock.
+        merge(existing content or None) builds the new content; with versioned, it is
+        called as merge(existing, version) with the read_versioned stamp. If another
+        process (e.g. Logseq) writes the file in between, it is re-read and merge
+        re-applied. Returns the written content and whether the file existed. Nothing
+        is written when merge leaves the content as it was.
+        """
+        with path_lock(file_path):
+            for attempt in range(WRITE_RETRIES):
+                existing, version = read_versioned(file_path)
+                content = merge(existing, version) if versioned else merge(existing)
+                if content == existing:
+                    return content, True
+                try:
+                    write_if_unchanged(file_path, content, version)
+                except WriteConflictError:
+                    logger.info(f"{file_path} changed while writing, retrying ({attempt + 1}/{WRITE_RETRIES})")
+                    continue
+                if update_index:
+                    self.index.update_file(file_path)
+                return content, existing is not None
+        raise WriteConflictError(file_path)
+    
     def _format_content_as_outline(self, content: str) -> str:
         """
         Format content as Logseq outline structure.
@@ -1,17 +1,43 @@
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ..utils.file_utils import search_markdown_files, read_markdown_file, get_file_metadata
+from ..utils.file_index import FileIndex
+from ..utils.minhash import DuplicateIndex, cluster_pairs
+from ..utils.profiling import section
+from ..utils.readers import get_reader
+from ..utils.retrieval import iter_text_blocks, retrieve_from_files
+from ..utils.traversal import Traversal
+
+
+# Estimated similarity above which search results are folded into a better-ranked one.
+COLLAPSE_THRESHOLD = 0.8
 
 
 class NotesTools:
-    def __init__(self, notes_path: Path):
+    def __init__(self, notes_path: Path, index_max_age: Optional[float] = 60.0,
+                 max_file_size: Optional[int] = None, traversal: Optional[Traversal] = None):
         self.notes_path = notes_path
+        self.max_file_size = max_file_size
+        self.index = FileIndex(notes_path, max_age=index_max_age, traversal=traversal)
+        self.duplicates = DuplicateIndex()
     
-    def search_notes(self, query: str, case_sensitive: bool = False, max_results: int = 20) -> List[Dict[str, Any]]:
+    def search_notes(self, query: str, case_sensitive: bool = False, max_results: int = 20,
+                     errors: Optional[List[Dict[str, str]]] = None, context_before: int = 0,
+                     context_after: int = 0, cancel: Optional[threading.Event] = None,
+                     collapse_duplicates: bool = False) -> List[Dict[str, Any]]:
         if not self.notes_path.exists():
             raise FileNotFoundError(f"Notes directory not found: {self.notes_path}")
         
-        results = search_markdown_files(self.notes_path, query, case_sensitive)
+        with section('notes_scan'):
+            files = [entry['path'] for entry in self.index.entries()]
+            results = search_markdown_files(
+                self.notes_path, query, case_sensitive, files=files, errors=errors,
+                max_file_size=self.max_file_size, context_before=context_before, context_after=context_after,
+                cancel=cancel
+            )
+        if collapse_duplicates:
+            results = self._collapse_duplicates(results)
         
         return results[:max_results]
     
@@ -35,14 +61,125 @@ class NotesTools:
         
         notes = []
         
-        for file_path in self.notes_path.rglob('*.md'):
-            try:
-                metadata = get_file_metadata(file_path)
-                metadata['relative_path'] = str(file_path.relative_to(self.notes_path))
-                notes.append(metadata)
-            except Exception:
-                continue
+        for entry in self.index.entries():
+            notes.append({
+                'path': str(entry['path']),
+                'size': entry['size'],
+                'created': entry['created'],
+                'modified': entry['modified'],
+                'relative_path': entry['relative_path']
+            })
         
         notes.sort(key=lambda x: x['modified'], reverse=True)
         
         return notes[:limit]
+    
+    def retrieve_blocks(self, query: str, top_k: int = 8, paths: Optional[List[str]] = None,
+                        search: Optional[str] = None, case_sensitive: bool = False,
+                        errors: Optional[List[Dict[str, str]]] = None,
+                        cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """
+        Return the top-k note blocks for a question, with relative path and line numbers.
+        
+        Args:
+            query: Question or keywords used for ranking
+            top_k: Number of blocks to return
+            paths: Restrict retrieval to these relative note paths
+            search: Restrict retrieval to notes matching this search pattern
+            case_sensitive: Case sensitivity of the search pattern
+            cancel: Event that stops the scan with OperationCancelled once set
+        """
+        if not self.notes_path.exists():
+            raise FileNotFoundError(f"Notes directory not found: {self.notes_path}")
+        
+        if paths:
+            files = []
+            root = self.notes_path.resolve()
+            for relative_path in paths:
+                file_path = (self.notes_path / relative_path).resolve()
+                if root not in file_path.parents:
+                    raise ValueError(f"Path is outside the notes directory: {relative_path}")
+                if not file_path.exists():
+                    raise FileNotFoundError(f"Note not found: {relative_path}")
+                files.append((file_path, relative_path))
+        elif search:
+            matches = self.search_notes(search, case_sensitive=case_sensitive, max_results=10 ** 9, errors=errors,
+                                       cancel=cancel)
+            files = [(Path(match['path']), match['relative_path']) for match in matches]
+        else:
+            files = [(entry['path'], entry['relative_path']) for entry in self.index.entries()]
+        
+        with section('notes_scan'):
+            return retrieve_from_files(files, query, top_k=top_k, errors=errors, cancel=cancel)
+    
+    def find_duplicates(self, threshold: float = 0.8, level: str = 'note', path: Optional[str] = None,
+                        limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Near-duplicate notes or blocks, from MinHash signatures kept in sync with the file index.
+        
+        Args:
+            threshold: Minimum estimated Jaccard similarity of word shingles
+            level: 'note' (whole files) or 'block' (paragraphs and bullets, also within one note)
+            path: Only return the notes similar to this relative path
+            limit: Maximum number of clusters (or notes, with path)
+        """
+        if level not in ('note', 'block'):
+            raise ValueError(f"Unknown level: {level}. Use note or block")
+        if not self.notes_path.exists():
+            raise FileNotFoundError(f"Notes directory not found: {self.notes_path}")
+        
+        with section('notes_scan'):
+            self.duplicates.update(self.index.entries(), self._read_blocks)
+        
+        if path is not None:
+            if path not in self.duplicates.notes:
+                raise FileNotFoundError(f"Note not found: {path}")
+            return [
+                {'relative_path': other, 'similarity': round(score, 3)}
+                for other, score in self.duplicates.duplicates_of(path, threshold)[:limit]
+            ]
+        
+        with self.duplicates.lock:
+            index = self.duplicates.notes if level == 'note' else self.duplicates.blocks
+            clusters = cluster_pairs(index.pairs(threshold))[:limit]
+        if level == 'block':
+            for cluster in clusters:
+                cluster['members'] = [
+                    {'relative_path': relative_path, 'line': start, 'end_line': end}
+                    for relative_path, start, end in cluster['members']
+                ]
+        return clusters
+    
+    def _collapse_duplicates(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fold each result that is a near-duplicate of a better-ranked one into it,
+        listing the folded paths under 'duplicates'. Only the result files are signed.
+        """
+        matched = {result['relative_path'] for result in results}
+        entries = [entry for entry in self.index.entries() if entry['relative_path'] in matched]
+        self.duplicates.update(entries, self._read_blocks, prune=False)
+        
+        kept = []
+        for result in results:
+            for other in kept:
+                score = self.duplicates.note_similarity(result['relative_path'], other['relative_path'])
+                if score is not None and score >= COLLAPSE_THRESHOLD:
+                    other.setdefault('duplicates', []).append(result['relative_path'])
+                    break
+            else:
+                kept.append(result)
+        return kept
+    
+    @staticmethod
+    def _read_blocks(file_path: Path):
+        return list(iter_text_blocks(get_reader(file_path).iter_lines(file_path)))
+    
+    def corpus_entries(self) -> List[Dict[str, Any]]:
+        """Every note file for a corpus export (path, relative_path, mtime, size), from the file index."""
+        if not self.notes_path.exists():
+            raise FileNotFoundError(f"Notes directory not found: {self.notes_path}")
+        return sorted(self.index.entries(), key=lambda entry: entry['relative_path'])
+    
+    def refresh_index(self) -> Dict[str, Any]:
+        self.index.refresh()
+        return self.index.stats()
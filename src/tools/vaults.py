@@ -0,0 +1,173 @@
+"""
+Multiple named vault roots served by one server.
+Each vault wraps its own NotesTools/LogseqTools pair and file index.
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import logging
+
+from ..utils.cancellation import OperationCancelled
+from ..utils.profiling import submit
+from ..utils.query_planner import plan_query
+from ..utils.traversal import Traversal
+from .notes_tools import NotesTools
+from .logseq_tools import LogseqTools
+
+
+logger = logging.getLogger(__name__)
+
+
+class Vault:
+    def __init__(self, name: str, notes_path: Optional[Path] = None, logseq_path: Optional[Path] = None,
+                 index_max_age: Optional[float] = 60.0, max_file_size: Optional[int] = None,
+                 cache_dir: Optional[Path] = None, traversal: Optional[Traversal] = None):
+        self.name = name
+        self.notes = NotesTools(
+            notes_path, index_max_age=index_max_age, max_file_size=max_file_size, traversal=traversal
+        ) if notes_path is not None else None
+        self.logseq = LogseqTools(
+            logseq_path, index_max_age=index_max_age, cache_dir=cache_dir, traversal=traversal
+        ) if logseq_path is not None else None
+    
+    def refresh(self) -> Dict[str, Any]:
+        stats = {'vault': self.name}
+        if self.notes is not None:
+            stats['notes'] = self.notes.refresh_index()
+        if self.logseq is not None:
+            stats['logseq'] = self.logseq.refresh_index()
+        return stats
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'vault': self.name,
+            'notes_path': str(self.notes.notes_path) if self.notes else None,
+            'logseq_path': str(self.logseq.logseq_path) if self.logseq else None,
+            'notes_index': self.notes.index.stats() if self.notes else None,
+            'duplicate_index': self.notes.duplicates.stats() if self.notes else None,
+            'logseq_index': self.logseq.index.stats() if self.logseq else None,
+            'journal_index': self.logseq.journals.stats() if self.logseq else None
+        }
+
+
+class VaultRegistry:
+    """
+    Named vaults with fan-out search.
+    Queries run on a shared thread pool so a slow vault only delays its own results.
+    """
+    
+    def __init__(self, roots: List[Dict[str, Any]], index_max_age: Optional[float] = 60.0,
+                 max_workers: Optional[int] = None, max_file_size: Optional[int] = None,
+                 cache_dir: Optional[Path] = None, traversal: Optional[Traversal] = None):
+        if not roots:
+            raise ValueError("At least one root must be configured")
+        
+        self.vaults: Dict[str, Vault] = {}
+        for root in roots:
+            self.vaults[root['name']] = Vault(
+                name=root['name'],
+                notes_path=root.get('notes_path'),
+                logseq_path=root.get('logseq_path'),
+                index_max_age=index_max_age,
+                max_file_size=max_file_size,
+                cache_dir=cache_dir,
+                traversal=traversal
+            )
+        
+        self.default_name = roots[0]['name']
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(2, len(self.vaults)),
+            thread_name_prefix="vault"
+        )
+    
+    @property
+    def default(self) -> Vault:
+        return self.vaults[self.default_name]
+    
+    def names(self) -> List[str]:
+        return list(self.vaults.keys())
+    
+    def get(self, name: Optional[str] = None) -> Vault:
+        if name is None:
+            return self.default
+        if name not in self.vaults:
+            raise ValueError(f"Unknown vault: {name}. Available: {', '.join(self.vaults)}")
+        return self.vaults[name]
+    
+    def get_notes(self, name: Optional[str] = None) -> NotesTools:
+        vault = self.get(name)
+        if vault.notes is None:
+            raise ValueError(f"Vault '{vault.name}' has no notes_path configured")
+        return vault.notes
+    
+    def get_logseq(self, name: Optional[str] = None) -> LogseqTools:
+        vault = self.get(name)
+        if vault.logseq is None:
+            raise ValueError(f"Vault '{vault.name}' has no logseq_path configured")
+        return vault.logseq
+    
+    def search_notes(self, query: str, case_sensitive: bool = False, max_results: int = 20,
+                     vaults: Optional[List[str]] = None,
+                     errors: Optional[List[Dict[str, str]]] = None,
+                     context_before: int = 0, context_after: int = 0,
+                     cancel: Optional[threading.Event] = None,
+                     collapse_duplicates: bool = False) -> List[Dict[str, Any]]:
+        """
+        Search every selected vault in parallel and merge the results by match count.
+        Vaults whose search fails are logged and left out of the merged result;
+        an invalid query (re.error) or a cancelled search (see cancel) fails as a whole.
+        Unreadable files are collected in `errors`, tagged with their vault.
+        """
+        # Check the pattern once, so a bad query raises no matter how many vaults there are.
+        plan_query(query, case_sensitive)
+        names = vaults or [name for name, vault in self.vaults.items() if vault.notes is not None]
+        targets = [self.get(name) for name in names]
+        
+        vault_errors = {vault.name: [] for vault in targets}
+        futures = {
+            vault.name: submit(
+                self._executor, vault.notes.search_notes, query, case_sensitive, max_results, vault_errors[vault.name],
+                context_before, context_after, cancel, collapse_duplicates
+            )
+            for vault in targets if vault.notes is not None
+        }
+        
+        merged = []
+        for name, future in futures.items():
+            try:
+                results = future.result()
+            except (OperationCancelled, re.error, ValueError):
+                raise
+            except Exception as e:
+                if len(futures) == 1:
+                    raise
+                logger.warning(f"Search failed in vault {name}: {e}")
+                continue
+            
+            for result in results:
+                result['vault'] = name
+                merged.append(result)
+            
+            if errors is not None:
+                for error in vault_errors[name]:
+                    error['vault'] = name
+                    errors.append(error)
+        
+        merged.sort(key=lambda x: x['matches_count'], reverse=True)
+        return merged[:max_results]
+    
+    def refresh(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Rebuild the index of one vault, or of every vault in parallel.
+        """
+        targets = [self.get(name)] if name else list(self.vaults.values())
+        futures = [submit(self._executor, vault.refresh) for vault in targets]
+        return [future.result() for future in futures]
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        return [vault.stats() for vault in self.vaults.values()]
+    
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,38 @@
+"""
+Cooperative cancellation for work that runs in worker threads.
+Threads cannot be interrupted, so the server hands blocking calls a
+threading.Event and sets it when the request is cancelled or times out;
+long scans check it between files and segments and stop early.
+Background index builds also take a pause callable, called between files with
+the index lock released, so requests waiting for the index are not held up by
+the whole build.
+"""
+import threading
+from typing import Any, Callable, Optional
+
+
+# Files an index build handles between two pause() calls.
+PAUSE_EVERY = 16
+
+
+class OperationCancelled(Exception):
+    """Raised inside a worker thread once its request has been cancelled."""
+
+
+def pause_unlocked(lock: Any, pause: Optional[Callable[[], None]]) -> None:
+    """
+    Call pause() (which may block, or raise OperationCancelled) with lock released
+    and take it back afterwards. The caller must hold lock exactly once.
+    """
+    if pause is None:
+        return
+    lock.release()
+    try:
+        pause()
+    finally:
+        lock.acquire()
+
+
+def check_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled("Operation was cancelled")
@@ -1,7 +1,7 @@
 import json
 import os
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 
 class Config:
@@ -25,6 +25,57 @@ class Config:
         path = self.config.get('logseq_path', '')
         return Path(os.path.expanduser(path))
     
+    def get_roots(self) -> List[Dict[str, Any]]:
+        """
+        Return the configured vault roots.
+        Falls back to a single 'default' root built from notes_path/logseq_path.
+        """
+        roots = self.config.get('roots')
+        if not roots:
+            return [{
+                'name': 'default',
+                'notes_path': self.get_notes_path(),
+                'logseq_path': self.get_logseq_path()
+            }]
+        
+        resolved = []
+        seen = set()
+        for root in roots:
+            name = root.get('name')
+            if not name:
+                raise ValueError("Every entry in 'roots' needs a 'name'")
+            if name in seen:
+                raise ValueError(f"Duplicate root name: {name}")
+            seen.add(name)
+            
+            resolved.append({
+                'name': name,
+                'notes_path': self._expand_path(root.get('notes_path')),
+                'logseq_path': self._expand_path(root.get('logseq_path'))
+            })
+        
+        return resolved
+    
+    def get_index_config(self) -> Dict[str, Any]:
+        index_config = {
+            'max_age': 60.0,
+            'max_workers': None,
+            'max_file_size': None,
+            'cache_dir': '~/.cache/notes-logseq-mcp',
+            'ignore': [],
+            'default_ignores': True,
+            'include_hidden': False,
+            'follow_symlinks': False
+        }
+        index_config.update(self.config.get('index', {}))
+        index_config['cache_dir'] = self._expand_path(index_config['cache_dir'])
+        return index_config
+    
+    def _expand_path(self, path: Optional[str]) -> Optional[Path]:
+        if not path:
+            return None
+        return Path(os.path.expanduser(path))
+    
     def get_model_config(self, provider: str = None) -> Dict[str, Any]:
         if provider is None:
             provider = self.config['models'].get('default_provider', 'local')
@@ -36,5 +87,75 @@ class Config:
         else:
             raise ValueError(f"Unknown provider: {provider}")
     
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        scheduler_config = {
+            'limits': {
+                'local': {'max_concurrency': 1, 'max_queue_depth': 32},
+                'remote': {'max_concurrency': 4, 'max_queue_depth': 64}
+            },
+            'fallback_after': 5.0
+        }
+        overrides = self.config.get('models', {}).get('scheduler', {})
+        for provider, limits in overrides.get('limits', {}).items():
+            scheduler_config['limits'].setdefault(provider, {}).update(limits)
+        if 'fallback_after' in overrides:
+            scheduler_config['fallback_after'] = overrides['fallback_after']
+        return scheduler_config
+    
+    def get_server_config(self) -> Dict[str, Any]:
+        server_config = {
+            'transport': 'stdio',
+            'host': '127.0.0.1',
+            'port': 8765,
+            'path': '/mcp',
+            'request_timeout': 300.0,
+            'json_response': False,
+            'stateless': False
+        }
+        server_config.update(self.config.get('server', {}))
+        return server_config
+    
+    def get_pagination_config(self) -> Dict[str, Any]:
+        pagination_config = {
+            'page_bytes': 16384,
+            'ttl': 300.0,
+            'max_snapshots': 64
+        }
+        pagination_config.update(self.config.get('pagination', {}))
+        return pagination_config
+    
+    def get_warmup_config(self) -> Dict[str, Any]:
+        warmup_config = {
+            'enabled': True,
+            'prefetch_files': 200,
+            'prefetch_bytes': 64 * 1024 * 1024,
+            'warm_model': False,
+            'keep_alive': '30m'
+        }
+        warmup_config.update(self.config.get('warmup', {}))
+        return warmup_config
+    
+    def get_profiling_config(self) -> Dict[str, Any]:
+        profiling_config = {
+            'mode': None,
+            'tools': None,
+            'directory': '~/.cache/notes-logseq-mcp/profiles',
+            'keep': 20,
+            'top': 15
+        }
+        profiling_config.update(self.config.get('profiling', {}))
+        profiling_config['directory'] = self._expand_path(profiling_config['directory'])
+        return profiling_config
+    
+    def get_export_config(self) -> Dict[str, Any]:
+        export_config = {
+            'directory': '~/.cache/notes-logseq-mcp/exports',
+            'keep': 20,
+            'compression': 'auto'
+        }
+        export_config.update(self.config.get('export', {}))
+        export_config['directory'] = self._expand_path(export_config['directory'])
+        return export_config
+    
     def get_logging_level(self) -> str:
         return self.config.get('logging', {}).get('level', 'INFO')
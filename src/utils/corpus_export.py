@@ -0,0 +1,275 @@
+"""
+Corpus bundles for offline batch jobs.
+An export streams every note and Logseq page of the selected vaults into one
+compressed JSONL file (zstd when the zstandard package is installed, gzip
+otherwise), one document per line, so batch tooling reads a single sequential
+file instead of calling get_note_content per note. Each export gets a snapshot
+id and leaves a manifest of what it saw (path, mtime, size, digest); an export
+since an earlier snapshot id only contains the documents that changed after it,
+plus 'deleted' records for the ones that are gone. Documents are read and
+written one at a time, so memory does not grow with the size of the corpus.
+
+Bundle lines:
+    {"kind": "header", "snapshot_id", "base_snapshot_id", "created", "compression", "sources"}
+    {"kind": "note", "vault", "path", "mtime", "size", "digest", "properties", "content"}
+    {"kind": "logseq_page", "vault", "path", "title", "journal_date", "mtime", "size", "digest",
+     "properties", "content"}
+    {"kind": "deleted", "vault", "source", "path"}
+    {"kind": "end", "records"}
+A bundle without its end line was cut short and should not be used.
+"""
+import gzip
+import io
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .cancellation import check_cancelled
+from .file_utils import read_markdown_file
+from .hashing import content_digest
+
+try:
+    import zstandard
+except ImportError:  # Optional: bundles are gzip-compressed without it.
+    zstandard = None
+
+
+BUNDLE_FORMAT = 1
+COMPRESSIONS = ('auto', 'zstd', 'gzip', 'none')
+EXTENSIONS = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz', 'none': '.jsonl'}
+# UTC time to the microsecond, so ids sort in export order, plus a random suffix.
+SNAPSHOT_ID_PATTERN = re.compile(r'^\d{8}T\d{12}Z-[0-9a-f]{6}$')
+FRONT_MATTER_PATTERN = re.compile(r'^---\r?\n(.*?)\r?\n---\r?\n', re.DOTALL)
+FRONT_MATTER_LINE = re.compile(r'^([\w-]+):\s*(.*)$')
+WRITE_BUFFER = 1024 * 1024
+
+
+def note_properties(content: str) -> Dict[str, str]:
+    """
+    Properties of a plain note: 'key: value' lines of a leading '---' front
+    matter block, or leading Logseq-style 'key:: value' lines.
+    """
+    properties = {}
+    match = FRONT_MATTER_PATTERN.match(content)
+    if match:
+        for line in match.group(1).split('\n'):
+            line_match = FRONT_MATTER_LINE.match(line.strip())
+            if line_match:
+                properties[line_match.group(1)] = line_match.group(2).strip().strip('"\'')
+        return properties
+    
+    for line in content.split('\n'):
+        key, separator, value = line.strip().partition('::')
+        if not separator or not key or ' ' in key:
+            break
+        properties[key] = value.strip()
+    return properties
+
+
+def resolve_compression(compression: str) -> str:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}. Use one of: {', '.join(COMPRESSIONS)}")
+    if compression == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard); use gzip")
+    return compression
+
+
+def _open_writer(path: Path, compression: str) -> BinaryIO:
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    return open(path, 'wb', buffering=WRITE_BUFFER)
+
+
+def iter_bundle(path: Path) -> Iterator[Dict[str, Any]]:
+    """Read a bundle back, one record per line, whatever its compression."""
+    path = Path(path)
+    if path.name.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("Reading zstd bundles needs the zstandard package")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    elif path.name.endswith('.gz'):
+        raw = gzip.open(path, 'rb')
+    else:
+        raw = open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+class CorpusExporter:
+    """
+    Writes bundles and their manifests to directory. Manifests (needed for
+    incremental exports) are kept for the last `keep` snapshots; bundles are
+    left for the consumer to remove. Exports run one at a time.
+    """
+    
+    def __init__(self, directory: Path, keep: int = 20):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+    
+    def export(self, vaults: List[Any], since: Optional[str] = None, sources: Tuple[str, ...] = ('notes', 'logseq'),
+               compression: str = 'auto', cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Export the notes and/or Logseq pages of vaults (Vault objects). With since,
+        only documents that are new or changed after that snapshot are written.
+        Setting cancel stops the export with OperationCancelled and leaves no bundle.
+        """
+        unknown = [source for source in sources if source not in ('notes', 'logseq')]
+        if unknown:
+            raise ValueError(f"Unknown sources: {', '.join(unknown)}. Use notes and/or logseq")
+        compression = resolve_compression(compression)
+        
+        with self._lock:
+            base = self._load_manifest(since) if since else {}
+            snapshot_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-{secrets.token_hex(3)}"
+            started = time.monotonic()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            bundle_path = self.directory / f"corpus-{snapshot_id}{EXTENSIONS[compression]}"
+            
+            manifest: Dict[str, Dict[str, Dict[str, List[Any]]]] = {}
+            counts = {'note': 0, 'logseq_page': 0, 'deleted': 0, 'unchanged': 0}
+            errors: List[Dict[str, str]] = []
+            fd, temp_name = tempfile.mkstemp(dir=self.directory, prefix=f".{bundle_path.name}.", suffix=".tmp")
+            os.close(fd)
+            try:
+                with _open_writer(Path(temp_name), compression) as writer:
+                    def write(record: Dict[str, Any]) -> None:
+                        writer.write(json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+                    
+                    write({
+                        'kind': 'header',
+                        'format': BUNDLE_FORMAT,
+                        'snapshot_id': snapshot_id,
+                        'base_snapshot_id': since,
+                        'created': datetime.now(timezone.utc).isoformat(),
+                        'compression': compression,
+                        'sources': [[vault.name, source] for vault in vaults for source in sources
+                                    if self._tools(vault, source) is not None]
+                    })
+                    for vault in vaults:
+                        for source in sources:
+                            tools = self._tools(vault, source)
+                            if tools is None:
+                                continue
+                            seen = manifest.setdefault(vault.name, {}).setdefault(source, {})
+                            previous = base.get(vault.name, {}).get(source)
+                            self._export_source(vault.name, source, tools, previous, seen, write, counts, errors, cancel)
+                    write({'kind': 'end', 'records': counts['note'] + counts['logseq_page'] + counts['deleted']})
+                os.replace(temp_name, bundle_path)
+            except BaseException:
+                try:
+                    os.unlink(temp_name)
+                except OSError:
+                    pass
+                raise
+            
+            self._save_manifest(snapshot_id, since, manifest)
+            self._rotate()
+            return {
+                'snapshot_id': snapshot_id,
+                'base_snapshot_id': since,
+                'path': str(bundle_path),
+                'compression': compression,
+                'bytes': bundle_path.stat().st_size,
+                'records': {key: counts[key] for key in ('note', 'logseq_page', 'deleted')},
+                'unchanged': counts['unchanged'],
+                'unreadable_files_skipped': errors,
+                'seconds': round(time.monotonic() - started, 3)
+            }
+    
+    @staticmethod
+    def _tools(vault: Any, source: str) -> Any:
+        return vault.notes if source == 'notes' else vault.logseq
+    
+    def _export_source(self, vault: str, source: str, tools: Any, previous: Optional[Dict[str, List[Any]]],
+                       seen: Dict[str, List[Any]], write, counts: Dict[str, int],
+                       errors: List[Dict[str, str]], cancel: Optional[threading.Event]) -> None:
+        kind = 'note' if source == 'notes' else 'logseq_page'
+        for entry in tools.corpus_entries():
+            check_cancelled(cancel)
+            path = entry['relative_path']
+            old = previous.get(path) if previous is not None else None
+            # Logseq pages carry the index's content digest; notes are compared by mtime and size.
+            if old is not None and (old[2] == entry['digest'] if entry.get('digest') else
+                                    old[0] == entry['mtime'] and old[1] == entry['size']):
+                seen[path] = old
+                counts['unchanged'] += 1
+                continue
+            
+            try:
+                content = read_markdown_file(Path(entry['path']))
+            except Exception as e:
+                errors.append({'vault': vault, 'path': str(entry['path']), 'error': str(getattr(e, 'reason', e))})
+                if old is not None:
+                    # Keep the old state: the document is not gone, only unreadable right now.
+                    seen[path] = old
+                continue
+            
+            record = {'kind': kind, 'vault': vault, 'path': path}
+            if kind == 'logseq_page':
+                record['title'] = entry['title']
+                record['journal_date'] = entry['journal_date']
+            record.update({
+                'mtime': entry['mtime'],
+                'size': entry['size'],
+                'digest': content_digest(content).hex(),
+                'properties': entry['properties'] if 'properties' in entry else note_properties(content),
+                'content': content
+            })
+            write(record)
+            seen[path] = [entry['mtime'], entry['size'], record['digest']]
+            counts[kind] += 1
+        
+        if previous is not None:
+            for path in previous:
+                if path not in seen:
+                    write({'kind': 'deleted', 'vault': vault, 'source': source, 'path': path})
+                    counts['deleted'] += 1
+    
+    def _manifest_path(self, snapshot_id: str) -> Path:
+        return self.directory / "manifests" / f"{snapshot_id}.json.gz"
+    
+    def _load_manifest(self, snapshot_id: str) -> Dict[str, Any]:
+        if not SNAPSHOT_ID_PATTERN.match(snapshot_id):
+            raise ValueError(f"Malformed snapshot id: {snapshot_id}")
+        try:
+            with gzip.open(self._manifest_path(snapshot_id), 'rt', encoding='utf-8') as f:
+                return json.load(f)['entries']
+        except FileNotFoundError:
+            raise ValueError(f"Unknown or expired snapshot id: {snapshot_id}; run a full export") from None
+    
+    def _save_manifest(self, snapshot_id: str, base: Optional[str], entries: Dict[str, Any]) -> None:
+        path = self._manifest_path(snapshot_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.tmp")
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'snapshot_id': snapshot_id, 'base_snapshot_id': base, 'entries': entries}, f,
+                      separators=(',', ':'))
+        os.replace(temp_path, path)
+    
+    def snapshots(self) -> List[str]:
+        """Snapshot ids that incremental exports can start from, oldest first."""
+        try:
+            names = [path.name[:-len('.json.gz')] for path in (self.directory / "manifests").glob("*.json.gz")]
+        except OSError:
+            return []
+        return sorted(name for name in names if SNAPSHOT_ID_PATTERN.match(name))
+    
+    def _rotate(self) -> None:
+        for snapshot_id in self.snapshots()[:-self.keep or None]:
+            try:
+                self._manifest_path(snapshot_id).unlink()
+            except OSError:
+                pass
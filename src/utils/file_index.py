@@ -0,0 +1,117 @@
+"""
+Cached file listing for a single notes root.
+Each root owns its own index so that rebuilding one vault never blocks the others.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Dict, Any, Optional
+
+from .cancellation import PAUSE_EVERY
+from .readers import is_supported_name
+from .traversal import Traversal
+
+
+class FileIndex:
+    """Snapshot of the readable note files under one root, rebuilt on demand."""
+    
+    def __init__(self, root: Path, max_age: Optional[float] = 60.0, traversal: Optional[Traversal] = None):
+        self.root = root
+        self.max_age = max_age
+        self.traversal = traversal or Traversal()
+        self._walk_counts: Dict[str, int] = {}
+        
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._built_at: Optional[float] = None
+        self._build_seconds: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+    
+    def refresh(self, pause: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Rebuild the snapshot from disk.
+        Readers keep using the previous snapshot until the new one is swapped in.
+        With pause (background builds), the walk runs without the refresh lock and
+        calls pause every PAUSE_EVERY files, so a request never waits for it; its
+        result is dropped if a request built a newer snapshot in the meantime.
+        """
+        if pause is not None:
+            started = time.monotonic()
+            entries = self._scan(pause)
+            with self._refresh_lock:
+                if self._built_at is None or self._built_at < started:
+                    self._entries = entries
+                    self._built_at = time.monotonic()
+                    self._build_seconds = self._built_at - started
+                return self._entries
+        
+        with self._refresh_lock:
+            started = time.monotonic()
+            entries = self._scan()
+            self._entries = entries
+            self._built_at = time.monotonic()
+            self._build_seconds = self._built_at - started
+            return entries
+    
+    def entries(self, pause: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Return the current snapshot, rebuilding it first if it is missing or stale.
+        A stale snapshot is served as-is while another thread is already refreshing it.
+        """
+        if self._entries is None:
+            return self.refresh(pause)
+        
+        if self.is_stale() and not self._refresh_lock.locked():
+            return self.refresh(pause)
+        
+        return self._entries
+    
+    def invalidate(self) -> None:
+        self._built_at = None
+    
+    def is_stale(self) -> bool:
+        if self._entries is None or self._built_at is None:
+            return True
+        if self.max_age is None:
+            return False
+        return time.monotonic() - self._built_at > self.max_age
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'root': str(self.root),
+            'files': len(self._entries) if self._entries is not None else 0,
+            'built': self._entries is not None,
+            'stale': self.is_stale(),
+            'build_seconds': self._build_seconds,
+            'refreshing': self._refresh_lock.locked(),
+            'last_walk': self._walk_counts
+        }
+    
+    def _scan(self, pause: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        entries = []
+        
+        if not self.root.exists():
+            return entries
+        
+        counts: Dict[str, int] = {}
+        for position, (relative, entry) in enumerate(
+                self.traversal.walk(self.root, accept=is_supported_name, counts=counts)):
+            if pause is not None and position % PAUSE_EVERY == 0:
+                pause()
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            
+            entries.append({
+                'path': Path(entry.path),
+                'relative_path': os.path.normpath(relative),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
+        
+        self._walk_counts = counts
+        return entries
@@ -1,61 +1,213 @@
+import logging
 import os
-import re
+import secrets
+import threading
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 
+from .cancellation import check_cancelled
+from .readers import ReaderError, get_reader, is_supported_name
+from .stream_scan import scan_file
+from .query_planner import file_may_match, plan_query
+from .hashing import content_digest
+from .traversal import Traversal
 
-def search_markdown_files(directory: Path, query: str, case_sensitive: bool = False) -> List[Dict[str, Any]]:
+
+logger = logging.getLogger(__name__)
+
+# One lock per file path, shared by every vault; dropped once no writer holds it.
+_path_locks: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+_path_locks_guard = threading.Lock()
+
+
+
+class WriteConflictError(Exception):
+    """Raised when a file changed on disk between reading it and writing it back."""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        super().__init__(f"{path} was modified by another writer")
+
+
+def search_markdown_files(directory: Path, query: str, case_sensitive: bool = False,
+                          files: Optional[Iterable[Path]] = None,
+                          errors: Optional[List[Dict[str, str]]] = None,
+                          max_file_size: Optional[int] = None, context_before: int = 0,
+                          context_after: int = 0,
+                          cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+    """
+    Search every supported note file in fixed-size chunks, so memory stays flat
+    regardless of file or line length. Match spans and context_before/context_after
+    lines are collected in the same pass.
+    Files that cannot be decoded, or are larger than max_file_size bytes, are
+    reported in `errors` (when given) and logged.
+    Setting cancel stops the search with OperationCancelled.
+    """
     results = []
     
     if not directory.exists():
         return results
     
-    pattern = re.compile(query if case_sensitive else query, re.IGNORECASE if not case_sensitive else 0)
+    plan = plan_query(query, case_sensitive)
     
-    for file_path in directory.rglob('*.md'):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                matches = pattern.findall(content)
-                
-                if matches:
-                    lines = content.split('\n')
-                    matching_lines = []
-                    
-                    for i, line in enumerate(lines, 1):
-                        if pattern.search(line):
-                            matching_lines.append({
-                                'line_number': i,
-                                'content': line.strip()
-                            })
-                    
-                    results.append({
-                        'path': str(file_path),
-                        'relative_path': str(file_path.relative_to(directory)),
-                        'matches_count': len(matches),
-                        'matching_lines': matching_lines[:10],
-                        'modified': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
-                    })
-        except Exception as e:
+    if files is None:
+        files = iter_note_files(directory)
+    
+    for file_path in files:
+        check_cancelled(cancel)
+        reader = get_reader(file_path)
+        if reader is None:
             continue
+        
+        try:
+            stat = file_path.stat()
+            if max_file_size is not None and stat.st_size > max_file_size:
+                raise ReaderError(file_path, f"file is larger than {max_file_size} bytes")
+            
+            # Files missing a literal every match needs are ruled out with a byte search.
+            if not file_may_match(plan, reader, file_path):
+                continue
+            
+            scan = scan_file(
+                reader, file_path, plan.pattern, context_before=context_before, context_after=context_after,
+                cancel=cancel
+            )
+            if scan['matches_count']:
+                result = {
+                    'path': str(file_path),
+                    'relative_path': str(file_path.relative_to(directory)),
+                    'matches_count': scan['matches_count'],
+                    'matching_lines': scan['matching_lines'],
+                    'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
+                }
+                if 'context' in scan:
+                    result['context'] = scan['context']
+                results.append(result)
+        except (ReaderError, OSError) as e:
+            logger.warning(f"Skipping unreadable file {file_path}: {e}")
+            if errors is not None:
+                errors.append({'path': str(file_path), 'error': str(getattr(e, 'reason', e))})
     
     return sorted(results, key=lambda x: x['matches_count'], reverse=True)
 
 
+def iter_note_files(directory: Path, traversal: Optional[Traversal] = None) -> Iterator[Path]:
+    """
+    Yield every file under directory that has a registered reader, skipping
+    what traversal ignores (by default: VCS, trash and Logseq backup folders
+    and hidden directories).
+    """
+    for _, entry in (traversal or Traversal()).walk(directory, accept=is_supported_name):
+        yield Path(entry.path)
+
+
 def read_markdown_file(file_path: Path) -> str:
     if not file_path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
     
+    reader = get_reader(file_path)
+    if reader is not None:
+        return reader.read_text(file_path)
+    
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
 
 def write_markdown_file(file_path: Path, content: str) -> None:
+    """
+    Write through a temporary file in the same folder and rename it into place,
+    so readers (including Logseq) never see a truncated page.
+    """
     file_path.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    fd, temp_name = _create_temp_file(file_path)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_name, file_path.stat().st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_name, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _create_temp_file(file_path: Path) -> Tuple[int, str]:
+    """
+    Create a hidden temporary file next to file_path with mode 0o666, so the
+    kernel applies the process umask as it would for a new page (mkstemp uses 0o600).
+    """
+    for _ in range(100):
+        temp_name = str(file_path.with_name(f".{file_path.name}.{secrets.token_hex(4)}.tmp"))
+        try:
+            return os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), temp_name
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free temporary name next to {file_path}")
+
+
+@contextmanager
+def path_lock(file_path: Path) -> Iterator[None]:
+    """
+    Serialize read-modify-write cycles on one file across threads of this process.
+    The lock is reentrant, so a holder may call helpers that take it again.
+    """
+    key = os.path.abspath(file_path)
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = threading.RLock()
+            _path_locks[key] = lock
+    with lock:
+        yield
+
+
+def read_versioned(file_path: Path) -> Tuple[Optional[str], Optional[Tuple[int, int, bytes]]]:
+    """
+    Read a file together with a version stamp (mtime_ns, size, content digest)
+    for write_if_unchanged. Returns (None, None) when the file does not exist.
+    """
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return None, None
+    content = read_markdown_file(file_path)
+    return content, (stat.st_mtime_ns, stat.st_size, content_digest(content))
+
+
+def write_if_unchanged(file_path: Path, content: str,
+                       version: Optional[Tuple[int, int, bytes]]) -> None:
+    """
+    Atomically write content unless the file changed since it was read with read_versioned
+    (version None means the file must still not exist). A file that was only touched,
+    with the same content, is not a conflict. Raises WriteConflictError otherwise.
+    """
+    with path_lock(file_path):
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            stat = None
+        
+        if version is None:
+            if stat is not None:
+                raise WriteConflictError(file_path)
+        elif stat is None:
+            raise WriteConflictError(file_path)
+        elif (stat.st_mtime_ns, stat.st_size) != version[:2]:
+            if content_digest(read_markdown_file(file_path)) != version[2]:
+                raise WriteConflictError(file_path)
+        
+        write_markdown_file(file_path, content)
 
 
 def get_file_metadata(file_path: Path) -> Dict[str, Any]:
@@ -0,0 +1,187 @@
+"""
+On-disk snapshot of a parsed Logseq graph.
+Page records are written in a versioned binary layout (struct headers plus marshal
+payloads) and read back through mmap, so a restart only re-parses changed files.
+
+Layout:
+    header    MAGIC, format version, Python version, page count, root length, postings length
+    root      graph path the snapshot belongs to
+    postings  marshalled page-level inverted indexes
+    entries   key length, mtime, size, content digest, light length, heavy length,
+              key, light payload (name, path, dates, page properties, links, tasks),
+              heavy payload (blocks and block-level postings)
+
+Heavy payloads are only unmarshalled when a page is first looked at, so startup
+cost is the page table and the postings rather than the whole graph.
+"""
+import gc
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Any, Tuple
+
+
+MAGIC = b'LSQS'
+# Bump whenever the page record layout produced by LogseqIndex changes.
+SNAPSHOT_VERSION = 3
+PYTHON_VERSION = sys.version_info[0] * 100 + sys.version_info[1]
+
+HEADER = struct.Struct('<4sHHIIQ')
+ENTRY = struct.Struct('<IdQ16sII')
+
+# Record fields kept out of the page table and loaded on first access.
+HEAVY_FIELDS = ('raw_properties', 'blocks', 'terms', 'tags', 'tasks', 'properties', 'property_keys')
+STAT_FIELDS = ('mtime', 'size', 'digest')
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, truncated or written by another version."""
+
+
+class SnapshotRecord(dict):
+    """
+    A page record whose heavy fields still live in the mapped snapshot.
+    They are unmarshalled into the dict the first time one of them is read.
+    """
+    __slots__ = ('_source',)
+    
+    def __init__(self, light: Dict[str, Any], source: Tuple[mmap.mmap, int, int]):
+        super().__init__(light)
+        self._source = source
+    
+    def __missing__(self, key):
+        if self._source is None or key not in HEAVY_FIELDS:
+            raise KeyError(key)
+        self.materialize()
+        return dict.__getitem__(self, key)
+    
+    def materialize(self) -> None:
+        source = self._source
+        if source is not None:
+            data, offset, length = source
+            self.update(marshal.loads(data[offset:offset + length]))
+            self._source = None
+    
+    def raw_heavy(self) -> Optional[bytes]:
+        """The heavy payload as stored, if it has not been loaded yet."""
+        if self._source is None:
+            return None
+        data, offset, length = self._source
+        return data[offset:offset + length]
+
+
+def snapshot_path(cache_dir: Path, logseq_path: Path) -> Path:
+    """One snapshot file per graph, named after a hash of its resolved path."""
+    name = hashlib.blake2b(str(logseq_path.resolve()).encode('utf-8'), digest_size=8).hexdigest()
+    return cache_dir / f"graph-{name}.snapshot"
+
+
+def save_snapshot(path: Path, root: Path, pages: Dict[str, Dict[str, Any]],
+                  postings: Dict[str, Dict[Any, Any]]) -> None:
+    """
+    Write page records and postings atomically (temp file + rename), so a crash
+    never leaves a torn snapshot. Heavy payloads that were never loaded are copied as-is.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    root_bytes = str(root).encode('utf-8')
+    postings_bytes = marshal.dumps(postings)
+    temp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, SNAPSHOT_VERSION, PYTHON_VERSION, len(pages), len(root_bytes), len(postings_bytes)
+            ))
+            f.write(root_bytes)
+            f.write(postings_bytes)
+            
+            for key, record in pages.items():
+                light, heavy = _encode(record)
+                key_bytes = key.encode('utf-8')
+                f.write(ENTRY.pack(
+                    len(key_bytes), record['mtime'], record['size'], record['digest'], len(light), len(heavy)
+                ))
+                f.write(key_bytes)
+                f.write(light)
+                f.write(heavy)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def load_snapshot(path: Path, root: Path) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[Any, Any]]]:
+    """
+    Map a snapshot and return (pages, postings). Page records are SnapshotRecords
+    backed by the mapping. Raises SnapshotError when the file is unusable.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        raise SnapshotError(f"Snapshot {path} is empty")
+    except OSError as e:
+        raise SnapshotError(f"Cannot open snapshot {path}: {e}")
+    
+    # Building many small containers at once triggers repeated full collections; none are cyclic.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read(data, root)
+    except (struct.error, EOFError, ValueError, TypeError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Snapshot {path} is corrupt: {e}")
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read(data: mmap.mmap, root: Path) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[Any, Any]]]:
+    magic, version, python_version, count, root_length, postings_length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != SNAPSHOT_VERSION or python_version != PYTHON_VERSION:
+        raise SnapshotError("Snapshot was written by a different format or Python version")
+    
+    position = HEADER.size
+    if data[position:position + root_length].decode('utf-8') != str(root):
+        raise SnapshotError("Snapshot belongs to another graph")
+    position += root_length
+    
+    postings = marshal.loads(data[position:position + postings_length])
+    position += postings_length
+    
+    pages = {}
+    for _ in range(count):
+        key_length, mtime, size, digest, light_length, heavy_length = ENTRY.unpack_from(data, position)
+        position += ENTRY.size
+        key = data[position:position + key_length].decode('utf-8')
+        position += key_length
+        light = marshal.loads(data[position:position + light_length])
+        position += light_length
+        if position + heavy_length > len(data):
+            raise EOFError("truncated payload")
+        
+        if light.get('journal_date') is not None:
+            light['journal_date'] = date.fromordinal(light['journal_date'])
+        light.update({'mtime': mtime, 'size': size, 'digest': digest})
+        pages[key] = SnapshotRecord(light, (data, position, heavy_length))
+        position += heavy_length
+    
+    return pages, postings
+
+
+def _encode(record: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    light = {
+        k: v for k, v in dict.items(record)
+        if k not in HEAVY_FIELDS and k not in STAT_FIELDS
+    }
+    if light.get('journal_date') is not None:
+        light['journal_date'] = light['journal_date'].toordinal()
+    
+    heavy = record.raw_heavy() if isinstance(record, SnapshotRecord) else None
+    if heavy is None:
+        heavy = marshal.dumps({field: record[field] for field in HEAVY_FIELDS})
+    return marshal.dumps(light), heavy
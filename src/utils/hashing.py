@@ -0,0 +1,9 @@
+"""
+Content digests shared by the index, its snapshot, page writes and exports.
+"""
+import hashlib
+
+
+def content_digest(content: str) -> bytes:
+    """16-byte BLAKE2b digest of a page's text; equal text always gives an equal digest."""
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
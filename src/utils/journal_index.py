@@ -0,0 +1,237 @@
+"""
+Date-ordered index of Logseq journal files.
+Journals are kept in parallel arrays sorted by date, so a date span is two
+bisects away and entries can be streamed in order without listing the folder.
+Each journal also keeps the byte offsets of its top-level blocks, so a large
+journal can be read in block-aligned parts with a seek instead of whole.
+"""
+import bisect
+import os
+import threading
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any, Iterable, Iterator, Tuple
+
+from .cancellation import PAUSE_EVERY, pause_unlocked
+from .logseq_parser import LogseqParser
+from .traversal import Traversal
+
+
+def scan_block_offsets(lines: Iterable[bytes]) -> Tuple[array, int]:
+    """
+    Return the byte offsets of the top-level blocks of a journal and its total block count.
+    lines are the raw lines of the file with their line endings (a binary file object will do).
+    """
+    offsets = array('Q')
+    block_count = 0
+    position = 0
+    
+    for line in lines:
+        stripped = line.lstrip(b' \t')
+        if stripped.startswith(b'- ') or stripped.rstrip(b'\r\n') == b'-':
+            block_count += 1
+            if len(stripped) == len(line):
+                offsets.append(position)
+        position += len(line)
+    
+    return offsets, block_count
+
+
+class JournalIndex:
+    """
+    Sorted journal dates with per-file size, mtime, block count and top-level block offsets.
+    The journals folder is only re-listed when its own mtime changes.
+    """
+    
+    def __init__(self, journals_path: Path, traversal: Optional[Traversal] = None):
+        self.journals_path = journals_path
+        self.traversal = traversal or Traversal()
+        
+        self._ordinals = array('l')
+        self._records: List[Dict[str, Any]] = []
+        self._dir_mtime: Optional[float] = None
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return len(self._ordinals)
+    
+    def refresh(self, pause: Optional[Callable[[], None]] = None) -> None:
+        """
+        Re-list the journals folder and rebuild the arrays.
+        Records of unchanged files are reused. pause (for background builds) is
+        called every PAUSE_EVERY files with the lock released.
+        """
+        with self._lock:
+            previous = {record['path']: record for record in self._records}
+            entries = []
+            
+            if self.journals_path.exists():
+                self._dir_mtime = self.journals_path.stat().st_mtime
+                walk = self.traversal.walk(self.journals_path, accept=lambda name: name.endswith('.md'),
+                                           recursive=False)
+                for position, (_, entry) in enumerate(walk):
+                    if pause is not None and position % PAUSE_EVERY == 0:
+                        pause_unlocked(self._lock, pause)
+                    journal_path = Path(entry.path)
+                    journal_date = LogseqParser.parse_journal_date(journal_path)
+                    if journal_date is None:
+                        continue
+                    record = previous.get(str(journal_path))
+                    if record is None or self._is_changed(record):
+                        record = self._build_record(journal_path, journal_date)
+                    if record is not None:
+                        entries.append(record)
+            else:
+                self._dir_mtime = None
+            
+            entries.sort(key=lambda record: record['ordinal'])
+            self._ordinals = array('l', (record['ordinal'] for record in entries))
+            self._records = entries
+    
+    def ensure_fresh(self, pause: Optional[Callable[[], None]] = None) -> None:
+        with self._lock:
+            try:
+                dir_mtime = self.journals_path.stat().st_mtime
+            except OSError:
+                dir_mtime = None
+            stale = self._dir_mtime is None or dir_mtime != self._dir_mtime
+        # Outside the lock: refresh releases it while paused, which a nested hold would prevent.
+        if stale:
+            self.refresh(pause=pause)
+    
+    def update_file(self, journal_path: Path) -> None:
+        """
+        Insert or replace one journal after it was written by this process.
+        """
+        journal_date = LogseqParser.parse_journal_date(journal_path)
+        if journal_date is None:
+            return
+        
+        with self._lock:
+            if self._dir_mtime is None:
+                return
+            
+            record = self._build_record(journal_path, journal_date)
+            position = bisect.bisect_left(self._ordinals, journal_date.toordinal())
+            exists = position < len(self._ordinals) and self._ordinals[position] == journal_date.toordinal()
+            
+            if record is None:
+                if exists:
+                    del self._ordinals[position]
+                    del self._records[position]
+            elif exists:
+                self._records[position] = record
+            else:
+                self._ordinals.insert(position, record['ordinal'])
+                self._records.insert(position, record)
+            
+            try:
+                self._dir_mtime = self.journals_path.stat().st_mtime
+            except OSError:
+                pass
+    
+    def span(self, start: Optional[date], end: Optional[date]) -> List[Dict[str, Any]]:
+        """
+        Return the records whose date falls in [start, end], oldest first.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            lo = 0 if start is None else bisect.bisect_left(self._ordinals, start.toordinal())
+            hi = len(self._ordinals) if end is None else bisect.bisect_right(self._ordinals, end.toordinal())
+            return self._records[lo:hi]
+    
+    def iter_entries(self, start: Optional[date], end: Optional[date], reverse: bool = False,
+                     max_bytes: Optional[int] = None,
+                     resume: Optional[Tuple[date, int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the journals of a date span in order, reading each file only when it is reached.
+        
+        With max_bytes, a journal larger than that is yielded in parts cut at its
+        top-level blocks, each read with a seek; a part is only bigger than max_bytes
+        when one block is. Every item carries the byte offset it starts at and the
+        offset after it (the file size for the last part), so resume=(date, offset)
+        continues a span where an earlier item stopped.
+        """
+        if resume is not None:
+            # Narrow the span to the resume date; earlier days were already returned.
+            if reverse:
+                end = resume[0] if end is None else min(end, resume[0])
+            else:
+                start = resume[0] if start is None else max(start, resume[0])
+        
+        records = self.span(start, end)
+        if reverse:
+            records = reversed(records)
+        
+        for record in records:
+            if self._is_changed(record):
+                record = self._build_record(Path(record['path']), record['date'])
+                if record is None:
+                    continue
+            offset = resume[1] if resume is not None and record['date'] == resume[0] else 0
+            try:
+                for part_start, part_end, content in self._read_parts(record, offset, max_bytes):
+                    yield {
+                        'date': record['date'].isoformat(),
+                        'path': record['path'],
+                        'block_count': record['block_count'],
+                        'offset': part_start,
+                        'next_offset': part_end,
+                        'content': content
+                    }
+            except OSError:
+                continue
+    
+    def _read_parts(self, record: Dict[str, Any], offset: int,
+                    max_bytes: Optional[int]) -> Iterator[Tuple[int, int, str]]:
+        size = record['size']
+        # Cut points: the preamble (page properties) before the first block, then each top-level block.
+        bounds = sorted({0, *record['block_offsets'], size})
+        position = bisect.bisect_left(bounds, offset)
+        
+        with open(record['path'], 'rb') as f:
+            while position < len(bounds) - 1:
+                part_start = bounds[position]
+                position += 1
+                if max_bytes is None:
+                    position = len(bounds) - 1
+                else:
+                    while position < len(bounds) - 1 and bounds[position + 1] - part_start <= max_bytes:
+                        position += 1
+                part_end = bounds[position]
+                f.seek(part_start)
+                yield part_start, part_end, f.read(part_end - part_start).decode('utf-8', errors='replace')
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'journals': len(self._records),
+                'first': self._records[0]['date'].isoformat() if self._records else None,
+                'last': self._records[-1]['date'].isoformat() if self._records else None
+            }
+    
+    def _is_changed(self, record: Dict[str, Any]) -> bool:
+        try:
+            stat = Path(record['path']).stat()
+        except OSError:
+            return True
+        return stat.st_mtime != record['mtime'] or stat.st_size != record['size']
+    
+    def _build_record(self, journal_path: Path, journal_date: date) -> Optional[Dict[str, Any]]:
+        try:
+            with open(journal_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                offsets, block_count = scan_block_offsets(f)
+        except OSError:
+            return None
+        
+        return {
+            'date': journal_date,
+            'ordinal': journal_date.toordinal(),
+            'path': str(journal_path),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'block_count': block_count,
+            'block_offsets': offsets
+        }
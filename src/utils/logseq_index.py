@@ -0,0 +1,490 @@
+"""
+In-memory index of a Logseq graph.
+Pages are parsed once into blocks, properties, tags, links and task markers, and kept
+in inverted indexes so queries are answered with set operations instead of file scans.
+Parsed pages can be persisted to a snapshot so a restart only re-parses changed files.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any, Iterable, Set, Tuple
+
+from .cancellation import PAUSE_EVERY, pause_unlocked
+from .file_utils import read_markdown_file
+from .graph_snapshot import SnapshotError, load_snapshot, save_snapshot
+from .hashing import content_digest
+from .logseq_parser import LogseqParser
+from .profiling import section
+from .title_index import TitleIndex
+from .traversal import Traversal
+
+
+logger = logging.getLogger(__name__)
+
+
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(TERM_PATTERN.findall(text.lower()))
+
+
+def split_blocks(content: str) -> List[Dict[str, Any]]:
+    """
+    Group the lines of a page into outline blocks.
+    Blocks are delimited by LogseqParser.iter_block_lines: a block owns the indented,
+    non-bullet lines that follow it, such as block properties.
+    """
+    blocks = []
+    current = None
+    
+    for line_number, _, line, stripped, starts_block, _ in LogseqParser.iter_block_lines(content):
+        if not starts_block:
+            current['lines'].append(stripped)
+            continue
+        
+        level, block_content = LogseqParser.parse_block_line(line)
+        current = {
+            'line': line_number,
+            'level': level,
+            'content': block_content,
+            'lines': [block_content]
+        }
+        blocks.append(current)
+    
+    return blocks
+
+
+def is_page_name(name: str) -> bool:
+    return name.endswith('.md')
+
+
+class LogseqIndex:
+    """
+    Block-level index over pages/ and journals/.
+    Refreshes are incremental: only files whose mtime or size changed are read, and only
+    those whose content hash changed are re-parsed. With a snapshot_path, the parsed
+    pages are loaded from it on the first refresh and written back after changes.
+    """
+    
+    def __init__(self, logseq_path: Path, max_age: Optional[float] = 30.0,
+                 snapshot_path: Optional[Path] = None, traversal: Optional[Traversal] = None):
+        self.logseq_path = logseq_path
+        self.max_age = max_age
+        self.snapshot_path = snapshot_path
+        self.traversal = traversal or Traversal()
+        
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        
+        # Page-level postings: key -> set of page keys. Block-level postings live in each page record.
+        self._terms: Dict[str, Set[str]] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._tasks: Dict[str, Set[str]] = {}
+        self._properties: Dict[Tuple[str, str], Set[str]] = {}
+        self._property_keys: Dict[str, Set[str]] = {}
+        self._links: Dict[str, Set[str]] = {}
+        self.titles = TitleIndex()
+        
+        # Sorted (date, page key) and (mtime, page key) arrays for range lookups.
+        self._journal_dates: List[Tuple[date, str]] = []
+        self._mtimes: List[Tuple[float, str]] = []
+        
+        self._built_at: Optional[float] = None
+        self._snapshot_loaded = False
+        self._dirty = False
+        self.lock = threading.RLock()
+    
+    def refresh(self, force: bool = False, pause: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date with the files on disk.
+        Returns counts of parsed, removed and unchanged pages.
+        pause (for background builds) is called every PAUSE_EVERY files with the lock
+        released; a request that takes the lock meanwhile refreshes the rest itself,
+        reusing the pages parsed so far.
+        """
+        with self.lock, section('logseq_parse'):
+            if self._built_at is None and self.snapshot_path is not None and not force:
+                self._load_snapshot()
+            
+            seen = set()
+            parsed = 0
+            unchanged = 0
+            
+            for position, (key, entry) in enumerate(self._scan_page_files()):
+                if pause is not None and position % PAUSE_EVERY == 0:
+                    pause_unlocked(self.lock, pause)
+                seen.add(key)
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                
+                record = self.pages.get(key)
+                if not force and record and record['mtime'] == stat.st_mtime and record['size'] == stat.st_size:
+                    unchanged += 1
+                    continue
+                
+                if self._index_page(Path(entry.path), stat, force=force):
+                    parsed += 1
+                else:
+                    unchanged += 1
+                self._dirty = True
+            
+            # A page written after the listing passed its folder is not in seen, but is not gone either.
+            removed = [key for key in self.pages if key not in seen and not (self.logseq_path / key).exists()]
+            for key in removed:
+                self._remove_page(key)
+            
+            self._rebuild_sorted()
+            self._built_at = time.monotonic()
+            if removed:
+                self._dirty = True
+            if self._dirty:
+                self.save_snapshot()
+            
+            return {'parsed': parsed, 'removed': len(removed), 'unchanged': unchanged}
+    
+    def ensure_fresh(self, pause: Optional[Callable[[], None]] = None) -> None:
+        if self._built_at is None:
+            self.refresh(pause=pause)
+        elif self.max_age is not None and time.monotonic() - self._built_at > self.max_age:
+            self.refresh(pause=pause)
+    
+    def update_file(self, page_path: Path) -> None:
+        """
+        Re-index one page after it was written by this process.
+        Does nothing until the index has been built once.
+        """
+        self.update_files([page_path])
+    
+    def update_files(self, page_paths: Iterable[Path]) -> None:
+        """
+        Re-index a batch of written pages, rebuilding the sorted arrays once.
+        """
+        with self.lock, section('logseq_parse'):
+            if self._built_at is None:
+                return
+            for page_path in page_paths:
+                key = self._page_key(page_path)
+                try:
+                    self._index_page(page_path, page_path.stat())
+                except FileNotFoundError:
+                    self._remove_page(key)
+            self._rebuild_sorted()
+            # Written out with the next refresh rather than on every edit.
+            self._dirty = True
+    
+    def save_snapshot(self) -> bool:
+        """
+        Persist the parsed pages. Returns False when no snapshot is configured or the write failed.
+        """
+        if self.snapshot_path is None:
+            return False
+        with self.lock:
+            try:
+                save_snapshot(self.snapshot_path, self.logseq_path, self.pages, self._postings())
+            except OSError as e:
+                logger.warning(f"Could not write graph snapshot {self.snapshot_path}: {e}")
+                return False
+            self._dirty = False
+            return True
+    
+    def _load_snapshot(self) -> None:
+        try:
+            pages, postings = load_snapshot(self.snapshot_path, self.logseq_path)
+        except SnapshotError as e:
+            logger.info(f"Ignoring graph snapshot: {e}")
+            return
+        
+        self.pages = pages
+        self._terms = postings['terms']
+        self._tags = postings['tags']
+        self._tasks = postings['tasks']
+        self._properties = postings['properties']
+        self._property_keys = postings['property_keys']
+        self._links = postings['links']
+        self.titles = TitleIndex.from_state(postings['titles'])
+        self._snapshot_loaded = True
+    
+    def _postings(self) -> Dict[str, Dict[Any, Set[str]]]:
+        return {
+            'terms': self._terms,
+            'tags': self._tags,
+            'tasks': self._tasks,
+            'properties': self._properties,
+            'property_keys': self._property_keys,
+            'links': self._links,
+            'titles': self.titles.state()
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'pages': len(self.pages),
+                'blocks': sum(page['block_count'] for page in self.pages.values()),
+                'journals': len(self._journal_dates),
+                'terms': len(self._terms),
+                'links': len(self._links),
+                'built': self._built_at is not None,
+                'from_snapshot': self._snapshot_loaded
+            }
+    
+    # Lookups used by the query evaluator. Each returns a map of page key -> block indexes,
+    # where None means "every block of the page".
+    
+    def all_pages(self) -> Set[str]:
+        return set(self.pages.keys())
+    
+    def lookup_term(self, term: str) -> Dict[str, Optional[Set[int]]]:
+        return self._block_postings(self._terms.get(term, ()), 'terms', term)
+    
+    def lookup_tag(self, tag: str) -> Dict[str, Optional[Set[int]]]:
+        tag = tag.lower()
+        result = self._block_postings(self._tags.get(tag, ()), 'tags', tag)
+        for key in self._properties.get(('tags', tag), ()):
+            page = self.pages[key]
+            if tag in page['page_properties'].get('tags', ()):
+                result[key] = None
+            elif result.get(key, set()) is not None:
+                result.setdefault(key, set()).update(page['properties'].get(('tags', tag), ()))
+        return result
+    
+    def lookup_task(self, marker: str) -> Dict[str, Optional[Set[int]]]:
+        return self._block_postings(self._tasks.get(marker.upper(), ()), 'tasks', marker.upper())
+    
+    def task_items(self, markers: Iterable[str]) -> Iterable[Tuple[str, Tuple]]:
+        """
+        (page key, task item) for every task block with one of markers. A task item
+        is (line, marker, priority, scheduled, deadline, title), dates as YYYY-MM-DD.
+        """
+        markers = {marker.upper() for marker in markers}
+        page_keys = set()
+        for marker in markers:
+            page_keys.update(self._tasks.get(marker, ()))
+        for page_key in page_keys:
+            for item in self.pages[page_key]['task_items']:
+                if item[1] in markers:
+                    yield page_key, item
+    
+    def lookup_property(self, key: str, value: Optional[str] = None) -> Dict[str, Optional[Set[int]]]:
+        key = key.lower()
+        if value is None:
+            pages = self._property_keys.get(key, ())
+            posting_key = key
+            field = 'property_keys'
+        else:
+            posting_key = (key, value.lower())
+            pages = self._properties.get(posting_key, ())
+            field = 'properties'
+        
+        result = {}
+        for page_key in pages:
+            page = self.pages[page_key]
+            if value is None:
+                page_level = key in page['page_properties']
+            else:
+                page_level = posting_key[1] in page['page_properties'].get(key, ())
+            result[page_key] = None if page_level else set(page[field].get(posting_key, ()))
+        return result
+    
+    def backlinks(self, page_name: str) -> Set[str]:
+        """Page keys that reference page_name through [[links]] or tags."""
+        return set(self._links.get(page_name.lower(), ()))
+    
+    def templates(self) -> Dict[str, Path]:
+        """Pages that define a template (template:: or template-name:: on the page or a block)."""
+        keys = set(self._property_keys.get('template', ())) | set(self._property_keys.get('template-name', ()))
+        return {
+            Path(self.pages[key]['path']).stem: Path(self.pages[key]['path'])
+            for key in keys if key.startswith('pages/')
+        }
+    
+    def journal_pages(self, start: Optional[date], end: Optional[date]) -> Set[str]:
+        return {key for _, key in self._range(self._journal_dates, start, end)}
+    
+    def modified_pages(self, start: Optional[float], end: Optional[float]) -> Set[str]:
+        return {key for _, key in self._range(self._mtimes, start, end)}
+    
+    def get_block(self, page_key: str, block_index: int) -> Dict[str, Any]:
+        page = self.pages[page_key]
+        block = page['blocks'][block_index]
+        return {
+            'page': page['name'],
+            'path': page['path'],
+            'line': block['line'],
+            'level': block['level'],
+            'content': '\n'.join(block['lines']),
+            'task': block['task'],
+            'journal_date': page['journal_date'].isoformat() if page['journal_date'] else None
+        }
+    
+    def _block_postings(self, pages: Iterable[str], field: str, key) -> Dict[str, Optional[Set[int]]]:
+        return {page_key: set(self.pages[page_key][field].get(key, ())) for page_key in pages}
+    
+    def _range(self, items: List[Tuple[Any, str]], start, end) -> List[Tuple[Any, str]]:
+        lo = 0 if start is None else bisect.bisect_left(items, (start, ''))
+        hi = len(items) if end is None else bisect.bisect_right(items, (end, '￿'))
+        return items[lo:hi]
+    
+    def _scan_page_files(self) -> Iterable[Tuple[str, os.DirEntry]]:
+        """Yield (page key, directory entry) for every page, without building Path objects."""
+        for folder in ("pages", "journals"):
+            for name, entry in self.traversal.walk(self.logseq_path / folder, accept=is_page_name, recursive=False):
+                yield f"{folder}/{name}", entry
+    
+    def _page_key(self, page_path: Path) -> str:
+        return f"{page_path.parent.name}/{page_path.name}"
+    
+    def _index_page(self, page_path: Path, stat, force: bool = True) -> bool:
+        """
+        (Re-)index one page. Returns False when its content hash is unchanged and
+        only the stored mtime/size were updated.
+        """
+        key = self._page_key(page_path)
+        try:
+            content = read_markdown_file(page_path)
+        except Exception:
+            self._remove_page(key)
+            return False
+        
+        digest = content_digest(content)
+        record = self.pages.get(key)
+        if not force and record is not None and record.get('digest') == digest:
+            record['mtime'] = stat.st_mtime
+            record['size'] = stat.st_size
+            return False
+        
+        self._remove_page(key)
+        record = self._parse_page(page_path, content)
+        record['mtime'] = stat.st_mtime
+        record['size'] = stat.st_size
+        record['digest'] = digest
+        self.pages[key] = record
+        self._add_postings(key, record)
+        return True
+    
+    def _add_postings(self, key: str, record: Dict[str, Any]) -> None:
+        for term in record['terms']:
+            self._terms.setdefault(term, set()).add(key)
+        for tag in record['tags']:
+            self._tags.setdefault(tag, set()).add(key)
+        for marker in record['tasks']:
+            self._tasks.setdefault(marker, set()).add(key)
+        for prop in set(record['properties']) | self._page_property_pairs(record):
+            self._properties.setdefault(prop, set()).add(key)
+        for prop_key in set(record['property_keys']) | set(record['page_properties']):
+            self._property_keys.setdefault(prop_key, set()).add(key)
+        for link in record['links']:
+            self._links.setdefault(link, set()).add(key)
+        if key.startswith('pages/'):
+            self.titles.add(key, record['name'], record['page_properties'].get('alias', ()))
+    
+    def _remove_page(self, key: str) -> None:
+        record = self.pages.pop(key, None)
+        if record is None:
+            return
+        self.titles.remove(key)
+        
+        postings = [
+            (self._terms, record['terms']),
+            (self._tags, record['tags']),
+            (self._tasks, record['tasks']),
+            (self._properties, set(record['properties']) | self._page_property_pairs(record)),
+            (self._property_keys, set(record['property_keys']) | set(record['page_properties'])),
+            (self._links, record['links'])
+        ]
+        for index, keys in postings:
+            for posting_key in keys:
+                pages = index.get(posting_key)
+                if pages is not None:
+                    pages.discard(key)
+                    if not pages:
+                        del index[posting_key]
+    
+    def _page_property_pairs(self, record: Dict[str, Any]) -> Set[Tuple[str, str]]:
+        return {(k, v) for k, values in record['page_properties'].items() for v in values}
+    
+    def _parse_page(self, page_path: Path, content: str) -> Dict[str, Any]:
+        blocks = split_blocks(content)
+        
+        # Page properties are the property lines before the first real block,
+        # or the first block when it only holds properties.
+        preamble = []
+        for block in blocks:
+            if all('::' in line for line in block['lines']):
+                preamble.append('\n'.join(block['lines']))
+            else:
+                break
+        raw_properties = LogseqParser.parse_properties('\n'.join(preamble))
+        page_properties = {
+            key.lower(): LogseqParser.split_property_values(value)
+            for key, value in raw_properties.items()
+        }
+        
+        terms: Dict[str, Set[int]] = {}
+        tags: Dict[str, Set[int]] = {}
+        tasks: Dict[str, Set[int]] = {}
+        properties: Dict[Tuple[str, str], Set[int]] = {}
+        property_keys: Dict[str, Set[int]] = {}
+        links: Set[str] = set()
+        task_items: List[Tuple[int, str, Optional[str], Optional[str], Optional[str], str]] = []
+        records = []
+        
+        for index, block in enumerate(blocks):
+            text = '\n'.join(block['lines'])
+            task = LogseqParser.parse_task_marker(block['content'])
+            block_properties = LogseqParser.parse_properties(text)
+            
+            for term in tokenize(text):
+                terms.setdefault(term, set()).add(index)
+            for tag in LogseqParser.parse_tags(text):
+                tags.setdefault(tag, set()).add(index)
+            links.update(LogseqParser.parse_links(text))
+            if task:
+                tasks.setdefault(task, set()).add(index)
+                details = LogseqParser.parse_task_details(text)
+                task_items.append((block['line'], task, details['priority'], details['scheduled'],
+                                   details['deadline'], details['title']))
+            for prop_key, value in block_properties.items():
+                prop_key = prop_key.lower()
+                property_keys.setdefault(prop_key, set()).add(index)
+                for prop_value in LogseqParser.split_property_values(value):
+                    properties.setdefault((prop_key, prop_value), set()).add(index)
+            
+            records.append({
+                'line': block['line'],
+                'level': block['level'],
+                'content': block['content'],
+                'lines': block['lines'],
+                'task': task,
+                'properties': block_properties
+            })
+        
+        return {
+            'name': raw_properties.get('title') or LogseqParser.page_name_from_path(page_path),
+            'path': str(page_path),
+            'journal_date': LogseqParser.parse_journal_date(page_path) if page_path.parent.name == "journals" else None,
+            'page_properties': page_properties,
+            'raw_properties': raw_properties,
+            'blocks': records,
+            'block_count': len(records),
+            'terms': terms,
+            'tags': tags,
+            'tasks': tasks,
+            'properties': properties,
+            'property_keys': property_keys,
+            'links': links,
+            # Kept with the page table (not the lazily loaded blocks) so task listings never load pages.
+            'task_items': task_items
+        }
+    
+    def _rebuild_sorted(self) -> None:
+        self._journal_dates = sorted(
+            (page['journal_date'], key) for key, page in self.pages.items() if page['journal_date']
+        )
+        self._mtimes = sorted((page['mtime'], key) for key, page in self.pages.items())
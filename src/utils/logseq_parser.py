@@ -2,11 +2,111 @@
 Logseq structure parser and analyzer.
 Understands Logseq page structure, properties, templates, and formatting.
 """
+from array import array
+from collections.abc import Sequence
+from datetime import date
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from urllib.parse import unquote
 import re
 
 
+TASK_MARKERS = ('TODO', 'DOING', 'DONE', 'LATER', 'NOW')
+TASK_MARKER_PATTERN = re.compile(r'^(' + '|'.join(TASK_MARKERS) + r')\b')
+TASK_PRIORITY_PATTERN = re.compile(r'\[#([A-C])\]')
+TASK_DATE_PATTERN = re.compile(r'^(SCHEDULED|DEADLINE):\s*<(\d{4}-\d{2}-\d{2})', re.MULTILINE)
+LINK_PATTERN = re.compile(r'(?<!#)\[\[([^\[\]]+)\]\]')
+TAG_PATTERN = re.compile(r'(?<![\w#])#(?:\[\[([^\]]+)\]\]|([\w/-]+))')
+PROPERTY_PATTERN = re.compile(r'^(\w+(?:-\w+)*)::(.+)$')
+JOURNAL_DATE_PATTERN = re.compile(r'^(\d{4})[_-](\d{2})[_-](\d{2})$')
+INDENT_PATTERN = re.compile(r'^(\t+|- |\s+)')
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*)')
+
+
+class CompactOutline(Sequence):
+    """
+    Outline of a page as parallel arrays over the original string: per non-empty
+    line its indentation level, 1-based line number and (start, end) offsets.
+    Items are materialized as {'level', 'content', 'raw'} dicts only on access,
+    so a large page costs a few bytes per line instead of two strings and a dict.
+    """
+    __slots__ = ('text', 'levels', 'lines', 'starts', 'ends')
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.levels = array('H')
+        self.lines = array('L')
+        self.starts = array('L')
+        self.ends = array('L')
+        
+        indent_level = LogseqParser.indent_level
+        levels, lines, starts, ends = self.levels, self.lines, self.starts, self.ends
+        start = 0
+        # The split lines are only read here; the arrays keep offsets, not strings.
+        for line_number, line in enumerate(text.split('\n'), 1):
+            end = start + len(line)
+            if line and not line.isspace():
+                levels.append(min(indent_level(line), 0xFFFF))
+                lines.append(line_number)
+                starts.append(start)
+                ends.append(end)
+            start = end + 1
+    
+    def __len__(self) -> int:
+        return len(self.levels)
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        raw = self.text[self.starts[position]:self.ends[position]]
+        return {'level': self.levels[position], 'content': raw.strip().lstrip('- \t'), 'raw': raw}
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in range(len(self)):
+            yield self[position]
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Serializable form: line number, level and content of every line. The raw
+        line is left out since it is in the page content already.
+        """
+        text = self.text
+        return [
+            {'line': line, 'level': level, 'content': text[start:end].strip().lstrip('- \t')}
+            for line, level, start, end in zip(self.lines, self.levels, self.starts, self.ends)
+        ]
+    
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Shape of the outline without its lines: counts per level, the first `top`
+        markdown headings and the first `top` unindented lines.
+        """
+        by_level: Dict[int, int] = {}
+        for level in self.levels:
+            by_level[level] = by_level.get(level, 0) + 1
+        
+        headings = []
+        top_blocks = []
+        text = self.text
+        for line, start, end in zip(self.lines, self.starts, self.ends):
+            if len(headings) >= top and len(top_blocks) >= top:
+                break
+            content = text[start:end].strip().lstrip('- \t')
+            match = HEADING_PATTERN.match(content)
+            if match and len(headings) < top:
+                headings.append({'line': line, 'depth': len(match.group(1)), 'title': match.group(2).strip()})
+            if text[start] not in ' \t' and len(top_blocks) < top:
+                top_blocks.append({'line': line, 'content': content[:200]})
+        
+        return {
+            'blocks': len(self),
+            'max_level': max(self.levels) if self.levels else 0,
+            'by_level': {str(level): count for level, count in sorted(by_level.items())},
+            'headings': headings,
+            'top_blocks': top_blocks
+        }
+
+
 class LogseqParser:
     """Parse and analyze Logseq page structure."""
     
@@ -17,53 +117,167 @@ class LogseqParser:
         Properties are in format: property:: value
         """
         properties = {}
-        property_pattern = r'^(\w+(?:-\w+)*)::(.+)$'
         
         for line in content.split('\n'):
-            line = line.strip()
-            match = re.match(property_pattern, line)
-            if match:
-                key = match.group(1).strip()
-                value = match.group(2).strip()
+            parsed = LogseqParser.parse_property_line(line)
+            if parsed:
+                key, value = parsed
                 properties[key] = value
         
         return properties
     
     @staticmethod
-    def parse_outline_structure(content: str) -> List[Dict[str, Any]]:
+    def parse_property_line(line: str) -> Optional[Tuple[str, str]]:
+        """
+        Return (key, value) if the line is a property line, otherwise None.
+        """
+        match = PROPERTY_PATTERN.match(line.strip())
+        if not match:
+            return None
+        return match.group(1).strip(), match.group(2).strip()
+    
+    @staticmethod
+    def parse_outline_structure(content: str) -> CompactOutline:
         """
         Parse Logseq outline structure.
-        Returns hierarchical structure based on indentation.
+        Returns a sequence of {'level', 'content', 'raw'} items, one per non-empty
+        line, built lazily from offsets into content.
+        """
+        return CompactOutline(content)
+    
+    @staticmethod
+    def parse_block_line(line: str) -> Tuple[int, str]:
+        """
+        Return the indentation level and bullet content of a single outline line.
         """
-        lines = content.split('\n')
-        structure = []
+        # Extract bullet content
+        bullet_content = line.strip().lstrip('- \t')
         
-        for line in lines:
-            if not line.strip():
+        return LogseqParser.indent_level(line), bullet_content
+    
+    @staticmethod
+    def iter_block_lines(content: str, in_block: bool = False) -> Iterator[Tuple[int, int, str, str, bool, bool]]:
+        """
+        Tokenize a page into its non-empty lines as
+        (line number, offset, line, stripped line, starts a block, is a bullet).
+        This is the one rule for what a block is: a bullet line, or an unindented
+        line outside any bullet, starts one; the indented (or 'key:: value')
+        non-bullet lines after it belong to it. in_block says content continues a
+        block, as when a slice of a page is tokenized on its own.
+        """
+        offset = 0
+        for line_number, line in enumerate(content.split('\n'), 1):
+            line_start = offset
+            offset += len(line) + 1
+            stripped = line.strip()
+            if not stripped:
                 continue
-            
-            # Count indentation (tabs or spaces)
-            indent_match = re.match(r'^(\t+|- |\s+)', line)
-            indent_level = 0
-            if indent_match:
-                indent_str = indent_match.group(1)
-                if '\t' in indent_str:
-                    indent_level = indent_str.count('\t')
-                elif '- ' in indent_str:
-                    indent_level = indent_str.count('- ')
-                else:
-                    indent_level = len(indent_str) // 2
-            
-            # Extract bullet content
-            bullet_content = line.strip().lstrip('- \t')
-            
-            structure.append({
-                'level': indent_level,
-                'content': bullet_content,
-                'raw': line
-            })
-        
-        return structure
+            is_bullet = stripped == '-' or stripped.startswith('- ')
+            starts_block = is_bullet or not in_block or not (line[:1] in ('\t', ' ') or '::' in stripped)
+            in_block = True
+            yield line_number, line_start, line, stripped, starts_block, is_bullet
+    
+    @staticmethod
+    def is_bullet_line(line: str) -> bool:
+        """
+        Whether the line starts a block ('- text' or a bare '-', at any indentation).
+        """
+        stripped = line.lstrip(' \t')
+        return stripped.startswith('- ') or stripped.rstrip() == '-'
+    
+    @staticmethod
+    def indent_level(line: str) -> int:
+        """
+        Indentation level of an outline line (tabs, or two spaces per level).
+        """
+        indent_match = INDENT_PATTERN.match(line)
+        if not indent_match:
+            return 0
+        indent_str = indent_match.group(1)
+        if '\t' in indent_str:
+            return indent_str.count('\t')
+        if '- ' in indent_str:
+            return indent_str.count('- ')
+        return len(indent_str) // 2
+    
+    @staticmethod
+    def parse_task_marker(block_content: str) -> Optional[str]:
+        """
+        Return the task marker (TODO, DOING, ...) a block starts with, if any.
+        """
+        match = TASK_MARKER_PATTERN.match(block_content)
+        return match.group(1) if match else None
+    
+    @staticmethod
+    def parse_task_details(block_text: str) -> Dict[str, Optional[str]]:
+        """
+        Priority ([#A]..[#C]) and SCHEDULED/DEADLINE dates (as YYYY-MM-DD) of a task
+        block, plus its first line without the marker and priority.
+        """
+        first_line = block_text.split('\n', 1)[0]
+        priority = TASK_PRIORITY_PATTERN.search(first_line)
+        title = TASK_PRIORITY_PATTERN.sub('', TASK_MARKER_PATTERN.sub('', first_line, count=1), count=1)
+        details = {
+            'priority': priority.group(1) if priority else None,
+            'scheduled': None,
+            'deadline': None,
+            'title': ' '.join(title.split())
+        }
+        for kind, day in TASK_DATE_PATTERN.findall(block_text):
+            details[kind.lower()] = day
+        return details
+    
+    @staticmethod
+    def parse_tags(text: str) -> List[str]:
+        """
+        Extract #tag and #[[multi word tag]] references, lowercased.
+        """
+        tags = []
+        for match in TAG_PATTERN.finditer(text):
+            tags.append((match.group(1) or match.group(2)).strip().lower())
+        return tags
+    
+    @staticmethod
+    def parse_links(text: str) -> List[str]:
+        """
+        Extract [[page]] references and tags as lowercased page names.
+        """
+        links = [match.group(1).strip().lower() for match in LINK_PATTERN.finditer(text)]
+        return links + LogseqParser.parse_tags(text)
+    
+    @staticmethod
+    def split_property_values(value: str) -> List[str]:
+        """
+        Split a property value such as "[[AI]], [[Learning]]" or "#a #b" into normalized values.
+        """
+        values = []
+        for part in re.split(r',|\s(?=#)', value):
+            part = part.strip().strip('#').strip()
+            if part.startswith('[[') and part.endswith(']]'):
+                part = part[2:-2]
+            if part:
+                values.append(part.lower())
+        return values
+    
+    @staticmethod
+    def page_name_from_path(page_path: Path) -> str:
+        """
+        Recover a page name from its file name (namespaces are stored as '___' or '%2F').
+        """
+        return unquote(page_path.stem.replace('___', '/'))
+    
+    @staticmethod
+    def parse_journal_date(page_path: Path) -> Optional[date]:
+        """
+        Parse the date of a journal file named like YYYY_MM_DD.md.
+        """
+        match = JOURNAL_DATE_PATTERN.match(page_path.stem)
+        if not match:
+            return None
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return None
     
     @staticmethod
     def extract_template_structure(template_content: str) -> Dict[str, Any]:
@@ -87,35 +301,6 @@ class LogseqParser:
             'raw_content': template_content
         }
     
-    @staticmethod
-    def find_templates(logseq_path: Path) -> Dict[str, Path]:
-        """
-        Find all template pages in Logseq.
-        Templates are usually in pages/ with 'template' property or in templates/ folder.
-        """
-        templates = {}
-        pages_path = logseq_path / "pages"
-        templates_path = logseq_path / "templates"
-        
-        # Check templates folder
-        if templates_path.exists():
-            for template_file in templates_path.glob("*.md"):
-                template_name = template_file.stem
-                templates[template_name] = template_file
-        
-        # Check pages with template property
-        if pages_path.exists():
-            for page_file in pages_path.glob("*.md"):
-                try:
-                    content = page_file.read_text(encoding='utf-8')
-                    if 'template::' in content.lower() or 'template-name::' in content.lower():
-                        template_name = page_file.stem
-                        templates[template_name] = page_file
-                except Exception:
-                    continue
-        
-        return templates
-    
     @staticmethod
     def analyze_page_structure(content: str) -> Dict[str, Any]:
         """
@@ -126,7 +311,7 @@ class LogseqParser:
         outline = LogseqParser.parse_outline_structure(content)
         
         # Detect formatting patterns
-        has_todos = bool(re.search(r'TODO|DOING|DONE|LATER|NOW', content))
+        has_todos = bool(re.search('|'.join(TASK_MARKERS), content))
         has_tags = bool(re.search(r'#\w+', content))
         has_links = bool(re.search(r'\[\[.*?\]\]', content))
         has_queries = bool(re.search(r'\{\{query', content))
@@ -0,0 +1,244 @@
+"""
+Small query language for the Logseq index.
+
+    TODO blocks tagged #project modified this week with status:: active
+
+is written as
+
+    task:TODO tag:project modified:this-week prop:status=active
+
+Supported clauses (all are ANDed, prefix with '-' to exclude):
+    word / "quoted words"     blocks containing every word
+    tag:name  or  #name       blocks tagged #name (or pages with tags:: name)
+    task:TODO[,DOING...]      blocks starting with one of the task markers
+    prop:key=value / key::value
+    prop:key                  blocks (or pages) that have the property
+    page:name                 blocks on the named page
+    date:RANGE                journal pages whose date falls in RANGE
+    modified:RANGE            pages whose file was modified in RANGE
+
+RANGE is a date (2024-01-31), a relative span (today, yesterday, this-week,
+last-week, this-month, 7d, 2w, 3m, "last 2 weeks") or two of those joined by '..'
+with either end left open.
+"""
+import re
+import shlex
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from .logseq_index import LogseqIndex, tokenize
+
+
+class QueryError(ValueError):
+    """Raised for malformed query strings."""
+
+
+Matches = Dict[str, Optional[Set[int]]]
+
+RELATIVE_SPAN = re.compile(r'^(?:last[\s_-]*)?(\d+)[\s_-]*(d|days?|w|weeks?|m|months?)$')
+UNIT_DAYS = {'d': 1, 'w': 7, 'm': 30}
+
+
+def parse_date(text: str) -> date:
+    try:
+        return datetime.strptime(text.replace('_', '-'), "%Y-%m-%d").date()
+    except ValueError:
+        raise QueryError(f"Invalid date: {text}")
+
+
+def parse_date_range(spec: str, today: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Turn a range expression into inclusive (start, end) dates; either end may be None.
+    """
+    today = today or date.today()
+    spec = spec.strip().lower()
+    
+    if '..' in spec:
+        start_spec, end_spec = spec.split('..', 1)
+        start = parse_date_range(start_spec, today)[0] if start_spec else None
+        end = parse_date_range(end_spec, today)[1] if end_spec else None
+        return start, end
+    
+    if spec == 'today':
+        return today, today
+    if spec == 'yesterday':
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if spec in ('this-week', 'this week'):
+        return today - timedelta(days=today.weekday()), today
+    if spec in ('last-week', 'last week'):
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if spec in ('this-month', 'this month'):
+        return today.replace(day=1), today
+    
+    match = RELATIVE_SPAN.match(spec)
+    if match:
+        days = int(match.group(1)) * UNIT_DAYS[match.group(2)[0]]
+        return today - timedelta(days=days - 1), today
+    
+    day = parse_date(spec)
+    return day, day
+
+
+def parse_query(text: str) -> List[Dict[str, Any]]:
+    """
+    Split a query string into clauses of the form {'kind', 'value', 'negate'}.
+    """
+    try:
+        parts = shlex.split(text)
+    except ValueError as e:
+        raise QueryError(f"Cannot parse query: {e}")
+    
+    clauses = []
+    for part in parts:
+        negate = part.startswith('-') and len(part) > 1
+        if negate:
+            part = part[1:]
+        
+        kind, value = 'term', part
+        field, sep, rest = part.partition(':')
+        if part.startswith('#') and len(part) > 1:
+            kind, value = 'tag', part[1:].strip('[]')
+        elif '::' in part:
+            key, _, prop_value = part.partition('::')
+            kind, value = 'prop', (key, prop_value or None)
+        elif sep and field.lower() in ('tag', 'task', 'prop', 'page', 'date', 'modified') and rest:
+            kind = field.lower()
+            if kind == 'prop':
+                key, _, prop_value = rest.partition('=')
+                value = (key, prop_value or None)
+            elif kind == 'task':
+                value = [marker.upper() for marker in rest.split(',') if marker]
+            elif kind in ('date', 'modified'):
+                value = parse_date_range(rest)
+            else:
+                value = rest
+        
+        clauses.append({'kind': kind, 'value': value, 'negate': negate})
+    
+    if not clauses:
+        raise QueryError("Empty query")
+    
+    return clauses
+
+
+def _intersect(left: Matches, right: Matches) -> Matches:
+    result = {}
+    for page_key in left.keys() & right.keys():
+        a, b = left[page_key], right[page_key]
+        if a is None:
+            combined = b
+        elif b is None:
+            combined = a
+        else:
+            combined = a & b
+        if combined is None or combined:
+            result[page_key] = combined
+    return result
+
+
+def _subtract(index: LogseqIndex, left: Matches, right: Matches) -> Matches:
+    result = {}
+    for page_key, blocks in left.items():
+        excluded = right.get(page_key, set())
+        if excluded is None:
+            continue
+        if not excluded:
+            result[page_key] = blocks
+            continue
+        if blocks is None:
+            blocks = set(range(index.pages[page_key]['block_count']))
+        remaining = blocks - excluded
+        if remaining:
+            result[page_key] = remaining
+    return result
+
+
+def _union(left: Matches, right: Matches) -> Matches:
+    result = dict(left)
+    for page_key, blocks in right.items():
+        if page_key not in result:
+            result[page_key] = blocks
+        elif result[page_key] is None or blocks is None:
+            result[page_key] = None
+        else:
+            result[page_key] = result[page_key] | blocks
+    return result
+
+
+def _pages(page_keys: Set[str]) -> Matches:
+    return {page_key: None for page_key in page_keys}
+
+
+def _clause_matches(index: LogseqIndex, clause: Dict[str, Any]) -> Matches:
+    kind, value = clause['kind'], clause['value']
+    
+    if kind == 'term':
+        terms = tokenize(value)
+        if not terms:
+            return _pages(index.all_pages())
+        matches = None
+        for term in terms:
+            found = index.lookup_term(term)
+            matches = found if matches is None else _intersect(matches, found)
+        return matches
+    if kind == 'tag':
+        return index.lookup_tag(value)
+    if kind == 'task':
+        matches = {}
+        for marker in value:
+            matches = _union(matches, index.lookup_task(marker))
+        return matches
+    if kind == 'prop':
+        return index.lookup_property(value[0], value[1])
+    if kind == 'page':
+        name = value.lower()
+        return _pages({key for key, page in index.pages.items() if page['name'].lower() == name})
+    if kind == 'date':
+        return _pages(index.journal_pages(*value))
+    if kind == 'modified':
+        start, end = value
+        start_ts = datetime.combine(start, time.min).timestamp() if start else None
+        end_ts = datetime.combine(end, time.max).timestamp() if end else None
+        return _pages(index.modified_pages(start_ts, end_ts))
+    
+    raise QueryError(f"Unknown clause: {kind}")
+
+
+def evaluate_query(index: LogseqIndex, text: str, limit: int = 50) -> Dict[str, Any]:
+    """
+    Evaluate a query string against the index.
+    Positive clauses are intersected (most selective first), negated ones subtracted.
+    """
+    clauses = parse_query(text)
+    positive = [_clause_matches(index, c) for c in clauses if not c['negate']]
+    negative = [_clause_matches(index, c) for c in clauses if c['negate']]
+    
+    if positive:
+        positive.sort(key=len)
+        matches = positive[0]
+        for other in positive[1:]:
+            if not matches:
+                break
+            matches = _intersect(matches, other)
+    else:
+        matches = _pages(index.all_pages())
+    
+    for excluded in negative:
+        matches = _subtract(index, matches, excluded)
+    
+    blocks = []
+    for page_key in sorted(matches, key=lambda key: index.pages[key]['name'].lower()):
+        block_indexes = matches[page_key]
+        if block_indexes is None:
+            block_indexes = range(index.pages[page_key]['block_count'])
+        for block_index in sorted(block_indexes):
+            blocks.append((page_key, block_index))
+    
+    return {
+        'query': text,
+        'total_blocks': len(blocks),
+        'total_pages': len(matches),
+        'blocks': [index.get_block(page_key, block_index) for page_key, block_index in blocks[:limit]]
+    }
@@ -0,0 +1,110 @@
+"""
+Task listings from the Logseq index.
+Every page record carries its task blocks (marker, priority, SCHEDULED/DEADLINE
+dates, first line), maintained with the page, so listing tasks only walks the
+pages posted under the requested markers and never re-reads or re-parses files.
+"""
+import heapq
+from datetime import date
+from operator import itemgetter
+from typing import Any, Dict, List, Optional
+
+from .logseq_index import LogseqIndex
+from .logseq_parser import TASK_MARKERS
+from .logseq_query import QueryError, parse_date_range
+
+
+OPEN_MARKERS = ('TODO', 'DOING', 'LATER', 'NOW')
+SORT_ORDERS = ('due', 'priority', 'page', 'recent')
+PRIORITY_RANK = {'A': 0, 'B': 1, 'C': 2, None: 3}
+
+
+def _in_range(day: Optional[str], bounds) -> bool:
+    start, end = bounds
+    if day is None:
+        return False
+    return (start is None or day >= start.isoformat()) and (end is None or day <= end.isoformat())
+
+
+def list_tasks(index: LogseqIndex, markers: Optional[List[str]] = None, priorities: Optional[List[str]] = None,
+               page: Optional[str] = None, scheduled: Optional[str] = None, deadline: Optional[str] = None,
+               journal_date: Optional[str] = None, overdue: bool = False, sort: str = 'due',
+               limit: int = 50, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Filter and sort task blocks. Ranges use the logseq_query RANGE syntax. A task's
+    due date is its deadline, or its scheduled date when it has no deadline;
+    overdue tasks are those due before today. Sort orders:
+        due       earliest due date first, undated last, then priority
+        priority  A before B before C before none, then due date
+        page      page name, then line
+        recent    most recently modified page first, then line
+    """
+    markers = [marker.upper() for marker in (markers or OPEN_MARKERS)]
+    unknown = [marker for marker in markers if marker not in TASK_MARKERS]
+    if unknown:
+        raise QueryError(f"Unknown task markers: {', '.join(unknown)}. Use: {', '.join(TASK_MARKERS)}")
+    if sort not in SORT_ORDERS:
+        raise QueryError(f"Unknown sort order: {sort}. Use one of: {', '.join(SORT_ORDERS)}")
+    
+    priorities = {priority.upper() for priority in priorities} if priorities else None
+    scheduled_range = parse_date_range(scheduled) if scheduled else None
+    deadline_range = parse_date_range(deadline) if deadline else None
+    journal_range = parse_date_range(journal_date) if journal_date else None
+    page_name = page.lower() if page else None
+    today = (today or date.today()).isoformat()
+    
+    # Filter the stored tuples and keep only the first `limit` in sort order as dicts.
+    matches = []
+    counts: Dict[str, int] = {}
+    page_key = record = name = None
+    for key, item in index.task_items(markers):
+        if key != page_key:
+            page_key, record = key, index.pages[key]
+            name = record['name'].lower()
+            journal_day = record['journal_date'].isoformat() if record['journal_date'] else None
+        line, marker, priority, task_scheduled, task_deadline, _ = item
+        if page_name is not None and name != page_name:
+            continue
+        if priorities is not None and priority not in priorities:
+            continue
+        if scheduled_range is not None and not _in_range(task_scheduled, scheduled_range):
+            continue
+        if deadline_range is not None and not _in_range(task_deadline, deadline_range):
+            continue
+        if journal_range is not None and not _in_range(journal_day, journal_range):
+            continue
+        due = task_deadline or task_scheduled or '9999'
+        if overdue and due >= today:
+            continue
+        
+        if sort == 'due':
+            order = (due, PRIORITY_RANK[priority], name, page_key, line)
+        elif sort == 'priority':
+            order = (PRIORITY_RANK[priority], due, name, page_key, line)
+        elif sort == 'page':
+            order = (name, page_key, line)
+        else:
+            order = (-record['mtime'], name, page_key, line)
+        matches.append((order, record, item))
+        counts[marker] = counts.get(marker, 0) + 1
+    
+    tasks = []
+    for _, record, (line, marker, priority, task_scheduled, task_deadline, title) in \
+            heapq.nsmallest(limit, matches, key=itemgetter(0)):
+        tasks.append({
+            'marker': marker,
+            'priority': priority,
+            'title': title,
+            'scheduled': task_scheduled,
+            'deadline': task_deadline,
+            'page': record['name'],
+            'path': record['path'],
+            'line': line,
+            'journal_date': record['journal_date'].isoformat() if record['journal_date'] else None
+        })
+    
+    return {
+        'total_tasks': len(matches),
+        'by_marker': counts,
+        'tasks': tasks
+    }
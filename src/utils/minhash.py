@@ -0,0 +1,323 @@
+"""
+Near-duplicate detection with MinHash signatures and LSH banding.
+Text is cut into overlapping word shingles, each shingle is hashed once and
+spread over NUM_HASHES buckets (one-permutation MinHash), and signatures live
+in flat 32-bit arrays so a large corpus costs NUM_HASHES * 4 bytes per entry.
+Candidates come from LSH: entries that agree on every row of at least one band
+share a bucket, so lookups never compare against the whole corpus.
+"""
+import re
+import threading
+from array import array
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from .readers import ReaderError
+
+
+WORD_PATTERN = re.compile(r'\w+')
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard similarity are likely to share a bucket.
+BANDS = 16
+EMPTY = 0xFFFFFFFF
+MIX = 0x9E3779B97F4A7C15
+MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> Iterable[int]:
+    """64-bit hashes of the word shingles of text (a single shingle for short text)."""
+    words = [hash(word) for word in WORD_PATTERN.findall(text.lower())]
+    if len(words) < size:
+        return [(hash(tuple(words)) * MIX) & MASK] if words else []
+    shingles = zip(*(words[offset:] for offset in range(size)))
+    return [(hash(shingle) * MIX) & MASK for shingle in shingles]
+
+
+def signature(hashes: Iterable[int], num_hashes: int = NUM_HASHES) -> Optional[array]:
+    """
+    One-permutation MinHash: each hash goes to one bucket, which keeps its minimum.
+    Empty buckets borrow from the next filled one so short texts still compare.
+    Returns None when there is nothing to sign.
+    """
+    values = [EMPTY] * num_hashes
+    for value in hashes:
+        bucket = value % num_hashes
+        value >>= 32
+        if value < values[bucket]:
+            values[bucket] = value
+    
+    filled = [bucket for bucket, value in enumerate(values) if value != EMPTY]
+    if not filled:
+        return None
+    if len(filled) < num_hashes:
+        for bucket in range(num_hashes):
+            if values[bucket] == EMPTY:
+                distance = next(d for d in range(1, num_hashes) if values[(bucket + d) % num_hashes] != EMPTY)
+                source = values[(bucket + distance) % num_hashes]
+                # Offset by the distance so borrowed values only match the same borrowing pattern.
+                values[bucket] = (source + distance * 0x9E3779B1) & 0xFFFFFFFE
+    return array('I', values)
+
+
+def similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimated Jaccard similarity: the share of positions where two signatures agree."""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+class LSHIndex:
+    """
+    Signatures of many entries in one flat array, plus LSH band buckets.
+    Entries are added, replaced and removed one at a time; removed slots are reused.
+    Not thread-safe on its own; DuplicateIndex serializes access.
+    """
+    
+    def __init__(self, num_hashes: int = NUM_HASHES, bands: int = BANDS):
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be a multiple of bands")
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        
+        self._signatures = array('I')
+        self._keys: List[Optional[Hashable]] = []
+        self._slots: Dict[Hashable, int] = {}
+        self._free: List[int] = []
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+    
+    def __len__(self) -> int:
+        return len(self._slots)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+    
+    def keys(self) -> List[Hashable]:
+        return list(self._slots)
+    
+    def add(self, key: Hashable, values: array) -> None:
+        self.remove(key)
+        if self._free:
+            slot = self._free.pop()
+            start = slot * self.num_hashes
+            self._signatures[start:start + self.num_hashes] = values
+            self._keys[slot] = key
+        else:
+            slot = len(self._keys)
+            self._signatures.extend(values)
+            self._keys.append(key)
+        self._slots[key] = slot
+        for band, band_key in enumerate(self._band_keys(values)):
+            self._buckets[band].setdefault(band_key, []).append(slot)
+    
+    def remove(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for band, band_key in enumerate(self._band_keys(self.get_slot(slot))):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.remove(slot)
+                if not bucket:
+                    del self._buckets[band][band_key]
+        self._keys[slot] = None
+        self._free.append(slot)
+    
+    def get(self, key: Hashable) -> Optional[array]:
+        slot = self._slots.get(key)
+        return None if slot is None else self.get_slot(slot)
+    
+    def get_slot(self, slot: int) -> array:
+        start = slot * self.num_hashes
+        return self._signatures[start:start + self.num_hashes]
+    
+    def candidates(self, values: Sequence[int]) -> List[Hashable]:
+        """Entries sharing at least one band bucket with values."""
+        slots = set()
+        for band, band_key in enumerate(self._band_keys(values)):
+            slots.update(self._buckets[band].get(band_key, ()))
+        return [self._keys[slot] for slot in slots]
+    
+    def similar(self, values: Sequence[int], threshold: float) -> List[Tuple[Hashable, float]]:
+        """Candidates whose estimated similarity to values is at least threshold, best first."""
+        matches = []
+        for key in self.candidates(values):
+            score = similarity(values, self.get(key))
+            if score >= threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+    
+    def pairs(self, threshold: float) -> List[Tuple[Hashable, Hashable, float]]:
+        """Every pair of entries at or above threshold, each reported once."""
+        seen = set()
+        pairs = []
+        for buckets in self._buckets:
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                for position, first in enumerate(bucket):
+                    for second in bucket[position + 1:]:
+                        pair = (first, second) if first < second else (second, first)
+                        if pair in seen:
+                            continue
+                        seen.add(pair)
+                        score = similarity(self.get_slot(first), self.get_slot(second))
+                        if score >= threshold:
+                            pairs.append((self._keys[pair[0]], self._keys[pair[1]], score))
+        return pairs
+    
+    def nbytes(self) -> int:
+        return self._signatures.itemsize * len(self._signatures)
+    
+    def _band_keys(self, values: Sequence[int]) -> List[int]:
+        rows = self.rows
+        return [hash(tuple(values[start:start + rows])) for start in range(0, self.num_hashes, rows)]
+
+
+def cluster_pairs(pairs: Iterable[Tuple[Hashable, Hashable, float]]) -> List[Dict[str, Any]]:
+    """Group duplicate pairs into clusters (connected components), largest first."""
+    parent: Dict[Hashable, Hashable] = {}
+    
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+    
+    pairs = list(pairs)
+    for first, second, _ in pairs:
+        root_first, root_second = find(first), find(second)
+        if root_first != root_second:
+            parent[root_second] = root_first
+    
+    groups: Dict[Hashable, List[Hashable]] = {}
+    for key in parent:
+        groups.setdefault(find(key), []).append(key)
+    scores: Dict[Hashable, List[float]] = {}
+    for first, _, score in pairs:
+        scores.setdefault(find(first), []).append(score)
+    
+    clusters = []
+    for root, members in groups.items():
+        clusters.append({
+            'members': sorted(members, key=str),
+            'min_similarity': round(min(scores[root]), 3),
+            'max_similarity': round(max(scores[root]), 3)
+        })
+    clusters.sort(key=lambda cluster: (-len(cluster['members']), -cluster['max_similarity']))
+    return clusters
+
+
+def collapse_near_duplicates(items: List[Dict[str, Any]], text: Callable[[Dict[str, Any]], str],
+                             threshold: float, key: Callable[[Dict[str, Any]], Any]) -> List[Dict[str, Any]]:
+    """
+    Keep the first of each group of near-duplicate items (items are assumed ranked).
+    Each kept item lists the keys of the items folded into it under 'duplicates'.
+    """
+    kept: List[Tuple[Dict[str, Any], Optional[array]]] = []
+    for item in items:
+        values = signature(shingle_hashes(text(item)))
+        for other, other_values in kept:
+            if values is not None and other_values is not None and similarity(values, other_values) >= threshold:
+                other.setdefault('duplicates', []).append(key(item))
+                break
+        else:
+            kept.append((item, values))
+    return [item for item, _ in kept]
+
+
+class DuplicateIndex:
+    """
+    Note- and block-level signatures for one notes root, kept in sync with the
+    file index: only files whose mtime or size changed are read and signed again.
+    Blocks shorter than min_block_words are not signed.
+    """
+    
+    def __init__(self, min_block_words: int = 12, num_hashes: int = NUM_HASHES, bands: int = BANDS):
+        self.min_block_words = min_block_words
+        self.notes = LSHIndex(num_hashes, bands)
+        self.blocks = LSHIndex(num_hashes, bands)
+        self._versions: Dict[str, Tuple[float, int]] = {}
+        self._note_blocks: Dict[str, List[Tuple[str, int, int]]] = {}
+        self.lock = threading.RLock()
+    
+    def update(self, entries: Iterable[Dict[str, Any]],
+               read_blocks: Callable[[Any], Iterable[Tuple[int, int, str]]],
+               prune: bool = True) -> Dict[str, int]:
+        """
+        Sign new and changed files. entries are FileIndex entries; read_blocks(path)
+        yields (first line, last line, text). With prune, files missing from entries
+        are dropped. Unreadable files are skipped (and dropped).
+        """
+        signed = 0
+        unchanged = 0
+        seen = set()
+        with self.lock:
+            for entry in entries:
+                key = entry['relative_path']
+                seen.add(key)
+                version = (entry['mtime'], entry['size'])
+                if self._versions.get(key) == version:
+                    unchanged += 1
+                    continue
+                self._remove(key)
+                try:
+                    self._sign(key, read_blocks(entry['path']))
+                except (ReaderError, OSError):
+                    continue
+                self._versions[key] = version
+                signed += 1
+            
+            removed = 0
+            if prune:
+                for key in [key for key in self._versions if key not in seen]:
+                    self._remove(key)
+                    removed += 1
+        return {'signed': signed, 'removed': removed, 'unchanged': unchanged}
+    
+    def duplicates_of(self, key: str, threshold: float) -> List[Tuple[str, float]]:
+        with self.lock:
+            values = self.notes.get(key)
+            if values is None:
+                return []
+            return [(other, score) for other, score in self.notes.similar(values, threshold) if other != key]
+    
+    def note_similarity(self, first: str, second: str) -> Optional[float]:
+        with self.lock:
+            first_values, second_values = self.notes.get(first), self.notes.get(second)
+            if first_values is None or second_values is None:
+                return None
+            return similarity(first_values, second_values)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'notes': len(self.notes),
+                'blocks': len(self.blocks),
+                'signature_bytes': self.notes.nbytes() + self.blocks.nbytes()
+            }
+    
+    def _sign(self, key: str, blocks: Iterable[Tuple[int, int, str]]) -> None:
+        note_hashes: List[int] = []
+        block_keys = []
+        for start, end, text in blocks:
+            hashes = shingle_hashes(text)
+            note_hashes.extend(hashes)
+            if len(WORD_PATTERN.findall(text)) >= self.min_block_words:
+                values = signature(hashes)
+                if values is not None:
+                    block_key = (key, start, end)
+                    self.blocks.add(block_key, values)
+                    block_keys.append(block_key)
+        
+        values = signature(note_hashes)
+        if values is not None:
+            self.notes.add(key, values)
+        self._note_blocks[key] = block_keys
+    
+    def _remove(self, key: str) -> None:
+        self._versions.pop(key, None)
+        self.notes.remove(key)
+        for block_key in self._note_blocks.pop(key, ()):
+            self.blocks.remove(block_key)
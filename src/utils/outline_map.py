@@ -0,0 +1,272 @@
+"""
+Character offsets of the blocks in a Logseq page.
+Block patches (update a block, insert under a section, set a property) look their
+target up here and splice only its range, instead of re-parsing and re-formatting
+the page. Blocks are the ones LogseqParser.iter_block_lines delimits, as for
+logseq_index.split_blocks: a bullet line (or an unindented line outside any
+bullet) plus the indented, non-bullet lines that follow it.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .hashing import content_digest
+from .logseq_parser import LogseqParser
+
+
+# Outline maps kept per LogseqTools; the least recently used is dropped first.
+MAX_CACHED_OUTLINES = 128
+
+
+class OutlineMap:
+    """
+    Parallel arrays, one entry per block:
+        starts/ends    offsets of the block's first character and of the end of its last
+                       own line (before the newline); children are not included
+        lines/end_lines  1-based line numbers of the same range
+        ranks          nesting rank; a block's subtree is the run of following blocks
+                       with a higher rank (unindented headings rank below bullets)
+        indents        leading whitespace of the first line
+        bullets        whether the block is a '- ' bullet
+        texts          first-line content without bullet or indentation
+    ids maps each id:: property value to the blocks carrying it, in page order
+    (normally one; pasted blocks can duplicate an id).
+    """
+    __slots__ = ('starts', 'ends', 'lines', 'end_lines', 'ranks', 'indents', 'bullets', 'texts',
+                 'ids', 'indent_unit')
+    
+    def __init__(self, content: str):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.lines: List[int] = []
+        self.end_lines: List[int] = []
+        self.ranks: List[int] = []
+        self.indents: List[str] = []
+        self.bullets: List[bool] = []
+        self.texts: List[str] = []
+        # id:: property value -> block positions, for block references.
+        self.ids: Dict[str, List[int]] = {}
+        
+        for line_number, line_start, line, stripped, starts_block, is_bullet in \
+                LogseqParser.iter_block_lines(content):
+            if not starts_block:
+                self.ends[-1] = line_start + len(line)
+                self.end_lines[-1] = line_number
+                prop = LogseqParser.parse_property_line(stripped)
+                if prop is not None and prop[0] == 'id':
+                    positions = self.ids.setdefault(prop[1], [])
+                    if not positions or positions[-1] != len(self.starts) - 1:
+                        positions.append(len(self.starts) - 1)
+                continue
+            
+            indent = line[:len(line) - len(line.lstrip())]
+            depth = indent.count('\t') + (len(indent) - indent.count('\t')) // 2
+            self.starts.append(line_start)
+            self.ends.append(line_start + len(line))
+            self.lines.append(line_number)
+            self.end_lines.append(line_number)
+            self.ranks.append(depth * 2 + (1 if is_bullet else 0))
+            self.indents.append(indent)
+            self.bullets.append(is_bullet)
+            self.texts.append(LogseqParser.parse_block_line(line)[1])
+        
+        self.indent_unit = self._indent_unit(self.indents)
+    
+    @staticmethod
+    def _indent_unit(indents: List[str]) -> str:
+        """Two spaces for pages indented only with spaces, a tab otherwise."""
+        if any(indent.startswith('  ') for indent in indents) and not any('\t' in indent for indent in indents):
+            return '  '
+        return '\t'
+    
+    def splice(self, content: str, start: int, end: int, replacement: str) -> Tuple[str, 'OutlineMap']:
+        """
+        Replace content[start:end] and return the new content with its outline.
+        Only the blocks the edit touches are parsed again; the ones after it keep
+        their entries, shifted by the change in length and line count.
+        """
+        new_content = content[:start] + replacement + content[end:]
+        if not self.starts:
+            return new_content, OutlineMap(new_content)
+        
+        first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        last = max(bisect.bisect_right(self.starts, end) - 1, first)
+        segment_start = min(self.starts[first], content.rfind('\n', 0, start) + 1)
+        segment_end = max(self.ends[last], end)
+        if segment_end > self.ends[last]:
+            line_end = content.find('\n', segment_end)
+            segment_end = len(content) if line_end == -1 else line_end
+        
+        delta = len(replacement) - (end - start)
+        segment = new_content[segment_start:segment_end + delta]
+        first_line = next(LogseqParser.iter_block_lines(segment, in_block=first > 0), None)
+        if first_line is not None and not first_line[4]:
+            # The edit turned the first line into a continuation of the block before it.
+            return new_content, OutlineMap(new_content)
+        
+        part = OutlineMap(segment)
+        if segment_start == self.starts[first]:
+            base_line = self.lines[first]
+        else:
+            base_line = content.count('\n', 0, segment_start) + 1
+        line_delta = replacement.count('\n') - content.count('\n', start, end)
+        
+        outline = OutlineMap('')
+        tail = slice(last + 1, None)
+        outline.starts = self.starts[:first] + [offset + segment_start for offset in part.starts] + \
+            [offset + delta for offset in self.starts[tail]]
+        outline.ends = self.ends[:first] + [offset + segment_start for offset in part.ends] + \
+            [offset + delta for offset in self.ends[tail]]
+        outline.lines = self.lines[:first] + [number + base_line - 1 for number in part.lines] + \
+            [number + line_delta for number in self.lines[tail]]
+        outline.end_lines = self.end_lines[:first] + [number + base_line - 1 for number in part.end_lines] + \
+            [number + line_delta for number in self.end_lines[tail]]
+        outline.ranks = self.ranks[:first] + part.ranks + self.ranks[tail]
+        outline.indents = self.indents[:first] + part.indents + self.indents[tail]
+        outline.bullets = self.bullets[:first] + part.bullets + self.bullets[tail]
+        outline.texts = self.texts[:first] + part.texts + self.texts[tail]
+        
+        shift = first + len(part) - (last + 1)
+        outline.ids = {}
+        for block_id, positions in self.ids.items():
+            kept = [position for position in positions if position < first]
+            kept += [position + first for position in part.ids.get(block_id, ())]
+            kept += [position + shift for position in positions if position > last]
+            if kept:
+                outline.ids[block_id] = kept
+        for block_id, positions in part.ids.items():
+            if block_id not in outline.ids:
+                outline.ids[block_id] = [position + first for position in positions]
+        outline.indent_unit = self._indent_unit(outline.indents)
+        return new_content, outline
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def at_line(self, line_number: int) -> Optional[int]:
+        """The block whose own lines include line_number."""
+        position = bisect.bisect_right(self.lines, line_number) - 1
+        if position >= 0 and line_number <= self.end_lines[position]:
+            return position
+        return None
+    
+    def subtree_end(self, position: int) -> int:
+        """Position of the last block inside the subtree of the block at position."""
+        last = position
+        while last + 1 < len(self.ranks) and self.ranks[last + 1] > self.ranks[position]:
+            last += 1
+        return last
+    
+    def select(self, line: Optional[int] = None, block_id: Optional[str] = None,
+               match: Optional[str] = None) -> int:
+        """
+        Position of the block chosen by its id:: property, a line inside it, or its
+        first-line text (which must be unique). Raises ValueError otherwise.
+        """
+        if block_id is not None:
+            positions = self.ids.get(block_id)
+            if not positions:
+                raise ValueError(f"No block with id {block_id}")
+            if len(positions) > 1:
+                lines = ', '.join(str(self.lines[position]) for position in positions)
+                raise ValueError(f"Block id {block_id} is on the blocks at lines {lines}; pass line")
+            return positions[0]
+        if line is not None:
+            position = self.at_line(line)
+            if position is None:
+                raise ValueError(f"No block at line {line}")
+            return position
+        if match is not None:
+            positions = self.find_text(match)
+            if not positions:
+                raise ValueError(f"No block matches '{match}'")
+            if len(positions) > 1:
+                lines = ', '.join(str(self.lines[position]) for position in positions)
+                raise ValueError(f"'{match}' matches the blocks at lines {lines}; pass line or block_id")
+            return positions[0]
+        raise ValueError("Select a block with line, block_id or match")
+    
+    def find_text(self, text: str) -> List[int]:
+        """Blocks whose first line is text, ignoring case and heading markers."""
+        wanted = _heading_text(text)
+        return [position for position, block_text in enumerate(self.texts) if _heading_text(block_text) == wanted]
+    
+    def page_properties(self) -> Optional[int]:
+        """The leading block of page properties (key:: value lines before any bullet), if any."""
+        if self.starts and not self.bullets[0] and not self.indents[0] and \
+                LogseqParser.parse_property_line(self.texts[0]) is not None:
+            return 0
+        return None
+    
+    def child_indent(self, position: int) -> str:
+        """Indentation for a new child of the block at position (top level under a plain heading)."""
+        if not self.bullets[position]:
+            return self.indents[position]
+        return self.indents[position] + self.indent_unit
+
+
+def indent_outline(content: str, indent: str, unit: str = '\t') -> List[str]:
+    """
+    Turn content into outline lines under indent: every non-empty line becomes a
+    bullet, keeping its own relative indentation as extra levels.
+    """
+    lines = []
+    for line in content.split('\n'):
+        text = line.strip()
+        if not text:
+            continue
+        own_indent = line[:len(line) - len(line.lstrip())]
+        depth = own_indent.count('\t') + (len(own_indent) - own_indent.count('\t')) // 2
+        if not (text == '-' or text.startswith('- ')):
+            text = f"- {text}"
+        lines.append(indent + unit * depth + text)
+    return lines
+
+
+def _heading_text(text: str) -> str:
+    return text.strip().lstrip('#').strip().lower()
+
+
+class OutlineCache:
+    """
+    Outline maps keyed by file path and content digest, so repeated patches to the
+    same page skip the outline pass. Thread-safe.
+    """
+    
+    def __init__(self, max_entries: int = MAX_CACHED_OUTLINES):
+        self.max_entries = max_entries
+        self._maps: "OrderedDict[str, Tuple[bytes, OutlineMap]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, path: str, content: str, digest: Optional[bytes] = None) -> OutlineMap:
+        """
+        Outline of content read from path; digest is its content_digest when the
+        caller already has it (read_versioned does), so it is not hashed again.
+        """
+        if digest is None:
+            digest = content_digest(content)
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == digest:
+                self._maps.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        
+        outline = OutlineMap(content)
+        self._store(path, digest, outline)
+        return outline
+    
+    def put(self, path: str, content: str, outline: OutlineMap, digest: Optional[bytes] = None) -> None:
+        """Remember the outline of content just written to path (see OutlineMap.splice)."""
+        self._store(path, content_digest(content) if digest is None else digest, outline)
+    
+    def _store(self, path: str, digest: bytes, outline: OutlineMap) -> None:
+        with self._lock:
+            self._maps[path] = (digest, outline)
+            self._maps.move_to_end(path)
+            while len(self._maps) > self.max_entries:
+                self._maps.popitem(last=False)
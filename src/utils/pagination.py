@@ -0,0 +1,163 @@
+"""
+Cursor pagination for list-returning tools.
+The first call runs the query once and keeps its results as a snapshot of
+JSON-encoded items; the response carries as many items as fit in a byte budget
+plus a cursor for the rest. Later calls with the cursor read the next page from
+the snapshot instead of running the query again. Snapshots expire ttl seconds
+after their last use, and the least recently used are dropped beyond max_snapshots.
+
+Streamed results (journal spans) are not snapshotted: their cursor carries the
+position to resume from, so nothing is kept between calls.
+"""
+import base64
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Roughly 4 bytes of JSON per model token.
+DEFAULT_PAGE_BYTES = 16384
+MIN_PAGE_BYTES = 256
+
+
+class CursorError(ValueError):
+    """Raised for a cursor that is malformed, expired, or belongs to another tool."""
+
+
+def encode_position(tool: str, position: Dict[str, Any]) -> str:
+    """Cursor holding the arguments and position of a streamed result."""
+    text = json.dumps([tool, position], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_position(tool: str, cursor: str) -> Dict[str, Any]:
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        owner, position = json.loads(text)
+    except (ValueError, TypeError):
+        raise CursorError(f"Malformed cursor: {cursor}") from None
+    if owner != tool or not isinstance(position, dict):
+        raise CursorError(f"Cursor belongs to {owner}, not {tool}")
+    return position
+
+
+class ResultSnapshot:
+    __slots__ = ('tool', 'items', 'sizes', 'meta', 'expires')
+    
+    def __init__(self, tool: str, items: List[str], sizes: List[int], meta: Dict[str, Any], expires: float):
+        self.tool = tool
+        self.items = items
+        self.sizes = sizes
+        self.meta = meta
+        self.expires = expires
+
+
+def encode_items(items: List[Any]) -> Tuple[List[str], List[int]]:
+    """Compact JSON for each item, and its size in UTF-8 bytes."""
+    encoded = [json.dumps(item, ensure_ascii=False, default=str) for item in items]
+    return encoded, [len(text.encode('utf-8')) for text in encoded]
+
+
+def page_end(sizes: List[int], offset: int, page_bytes: int) -> int:
+    """Index after the last item that fits in page_bytes from offset; at least one item."""
+    end = offset
+    used = 0
+    while end < len(sizes) and (end == offset or used + sizes[end] + 2 <= page_bytes):
+        used += sizes[end] + 2
+        end += 1
+    return end
+
+
+class CursorStore:
+    """
+    Result snapshots keyed by a random id. A cursor is '<id>:<offset>', so fetching
+    a page does not change the snapshot: retries and parallel readers are safe.
+    Thread-safe.
+    """
+    
+    def __init__(self, ttl: float = 300.0, max_snapshots: int = 64, page_bytes: int = DEFAULT_PAGE_BYTES):
+        self.ttl = ttl
+        self.max_snapshots = max_snapshots
+        self.page_bytes = page_bytes
+        self._snapshots: "OrderedDict[str, ResultSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def first_page(self, tool: str, items: List[Any], page_bytes: Optional[int] = None,
+                   meta: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Encode items and return their first page. Only results that do not fit
+        in one page are kept as a snapshot. meta is repeated on every page.
+        """
+        encoded, sizes = encode_items(items)
+        snapshot = ResultSnapshot(tool, encoded, sizes, meta or {}, 0.0)
+        page_bytes = self._page_bytes(page_bytes)
+        
+        snapshot_id = None
+        if page_end(sizes, 0, page_bytes) < len(sizes):
+            snapshot_id = secrets.token_urlsafe(12)
+            with self._lock:
+                self._expire()
+                snapshot.expires = time.monotonic() + self.ttl
+                self._snapshots[snapshot_id] = snapshot
+                while len(self._snapshots) > self.max_snapshots:
+                    self._snapshots.popitem(last=False)
+        return self._render(snapshot, snapshot_id, 0, page_bytes)
+    
+    def next_page(self, tool: str, cursor: str, page_bytes: Optional[int] = None) -> str:
+        snapshot_id, _, offset = cursor.rpartition(':')
+        if not snapshot_id or not offset.isdigit():
+            raise CursorError(f"Malformed cursor: {cursor}")
+        
+        with self._lock:
+            self._expire()
+            snapshot = self._snapshots.get(snapshot_id)
+            if snapshot is None or snapshot.expires <= time.monotonic():
+                self._snapshots.pop(snapshot_id, None)
+                raise CursorError("Cursor expired or unknown; run the query again")
+            if snapshot.tool != tool:
+                raise CursorError(f"Cursor belongs to {snapshot.tool}, not {tool}")
+            snapshot.expires = time.monotonic() + self.ttl
+            self._snapshots.move_to_end(snapshot_id)
+        
+        offset = int(offset)
+        if offset > len(snapshot.items):
+            raise CursorError(f"Cursor offset {offset} is past the end of the results")
+        return self._render(snapshot, snapshot_id, offset, self._page_bytes(page_bytes))
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire()
+            return {
+                'snapshots': len(self._snapshots),
+                'items': sum(len(snapshot.items) for snapshot in self._snapshots.values()),
+                'bytes': sum(sum(snapshot.sizes) for snapshot in self._snapshots.values())
+            }
+    
+    def _page_bytes(self, page_bytes: Optional[int]) -> int:
+        return max(page_bytes or self.page_bytes, MIN_PAGE_BYTES)
+    
+    def _expire(self) -> None:
+        # Snapshots are kept in order of last use, so expired ones are at the front.
+        now = time.monotonic()
+        while self._snapshots:
+            snapshot_id, snapshot = next(iter(self._snapshots.items()))
+            if snapshot.expires > now:
+                break
+            del self._snapshots[snapshot_id]
+    
+    @staticmethod
+    def _render(snapshot: ResultSnapshot, snapshot_id: Optional[str], offset: int, page_bytes: int) -> str:
+        end = page_end(snapshot.sizes, offset, page_bytes)
+        header = {
+            'total': len(snapshot.items),
+            'offset': offset,
+            'returned': end - offset,
+            'next_cursor': f"{snapshot_id}:{end}" if end < len(snapshot.items) else None
+        }
+        header.update(snapshot.meta)
+        # Items were encoded once when the snapshot was taken; a page only joins them.
+        items = ',\n'.join(snapshot.items[offset:end])
+        return f'{json.dumps(header, ensure_ascii=False, default=str)[:-1]}, "items": [\n{items}\n]}}'
@@ -0,0 +1,255 @@
+"""
+On-demand profiling of single tool calls.
+A Capture is bound to the call through a context variable, which asyncio tasks
+and asyncio.to_thread copy, so code anywhere below the call can report into it
+with section(). Sections record wall time and, for blocking work, the CPU time
+of the thread: a wall time well above the CPU time means the section was waiting
+on disk or network rather than computing. In 'cprofile' mode each blocking section
+also runs under a profiler for its thread; in 'tracemalloc' mode allocations are
+traced from the start of the call. Profiles and snapshots go to a directory that
+keeps only the newest files. Without an active capture, section() costs one
+context variable lookup.
+"""
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+MODES = ('timing', 'cprofile', 'tracemalloc')
+
+_capture: contextvars.ContextVar[Optional['Capture']] = contextvars.ContextVar('profile_capture', default=None)
+_thread = threading.local()
+
+# tracemalloc is process-wide: it runs while at least one capture needs it. It is
+# only stopped if this module started it, never when someone else turned it on.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+class Capture:
+    """Profiling data of one tool call."""
+    
+    def __init__(self, tool: str, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}. Use one of: {', '.join(MODES)}")
+        self.tool = tool
+        self.mode = mode
+        self.sections: Dict[str, Dict[str, Any]] = {}
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._token: Optional[contextvars.Token] = None
+    
+    def activate(self) -> None:
+        """Bind the capture to the current context (and the tasks and threads it starts)."""
+        global _tracing_users, _tracing_started
+        if self.mode == 'tracemalloc':
+            with _tracing_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracing_started = True
+                _tracing_users += 1
+            self._baseline = tracemalloc.take_snapshot()
+        self._token = _capture.set(self)
+    
+    def deactivate(self) -> Optional[tracemalloc.Snapshot]:
+        global _tracing_users, _tracing_started
+        _capture.reset(self._token)
+        self.wall_seconds = time.perf_counter() - self._started
+        if self.mode != 'tracemalloc':
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        with _tracing_lock:
+            _tracing_users -= 1
+            if not _tracing_users and _tracing_started:
+                _tracing_started = False
+                tracemalloc.stop()
+        return snapshot
+    
+    def record(self, name: str, wall: float, cpu: Optional[float]) -> None:
+        with self._lock:
+            stats = self.sections.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': None})
+            stats['calls'] += 1
+            stats['wall_seconds'] += wall
+            if cpu is not None:
+                stats['cpu_seconds'] = (stats['cpu_seconds'] or 0.0) + cpu
+    
+    def add_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self.profiles.append(profile)
+
+
+@contextlib.contextmanager
+def section(name: str, blocking: bool = True):
+    """
+    Attribute the enclosed work to name in the active capture, if any. Pass
+    blocking=False around awaits: only wall time is recorded, since the event
+    loop thread runs other requests meanwhile.
+    """
+    capture = _capture.get()
+    if capture is None:
+        yield
+        return
+    
+    profile = None
+    if blocking and capture.mode == 'cprofile' and getattr(_thread, 'profile', None) is None:
+        # Nested sections in the same thread share the outermost section's profiler.
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            _thread.profile = profile
+        except ValueError:
+            # Another profiler owns the interpreter (Python 3.12+ allows one at a time); time only.
+            profile = None
+    started = time.perf_counter()
+    cpu_started = time.thread_time() if blocking else None
+    try:
+        yield
+    finally:
+        cpu = time.thread_time() - cpu_started if blocking else None
+        capture.record(name, time.perf_counter() - started, cpu)
+        if profile is not None:
+            profile.disable()
+            _thread.profile = None
+            capture.add_profile(profile)
+
+
+def _run_section(name: str, func: Callable, args, kwargs):
+    with section(name):
+        return func(*args, **kwargs)
+
+
+async def to_thread(func: Callable, *args, **kwargs) -> Any:
+    """asyncio.to_thread, with the thread's work recorded as the 'worker' section."""
+    return await asyncio.to_thread(_run_section, 'worker', func, args, kwargs)
+
+
+def submit(executor, func: Callable, *args):
+    """executor.submit that carries the caller's capture (and other context) into the pool thread."""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+class Profiler:
+    """
+    Decides which calls are captured (a per-call mode, or a runtime mode for all
+    or some tools) and writes finished captures to directory, keeping the newest `keep` files.
+    """
+    
+    def __init__(self, directory: Path, keep: int = 20, top: int = 15):
+        self.directory = directory
+        self.keep = keep
+        self.top = top
+        self.mode: Optional[str] = None
+        self.tools: Optional[List[str]] = None
+    
+    def configure(self, mode: Optional[str], tools: Optional[List[str]] = None) -> Dict[str, Any]:
+        if mode in (None, 'off'):
+            self.mode, self.tools = None, None
+        elif mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}. Use off or one of: {', '.join(MODES)}")
+        else:
+            self.mode, self.tools = mode, tools or None
+        return self.state()
+    
+    def state(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode or 'off',
+            'tools': self.tools,
+            'directory': str(self.directory),
+            'recent_files': [path.name for path in self._files()[-5:]]
+        }
+    
+    def begin(self, tool: str, mode: Optional[str] = None) -> Optional[Capture]:
+        """Start a capture for this call when it asks for one or the runtime mode covers it."""
+        if mode is None and self.mode is not None and (self.tools is None or tool in self.tools):
+            mode = self.mode
+        if mode in (None, 'off'):
+            return None
+        capture = Capture(tool, mode)
+        capture.activate()
+        return capture
+    
+    def finish(self, capture: Capture, snapshot: Optional[tracemalloc.Snapshot] = None) -> Dict[str, Any]:
+        """Write the capture's profile or snapshot and summarize it."""
+        summary: Dict[str, Any] = {
+            'tool': capture.tool,
+            'mode': capture.mode,
+            'wall_seconds': round(capture.wall_seconds, 4),
+            'sections': {
+                name: {
+                    'calls': stats['calls'],
+                    'wall_seconds': round(stats['wall_seconds'], 4),
+                    'cpu_seconds': round(stats['cpu_seconds'], 4) if stats['cpu_seconds'] is not None else None
+                }
+                for name, stats in sorted(capture.sections.items())
+            }
+        }
+        
+        if capture.mode == 'cprofile' and capture.profiles:
+            stats = pstats.Stats(capture.profiles[0], stream=io.StringIO())
+            for profile in capture.profiles[1:]:
+                stats.add(profile)
+            path = self._output_path(capture, 'prof')
+            stats.dump_stats(str(path))
+            summary['file'] = str(path)
+            summary['top_functions'] = self._top_functions(stats)
+        elif capture.mode == 'tracemalloc' and snapshot is not None:
+            path = self._output_path(capture, 'tracemalloc')
+            snapshot.dump(str(path))
+            summary['file'] = str(path)
+            summary['top_allocations'] = [
+                {
+                    'location': str(difference.traceback),
+                    'size_kib': round(difference.size_diff / 1024, 1),
+                    'count': difference.count_diff
+                }
+                for difference in snapshot.compare_to(capture._baseline, 'lineno')[:self.top]
+            ]
+        self._rotate()
+        return summary
+    
+    def _top_functions(self, stats: pstats.Stats) -> List[Dict[str, Any]]:
+        rows = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f"{Path(filename).name}:{line}({function})",
+                'calls': calls,
+                'own_seconds': round(own, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            })
+        rows.sort(key=lambda row: row['own_seconds'], reverse=True)
+        return rows[:self.top]
+    
+    def _output_path(self, capture: Capture, extension: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return self.directory / f"{stamp}-{uuid.uuid4().hex[:6]}-{capture.tool}.{extension}"
+    
+    def _files(self) -> List[Path]:
+        try:
+            files = [path for path in self.directory.iterdir() if path.suffix in ('.prof', '.tracemalloc')]
+        except OSError:
+            return []
+        return sorted(files, key=lambda path: path.stat().st_mtime)
+    
+    def _rotate(self) -> None:
+        files = self._files()
+        for path in files[:max(len(files) - self.keep, 0)]:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not remove old profile {path}: {e}")
@@ -0,0 +1,167 @@
+"""
+Query planning for regex search over note files.
+A query is compiled once (LRU-cached across calls) and the literals every match
+must contain are pulled out of its parse tree, so files that lack them can be
+ruled out with a byte search before any decoding or regex work.
+"""
+import mmap
+import re
+from functools import lru_cache
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from .readers import CHUNK_SIZE, FileReader
+
+
+# ASCII letters that also match non-ASCII characters under re.IGNORECASE
+# (Kelvin sign, long s, dotted/dotless i), so they cannot be searched as bytes.
+UNSAFE_IGNORECASE = set('iksIKS')
+MAX_LITERALS = 3
+REPEAT_OPS = tuple(
+    op for op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None))
+    if op is not None
+)
+MIN_LITERAL_LENGTH = 2
+
+
+class QueryPlan:
+    """A compiled query plus the byte strings any matching line must contain."""
+    __slots__ = ('query', 'pattern', 'literals', 'ignore_case')
+    
+    def __init__(self, query: str, pattern: re.Pattern, literals: Tuple[bytes, ...], ignore_case: bool):
+        self.query = query
+        self.pattern = pattern
+        self.literals = literals
+        self.ignore_case = ignore_case
+    
+    def __repr__(self) -> str:
+        return f"QueryPlan({self.query!r}, literals={self.literals!r}, ignore_case={self.ignore_case})"
+
+
+@lru_cache(maxsize=256)
+def plan_query(query: str, case_sensitive: bool = False) -> QueryPlan:
+    """
+    Compile query and extract its required literals. Raises re.error for invalid patterns.
+    """
+    flags = 0 if case_sensitive else re.IGNORECASE
+    pattern = re.compile(query, flags)
+    ignore_case = bool(pattern.flags & re.IGNORECASE)
+    
+    try:
+        parsed = sre_parse.parse(query, flags)
+        runs = _required_runs(parsed)
+    except Exception:
+        runs = []
+    
+    literals = []
+    for run in runs:
+        literals.extend(_byte_fragments(run, ignore_case))
+    # Longest (most selective) first; dict.fromkeys keeps the order deterministic.
+    literals = sorted(dict.fromkeys(literals), key=len, reverse=True)[:MAX_LITERALS]
+    
+    return QueryPlan(query, pattern, tuple(literals), ignore_case)
+
+
+def _required_runs(parsed) -> List[str]:
+    """
+    Maximal runs of literal characters that every match must contain.
+    Groups and repeats with a minimum of one contribute their own runs;
+    anything optional or alternative breaks the run and is skipped.
+    """
+    runs = []
+    current = []
+    
+    def flush():
+        if current:
+            runs.append(''.join(current))
+            current.clear()
+    
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(av))
+        elif op is sre_constants.AT:
+            # Anchors such as \b and ^ are zero-width and do not split a literal.
+            continue
+        elif op is sre_constants.SUBPATTERN:
+            flush()
+            _, add_flags, del_flags, subpattern = av
+            if not add_flags and not del_flags:
+                runs.extend(_required_runs(subpattern))
+        elif op in REPEAT_OPS:
+            flush()
+            minimum, _, subpattern = av
+            if minimum >= 1:
+                runs.extend(_required_runs(subpattern))
+        else:
+            flush()
+    flush()
+    return runs
+
+
+def _byte_fragments(run: str, ignore_case: bool) -> List[bytes]:
+    """
+    Split a literal run into byte strings safe to look for in UTF-8 text.
+    Case-insensitive literals keep only ASCII characters that case-fold within ASCII
+    and are searched in lowercase.
+    """
+    fragments = []
+    current = []
+    for char in run:
+        if char in '\r\n' or (ignore_case and (not char.isascii() or char in UNSAFE_IGNORECASE)):
+            if current:
+                fragments.append(''.join(current))
+                current = []
+        else:
+            current.append(char.lower() if ignore_case else char)
+    if current:
+        fragments.append(''.join(current))
+    return [fragment.encode('utf-8') for fragment in fragments if len(fragment) >= MIN_LITERAL_LENGTH]
+
+
+def file_may_match(plan: QueryPlan, reader: FileReader, path) -> bool:
+    """
+    False only when the file provably lacks one of the plan's literals.
+    Files whose reader cannot expose UTF-8 bytes are always searched.
+    """
+    if not plan.literals:
+        return True
+    raw = reader.open_raw(path)
+    if raw is None:
+        return True
+    with raw:
+        if not plan.ignore_case:
+            found = _mmap_contains_all(raw, plan.literals)
+            if found is not None:
+                return found
+        return _stream_contains_all(raw, plan.literals, plan.ignore_case)
+
+
+def _mmap_contains_all(raw: BinaryIO, literals: Iterable[bytes]) -> Optional[bool]:
+    try:
+        data = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        # Not a regular file (e.g. a decompressing stream) or empty.
+        return None
+    with data:
+        return all(data.find(literal) != -1 for literal in literals)
+
+
+def _stream_contains_all(raw: BinaryIO, literals: Tuple[bytes, ...], ignore_case: bool) -> bool:
+    missing = set(literals)
+    overlap = max(len(literal) for literal in literals) - 1
+    tail = b''
+    
+    while missing:
+        chunk = raw.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        window = tail + (chunk.lower() if ignore_case else chunk)
+        missing = {literal for literal in missing if window.find(literal) == -1}
+        tail = window[-overlap:] if overlap else b''
+    return True
@@ -0,0 +1,195 @@
+"""
+Pluggable readers for the file types that can live in a notes root.
+Every reader streams lines so that scanners never hold a whole file in memory.
+"""
+import codecs
+import gzip
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+
+CHUNK_SIZE = 1 << 20
+MAX_SEGMENT = 1 << 16
+
+
+class ReaderError(Exception):
+    """Raised when a file cannot be decoded by its reader."""
+    
+    def __init__(self, path: Path, reason: str):
+        super().__init__(f"{path}: {reason}")
+        self.path = path
+        self.reason = reason
+
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def detect_encoding(head: bytes, default: str = 'utf-8') -> str:
+    """
+    Pick an encoding from the byte-order mark at the start of a file.
+    Files without a BOM are assumed to be UTF-8.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return default
+
+
+class FileReader:
+    """Base reader. Subclasses declare the extensions they handle."""
+    
+    extensions: tuple = ()
+    
+    def open(self, path: Path):
+        raise NotImplementedError
+    
+    def open_raw(self, path: Path) -> Optional[BinaryIO]:
+        """
+        Open the file as a binary stream of UTF-8 text, for byte-level prefilters.
+        Returns None when the content is in another encoding or cannot be exposed as bytes.
+        """
+        return None
+    
+    def iter_lines(self, path: Path) -> Iterator[str]:
+        """
+        Yield the lines of a file without their trailing newline.
+        Decoding problems are raised as ReaderError instead of being swallowed.
+        """
+        with self._decoding(path):
+            with self.open(path) as f:
+                for line in f:
+                    yield line.rstrip('\n')
+    
+    def iter_segments(self, path: Path, chunk_size: int = CHUNK_SIZE,
+                      max_segment: int = MAX_SEGMENT) -> Iterator[Tuple[int, int, str]]:
+        """
+        Yield (line number, offset in line, text) pieces read in fixed-size chunks.
+        Lines longer than max_segment arrive as several pieces, so memory stays
+        bounded by chunk_size + max_segment however long a line is.
+        """
+        with self._decoding(path):
+            with self.open(path) as f:
+                line_number = 1
+                offset = 0
+                pending = ''
+                
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    
+                    lines = (pending + chunk).split('\n')
+                    pending = lines.pop()
+                    
+                    for line in lines:
+                        while len(line) > max_segment:
+                            yield line_number, offset, line[:max_segment]
+                            offset += max_segment
+                            line = line[max_segment:]
+                        yield line_number, offset, line
+                        line_number += 1
+                        offset = 0
+                    
+                    while len(pending) > max_segment:
+                        yield line_number, offset, pending[:max_segment]
+                        offset += max_segment
+                        pending = pending[max_segment:]
+                
+                if pending or offset:
+                    yield line_number, offset, pending
+    
+    def read_text(self, path: Path) -> str:
+        with self._decoding(path):
+            with self.open(path) as f:
+                return f.read()
+    
+    @contextmanager
+    def _decoding(self, path: Path):
+        try:
+            yield
+        except UnicodeDecodeError as e:
+            raise ReaderError(path, f"cannot decode as {e.encoding} at byte {e.start}: {e.reason}") from e
+        except (EOFError, gzip.BadGzipFile) as e:
+            raise ReaderError(path, f"corrupt archive: {e}") from e
+
+
+class TextReader(FileReader):
+    extensions = ('.md', '.markdown', '.txt')
+    
+    def open(self, path: Path):
+        with open(path, 'rb') as f:
+            encoding = detect_encoding(f.read(4))
+        return open(path, 'r', encoding=encoding, errors='strict')
+    
+    def open_raw(self, path: Path) -> Optional[BinaryIO]:
+        return _utf8_stream(open(path, 'rb'))
+
+
+class OrgReader(TextReader):
+    extensions = ('.org',)
+
+
+class GzipReader(FileReader):
+    extensions = ('.md.gz', '.txt.gz', '.org.gz')
+    
+    def open(self, path: Path):
+        with gzip.open(path, 'rb') as f:
+            encoding = detect_encoding(f.read(4))
+        return gzip.open(path, 'rt', encoding=encoding, errors='strict')
+    
+    def open_raw(self, path: Path) -> Optional[BinaryIO]:
+        return _utf8_stream(gzip.open(path, 'rb'))
+
+
+def _utf8_stream(f: BinaryIO) -> Optional[BinaryIO]:
+    """Rewind and return f if its content is UTF-8 (with or without BOM), else close it."""
+    if detect_encoding(f.read(4)) in ('utf-8', 'utf-8-sig'):
+        f.seek(0)
+        return f
+    f.close()
+    return None
+
+
+_READERS: Dict[str, FileReader] = {}
+
+
+def register_reader(reader: FileReader) -> None:
+    """Register a reader for every extension it declares, replacing earlier ones."""
+    for extension in reader.extensions:
+        _READERS[extension.lower()] = reader
+
+
+def get_reader(path: Path) -> Optional[FileReader]:
+    """Return the reader for a path, preferring compound extensions such as '.md.gz'."""
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if len(suffixes) >= 2:
+        reader = _READERS.get(''.join(suffixes[-2:]))
+        if reader is not None:
+            return reader
+    if suffixes:
+        return _READERS.get(suffixes[-1])
+    return None
+
+
+def is_supported(path: Path) -> bool:
+    return get_reader(path) is not None
+
+
+def is_supported_name(name: str) -> bool:
+    """is_supported for a bare file name, for directory scans that have no Path yet."""
+    return '.' in name and get_reader(Path(name)) is not None
+
+
+def supported_extensions() -> List[str]:
+    return sorted(_READERS.keys())
+
+
+for _reader in (TextReader(), OrgReader(), GzipReader()):
+    register_reader(_reader)
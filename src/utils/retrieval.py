@@ -0,0 +1,163 @@
+"""
+Block retrieval for question answering over a note set.
+Files are streamed block by block and scored with BM25 against the query terms,
+so only the top-k blocks (with their file and line numbers) reach the model.
+"""
+import heapq
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+
+from .cancellation import check_cancelled
+from .readers import ReaderError, get_reader
+
+
+TERM_PATTERN = re.compile(r'\w+')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from', 'how',
+    'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'that', 'the', 'this', 'to',
+    'was', 'we', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'about', 'all', 'any',
+    'de', 'del', 'el', 'en', 'es', 'la', 'las', 'los', 'que', 'un', 'una', 'y', 'por', 'para'
+}
+
+MAX_BLOCK_LINES = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def query_terms(query: str) -> List[str]:
+    terms = [term for term in TERM_PATTERN.findall(query.lower()) if term not in STOPWORDS]
+    return terms or TERM_PATTERN.findall(query.lower())
+
+
+def iter_text_blocks(lines: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+    """
+    Group lines into blocks: a bullet, heading or blank line starts a new block.
+    Yields (first line, last line, text) with 1-based line numbers.
+    """
+    buffer: List[str] = []
+    start = 0
+    
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        starts_block = (
+            not stripped or stripped.startswith(('- ', '* ', '#')) or len(buffer) >= MAX_BLOCK_LINES
+        )
+        if starts_block and buffer:
+            yield start, start + len(buffer) - 1, '\n'.join(buffer)
+            buffer = []
+        if stripped:
+            if not buffer:
+                start = number
+            buffer.append(line.rstrip())
+    
+    if buffer:
+        yield start, start + len(buffer) - 1, '\n'.join(buffer)
+
+
+class BlockScorer:
+    """
+    Collects candidate blocks in one pass, then ranks them with BM25 once the
+    corpus statistics (block count, document frequencies, average length) are known.
+    """
+    
+    def __init__(self, query: str):
+        self.terms = query_terms(query)
+        self.term_set = set(self.terms)
+        self.total_blocks = 0
+        self.total_length = 0
+        self.doc_freq: Dict[str, int] = {term: 0 for term in self.term_set}
+        self.candidates: List[Dict[str, Any]] = []
+    
+    def add(self, text: str, location: Dict[str, Any]) -> None:
+        tokens = TERM_PATTERN.findall(text.lower())
+        self.total_blocks += 1
+        self.total_length += len(tokens)
+        
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            if token in self.term_set:
+                counts[token] = counts.get(token, 0) + 1
+        if not counts:
+            return
+        
+        for term in counts:
+            self.doc_freq[term] += 1
+        candidate = dict(location)
+        candidate.update({'text': text, 'term_counts': counts, 'length': len(tokens)})
+        self.candidates.append(candidate)
+    
+    def top(self, top_k: int, total_blocks: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rank the candidates. When only candidate blocks were added (e.g. from an inverted
+        index), pass the corpus size as total_blocks so IDF is computed against it.
+        """
+        if not self.candidates:
+            return []
+        
+        average_length = self.total_length / max(self.total_blocks, 1)
+        if total_blocks is not None:
+            self.total_blocks = max(total_blocks, self.total_blocks)
+        idf = {
+            term: math.log(1 + (self.total_blocks - df + 0.5) / (df + 0.5))
+            for term, df in self.doc_freq.items()
+        }
+        
+        def score(candidate: Dict[str, Any]) -> float:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * candidate['length'] / max(average_length, 1))
+            return sum(
+                idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                for term, tf in candidate['term_counts'].items()
+            )
+        
+        ranked = heapq.nlargest(top_k, self.candidates, key=score)
+        results = []
+        for candidate in ranked:
+            result = {k: v for k, v in candidate.items() if k not in ('term_counts', 'length')}
+            result['score'] = round(score(candidate), 4)
+            results.append(result)
+        return results
+
+
+def retrieve_from_files(files: Iterable[Tuple[Path, str]], query: str, top_k: int = 8,
+                        errors: Optional[List[Dict[str, str]]] = None,
+                        cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+    """
+    Stream (path, relative path) pairs block by block and return the top-k blocks for query.
+    """
+    scorer = BlockScorer(query)
+    
+    for file_path, relative_path in files:
+        check_cancelled(cancel)
+        reader = get_reader(file_path)
+        if reader is None:
+            continue
+        try:
+            for start, end, text in iter_text_blocks(reader.iter_lines(file_path)):
+                scorer.add(text, {'path': relative_path, 'line': start, 'end_line': end})
+        except (ReaderError, OSError) as e:
+            if errors is not None:
+                errors.append({'path': str(file_path), 'error': str(getattr(e, 'reason', e))})
+    
+    return scorer.top(top_k)
+
+
+def format_context(blocks: List[Dict[str, Any]]) -> str:
+    """Number the retrieved blocks so the model can refer to them as [1], [2], ..."""
+    sections = []
+    for number, block in enumerate(blocks, 1):
+        sections.append(f"[{number}] {format_location(block)}\n{block['text']}")
+    return '\n\n'.join(sections)
+
+
+def format_citations(blocks: List[Dict[str, Any]]) -> str:
+    return '\n'.join(f"[{number}] {format_location(block)}" for number, block in enumerate(blocks, 1))
+
+
+def format_location(block: Dict[str, Any]) -> str:
+    prefix = f"{block['vault']}:" if block.get('vault') else ''
+    lines = f"L{block['line']}" if block['line'] == block['end_line'] else f"L{block['line']}-{block['end_line']}"
+    return f"{prefix}{block['path']}:{lines}"
@@ -0,0 +1,78 @@
+"""
+Single-flight coalescing of identical async calls.
+While a call for a key is running, later calls with the same key await its
+result instead of starting their own, so two agents asking for the same
+summary at the same time cost one generation. Nothing is cached: once the
+call finishes, the next one for the key runs again.
+"""
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace runs, so prompts that differ only in spacing share a key."""
+    return ' '.join(text.split())
+
+
+def flight_key(*parts: Any) -> str:
+    """Digest of the normalized parts; str parts are whitespace-normalized."""
+    digest = hashlib.sha256()
+    for part in parts:
+        text = normalize_prompt(part) if isinstance(part, str) else repr(part)
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time on the event loop. The shared call
+    runs as its own task: a caller that is cancelled stops waiting without
+    cancelling it for the others, and it is cancelled only once nobody waits.
+    Exceptions reach every caller of the flight.
+    """
+    
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+    
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.get_running_loop().create_task(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._finished(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Later callers start a fresh flight rather than join a cancelled one.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+    
+    def metrics(self) -> Dict[str, int]:
+        return {'in_flight': len(self._flights), 'started': self.started, 'coalesced': self.coalesced}
+    
+    def _finished(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark the exception retrieved when every caller had already given up.
+            flight.task.exception()
@@ -0,0 +1,121 @@
+"""
+Constant-memory pattern scan of a single file.
+Text is read in fixed-size chunks, long lines are cut into segments that overlap
+by a few hundred characters so matches spanning a cut are still found (once),
+and context lines are kept in a ring buffer instead of the whole file.
+"""
+import re
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+
+from .cancellation import check_cancelled
+from .readers import CHUNK_SIZE, MAX_SEGMENT, FileReader
+
+
+OVERLAP = 256
+MAX_LINE_CONTENT = 500
+
+
+def _display(text: str, base: int = 0, match_start: int = 0) -> Tuple[str, int]:
+    """
+    Trim a line (or long-line piece starting at line offset base) to a window around
+    the match and strip it. Returns the text and the line offset of its first character.
+    """
+    start = 0
+    if len(text) > MAX_LINE_CONTENT:
+        start = max(0, match_start - MAX_LINE_CONTENT // 2)
+        text = text[start:start + MAX_LINE_CONTENT]
+    stripped = text.lstrip()
+    return stripped.rstrip(), base + start + len(text) - len(stripped)
+
+
+def scan_file(reader: FileReader, file_path: Path, pattern: re.Pattern,
+              max_matching_lines: int = 10, context_before: int = 0, context_after: int = 0,
+              chunk_size: int = CHUNK_SIZE, max_segment: int = MAX_SEGMENT,
+              cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Count the matches of pattern in a file and collect the first matching lines.
+
+    Returns {'matches_count', 'matching_lines'}; each matching line carries its
+    'content' (long lines trimmed to a window around the first match) and the
+    [start, end) character 'spans' of the matches inside it. With context_before or
+    context_after, 'context' holds the surrounding windows, merged where they overlap:
+    [{'start_line', 'end_line', 'lines'}]. Everything is gathered in the same pass,
+    keeping only the last context_before lines in a ring buffer.
+    Raises OperationCancelled as soon as cancel is set.
+    """
+    matches_count = 0
+    matching_lines: List[Dict[str, Any]] = []
+    want_context = bool(context_before or context_after)
+    windows: List[Dict[str, Any]] = []
+    before = deque(maxlen=context_before)
+    window_until = 0
+    
+    current_line = 0
+    head = ''
+    match_entry: Optional[Dict[str, Any]] = None
+    match_shift = 0
+    tail = ''
+    
+    def finish_line(line_number: int) -> None:
+        nonlocal window_until
+        line_text = _display(head)[0]
+        
+        if match_entry is not None:
+            matching_lines.append(match_entry)
+            if want_context:
+                first = line_number - len(before)
+                if windows and windows[-1]['end_line'] + 1 >= first:
+                    window = windows[-1]
+                else:
+                    window = {'start_line': first, 'end_line': first - 1, 'lines': []}
+                    windows.append(window)
+                for number, text in before:
+                    if number > window['end_line']:
+                        window['lines'].append(text)
+                window['lines'].append(line_text)
+                window['end_line'] = line_number
+                window_until = line_number + context_after
+        elif windows and line_number <= window_until:
+            windows[-1]['lines'].append(line_text)
+            windows[-1]['end_line'] = line_number
+        
+        before.append((line_number, line_text))
+    
+    for line_number, offset, piece in reader.iter_segments(file_path, chunk_size, max_segment):
+        check_cancelled(cancel)
+        if line_number != current_line:
+            if current_line:
+                finish_line(current_line)
+            current_line = line_number
+            head = piece[:MAX_LINE_CONTENT]
+            match_entry = None
+            tail = ''
+        
+        # Pieces of a long line overlap by `tail`; matches ending inside it were counted with the previous piece.
+        text = tail + piece
+        base = offset - len(tail)
+        for match in pattern.finditer(text):
+            if match.end() <= len(tail):
+                continue
+            matches_count += 1
+            
+            if match_entry is None:
+                if len(matching_lines) >= max_matching_lines:
+                    continue
+                content, match_shift = _display(text, base, match.start())
+                match_entry = {'line_number': line_number, 'content': content, 'spans': []}
+            start, end = base + match.start() - match_shift, base + match.end() - match_shift
+            if 0 <= start and end <= len(match_entry['content']):
+                match_entry['spans'].append([start, end])
+        tail = piece[-OVERLAP:]
+    
+    if current_line:
+        finish_line(current_line)
+    
+    result = {'matches_count': matches_count, 'matching_lines': matching_lines}
+    if want_context:
+        result['context'] = windows
+    return result
@@ -0,0 +1,166 @@
+"""
+In-memory index of Logseq page titles.
+Every page is reachable by its name, its alias:: values and the last segment of
+a namespaced name (a/b/c -> c). Lookups are exact, prefix (autocomplete, via a
+sorted list) or fuzzy (trigram overlap), all answered without touching disk.
+"""
+import bisect
+import math
+import re
+from collections import Counter
+from itertools import chain
+from typing import Dict, List, Iterable, Set, Tuple
+
+
+SPACE_PATTERN = re.compile(r'\s+')
+
+# Minimum Dice similarity between trigram sets for a fuzzy match.
+FUZZY_THRESHOLD = 0.3
+
+
+def normalize_title(title: str) -> str:
+    return SPACE_PATTERN.sub(' ', title.strip().lower())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    Title -> page key lookups. Not thread-safe on its own; LogseqIndex updates
+    and reads it under its lock.
+    """
+    
+    def __init__(self):
+        # Normalized title -> {page key: (display title, kind)}, kind is 'name', 'alias' or 'namespace'.
+        self._titles: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._sorted: List[str] = []
+        self._sorted_stale = False
+        self._page_titles: Dict[str, List[str]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._titles)
+    
+    def state(self) -> Tuple[Dict[str, Dict[str, Tuple[str, str]]], Dict[str, Set[str]], Dict[str, List[str]]]:
+        """Plain containers for persisting the index (see graph_snapshot)."""
+        return self._titles, self._trigrams, self._page_titles
+    
+    @classmethod
+    def from_state(cls, state) -> 'TitleIndex':
+        index = cls()
+        index._titles, index._trigrams, index._page_titles = state
+        index._sorted_stale = True
+        return index
+    
+    def add(self, page_key: str, name: str, aliases: Iterable[str] = ()) -> None:
+        self.remove(page_key)
+        entries = [(name, 'name')]
+        if '/' in name:
+            entries.append((name.rsplit('/', 1)[1], 'namespace'))
+        entries.extend((alias, 'alias') for alias in aliases)
+        
+        added = []
+        for title, kind in entries:
+            normalized = normalize_title(title)
+            if not normalized or normalized in added:
+                continue
+            pages = self._titles.get(normalized)
+            if pages is None:
+                pages = self._titles[normalized] = {}
+                for trigram in trigrams(normalized):
+                    self._trigrams.setdefault(trigram, set()).add(normalized)
+                self._sorted_stale = True
+            pages[page_key] = (title.strip(), kind)
+            added.append(normalized)
+        self._page_titles[page_key] = added
+    
+    def remove(self, page_key: str) -> None:
+        for normalized in self._page_titles.pop(page_key, ()):
+            pages = self._titles.get(normalized)
+            if pages is None:
+                continue
+            pages.pop(page_key, None)
+            if not pages:
+                del self._titles[normalized]
+                for trigram in trigrams(normalized):
+                    titles = self._trigrams.get(trigram)
+                    if titles is not None:
+                        titles.discard(normalized)
+                        if not titles:
+                            del self._trigrams[trigram]
+                self._sorted_stale = True
+    
+    def exact(self, title: str) -> List[Dict[str, str]]:
+        normalized = normalize_title(title)
+        return self._matches(normalized, 1.0)
+    
+    def prefix(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Titles starting with prefix, alphabetically."""
+        normalized = normalize_title(prefix)
+        if self._sorted_stale:
+            self._sorted = sorted(self._titles)
+            self._sorted_stale = False
+        
+        results = []
+        position = bisect.bisect_left(self._sorted, normalized)
+        while position < len(self._sorted) and len(results) < limit:
+            title = self._sorted[position]
+            if not title.startswith(normalized):
+                break
+            results.extend(self._matches(title, 1.0))
+            position += 1
+        return results[:limit]
+    
+    def fuzzy(self, query: str, limit: int = 10, threshold: float = FUZZY_THRESHOLD) -> List[Dict[str, str]]:
+        """Titles ranked by trigram similarity (Dice coefficient) to query."""
+        normalized = normalize_title(query)
+        query_trigrams = trigrams(normalized)
+        if not normalized:
+            return []
+        
+        # Prefix filtering: a title scoring >= threshold shares at least `needed` trigrams with
+        # the query, so it must contain one of the len - needed + 1 rarest. Only those postings
+        # are scanned; the common trigrams are then counted for the candidates alone.
+        postings = sorted(
+            (self._trigrams.get(trigram, ()) for trigram in query_trigrams), key=len
+        )
+        needed = max(1, math.ceil(threshold * len(query_trigrams) / (2 - threshold)))
+        probe = len(postings) - needed + 1
+        shared = Counter(chain.from_iterable(postings[:probe]))
+        for posting in postings[probe:]:
+            if len(posting) < len(shared):
+                for title in posting:
+                    if title in shared:
+                        shared[title] += 1
+            else:
+                for title in shared:
+                    if title in posting:
+                        shared[title] += 1
+        
+        scored = []
+        for title, count in shared.items():
+            # A title has len + 1 trigrams with this padding.
+            score = 2 * count / (len(query_trigrams) + len(title) + 1)
+            if title.startswith(normalized):
+                # Typing the start of a title is a strong signal, more so the more of it is typed.
+                score = max(score, 0.5 + 0.5 * len(normalized) / len(title))
+            if score >= threshold:
+                scored.append((score, title))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        
+        results = []
+        for score, title in scored:
+            results.extend(self._matches(title, score))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+    
+    def _matches(self, normalized: str, score: float) -> List[Dict[str, str]]:
+        pages = self._titles.get(normalized, {})
+        return [
+            {'page_key': page_key, 'matched': title, 'kind': kind, 'score': round(score, 3)}
+            for page_key, (title, kind) in sorted(pages.items())
+        ]
@@ -0,0 +1,216 @@
+"""
+Directory traversal shared by the file scanners.
+Walks a root with os.scandir and prunes directories before descending into them:
+gitignore-style ignore patterns (from config, plus defaults for VCS folders,
+trash folders and Logseq backups) and hidden directories. Symlinked directories
+are followed only when asked, and then each directory is visited once, so a
+link back to an ancestor cannot loop.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Folders that hold copies, history or tooling rather than notes.
+DEFAULT_IGNORES = (
+    '.git/', '.hg/', '.svn/',
+    'node_modules/', '__pycache__/',
+    '.recycle/', '.trash/', '.Trash*/', '$RECYCLE.BIN/',
+    '.stversions/', '.obsidian/',
+    '**/logseq/bak/', '**/logseq/.recycle/', '**/logseq/version-files/',
+)
+
+WALK_COUNTERS = ('directories', 'files', 'pruned_directories', 'ignored_files', 'symlink_revisits')
+
+
+def _translate(pattern: str) -> str:
+    """Regular expression body for one gitignore glob (without anchors)."""
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        else:
+            char = pattern[i]
+            if char == '*':
+                out.append('[^/]*')
+            elif char == '?':
+                out.append('[^/]')
+            elif char == '\\' and i + 1 < n:
+                i += 1
+                out.append(re.escape(pattern[i]))
+            elif char == '[' and pattern.find(']', i + 2) != -1:
+                end = pattern.find(']', i + 2)
+                members = pattern[i + 1:end].replace('\\', '\\\\')
+                if members.startswith('!'):
+                    members = '^' + members[1:]
+                out.append(f'[{members}]')
+                i = end
+            else:
+                out.append(re.escape(char))
+            i += 1
+    return ''.join(out)
+
+
+class IgnoreRules:
+    """
+    gitignore-style patterns matched against paths relative to the walked root
+    ('/'-separated). Supported: comments, '!' negation (the last matching
+    pattern wins), a trailing '/' for directories only, a leading or inner '/'
+    to anchor at the root, and '*', '?', '[...]' and '**'.
+    """
+    
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[str] = []
+        self._rules: List[Tuple[Any, bool, bool]] = []
+        # Without negations, one alternation per kind of path answers in a single match.
+        self._combined: Optional[Tuple[Any, Any]] = None
+        for line in patterns:
+            self.add(line)
+    
+    def add(self, line: str) -> None:
+        pattern = line.rstrip('\n')
+        if pattern.endswith(' ') and not pattern.endswith('\\ '):
+            pattern = pattern.rstrip(' ')
+        if not pattern or pattern.startswith('#'):
+            return
+        self.patterns.append(pattern)
+        
+        negated = pattern.startswith('!')
+        if negated or pattern.startswith('\\#') or pattern.startswith('\\!'):
+            pattern = pattern[1:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            return
+        anchored = '/' in pattern
+        body = _translate(pattern.lstrip('/'))
+        regex = re.compile(('^' if anchored else '^(?:.*/)?') + body + '$')
+        self._rules.append((regex, dir_only, negated))
+        self._combined = None
+    
+    def __len__(self) -> int:
+        return len(self._rules)
+    
+    def ignored(self, relative: str, is_dir: bool) -> bool:
+        if self._combined is None and not any(negated for _, _, negated in self._rules):
+            self._combined = (
+                self._alternation(regex for regex, _, _ in self._rules),
+                self._alternation(regex for regex, dir_only, _ in self._rules if not dir_only)
+            )
+        if self._combined is not None:
+            regex = self._combined[0 if is_dir else 1]
+            return regex is not None and regex.match(relative) is not None
+        
+        for regex, dir_only, negated in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative):
+                return not negated
+        return False
+    
+    @staticmethod
+    def _alternation(regexes: Iterable[Any]) -> Any:
+        sources = [regex.pattern for regex in regexes]
+        return re.compile('|'.join(f'(?:{source})' for source in sources)) if sources else None
+
+
+class Traversal:
+    """
+    Walk settings: ignore rules, hidden-directory pruning and symlink policy.
+    Holds no per-walk state, so one instance can serve every vault and thread.
+    """
+    
+    def __init__(self, ignore: Iterable[str] = (), default_ignores: bool = True,
+                 include_hidden: bool = False, follow_symlinks: bool = False):
+        self.rules = IgnoreRules([*(DEFAULT_IGNORES if default_ignores else ()), *ignore])
+        self.include_hidden = include_hidden
+        self.follow_symlinks = follow_symlinks
+    
+    def walk(self, root: Path, accept: Optional[Callable[[str], bool]] = None,
+             recursive: bool = True, counts: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Yield (relative path with '/' separators, directory entry) for each file
+        under root that is not ignored and, if given, whose name passes accept.
+        Unreadable directories are skipped. counts, if given, is filled with
+        directories scanned, files yielded, pruned directories, ignored files and
+        directories skipped because a symlink led back to them.
+        """
+        if counts is None:
+            counts = {}
+        for key in WALK_COUNTERS:
+            counts[key] = 0
+        visited = set()
+        if self.follow_symlinks:
+            try:
+                stat = os.stat(root)
+            except OSError:
+                return
+            visited.add((stat.st_dev, stat.st_ino))
+        
+        rules = self.rules if len(self.rules) else None
+        pending: List[Tuple[str, str]] = [(str(root), '')]
+        while pending:
+            directory, prefix = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            counts['directories'] += 1
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    relative = prefix + name
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=self.follow_symlinks)
+                    except OSError:
+                        continue
+                    
+                    if is_dir:
+                        if not recursive:
+                            continue
+                        if (not self.include_hidden and name.startswith('.')) or \
+                                (rules is not None and rules.ignored(relative, True)):
+                            counts['pruned_directories'] += 1
+                            continue
+                        if self.follow_symlinks:
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            identity = (stat.st_dev, stat.st_ino)
+                            if identity in visited:
+                                counts['symlink_revisits'] += 1
+                                continue
+                            visited.add(identity)
+                        pending.append((entry.path, relative + '/'))
+                        continue
+                    
+                    if accept is not None and not accept(name):
+                        continue
+                    if rules is not None and rules.ignored(relative, False):
+                        counts['ignored_files'] += 1
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    counts['files'] += 1
+                    yield relative, entry
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'ignore_patterns': len(self.rules),
+            'include_hidden': self.include_hidden,
+            'follow_symlinks': self.follow_symlinks
+        }
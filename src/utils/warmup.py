@@ -0,0 +1,182 @@
+"""
+Background warm-up after the server starts.
+Steps (build indexes, read recent files into the page cache, load the local model)
+run one after another on a dedicated low-priority thread. Tool calls mark
+themselves with foreground(); while any is running, warm-up steps pause at their
+next yield_to_foreground() call, so warm-up I/O never competes with a request.
+Steps call it between files, not only before they start: index builds pass it
+as their pause callable and release the index lock while paused.
+"""
+import asyncio
+import contextlib
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .cancellation import OperationCancelled
+
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+# Added to the warm-up thread's nice value (Linux applies it per thread, and I/O schedulers follow it).
+WARMUP_NICENESS = 10
+
+
+def _lower_priority() -> None:
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WARMUP_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+class WarmupPipeline:
+    """
+    Named steps run once, in order, by start(). A step is a function taking no
+    arguments (run on the warm-up thread) or a coroutine function (run on the
+    event loop). A failed step is recorded and the next one runs anyway.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._steps: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._stopping = False
+        
+        self._active = 0
+        self._paused_seconds = 0.0
+        self._idle = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def add(self, name: str, step: Callable[[], Any]) -> None:
+        self._steps.append({'name': name, 'step': step, 'state': 'pending', 'seconds': None,
+                            'result': None, 'error': None})
+    
+    def start(self) -> bool:
+        """Schedule the steps on the running event loop. Only the first call does anything."""
+        if not self.enabled or self._task is not None:
+            return False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup",
+                                            initializer=_lower_priority)
+        self._started_at = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return True
+    
+    async def stop(self) -> None:
+        """Stop at the next yield point and wait for the current step to return."""
+        self._stopping = True
+        with self._idle:
+            self._idle.notify_all()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+    
+    async def wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+    
+    @contextlib.contextmanager
+    def foreground(self):
+        """Mark a request as running; warm-up pauses until none are."""
+        with self._idle:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._active -= 1
+                if not self._active:
+                    self._idle.notify_all()
+    
+    def yield_to_foreground(self) -> None:
+        """Block while requests are running. Raises OperationCancelled once stop() was called."""
+        with self._idle:
+            if self._active and not self._stopping:
+                started = time.monotonic()
+                while self._active and not self._stopping:
+                    self._idle.wait(0.5)
+                self._paused_seconds += time.monotonic() - started
+        if self._stopping:
+            raise OperationCancelled("Warm-up stopped")
+    
+    def status(self) -> Dict[str, Any]:
+        if not self.enabled:
+            state = 'disabled'
+        elif self._task is None:
+            state = 'pending'
+        elif self._finished_at is None:
+            state = 'running'
+        else:
+            state = 'stopped' if self._stopping else 'ready'
+        end = self._finished_at or time.monotonic()
+        return {
+            'state': state,
+            'seconds': round(end - self._started_at, 3) if self._started_at is not None else None,
+            'paused_for_requests_seconds': round(self._paused_seconds, 3),
+            'steps': [{key: value for key, value in step.items() if key != 'step'} for step in self._steps]
+        }
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            for step in self._steps:
+                if self._stopping:
+                    break
+                step['state'] = 'running'
+                started = time.monotonic()
+                try:
+                    if inspect.iscoroutinefunction(step['step']):
+                        await loop.run_in_executor(self._executor, self.yield_to_foreground)
+                        result = await step['step']()
+                    else:
+                        result = await loop.run_in_executor(self._executor, self._call, step['step'])
+                    step['state'] = 'done'
+                    step['result'] = result
+                except OperationCancelled:
+                    step['state'] = 'stopped'
+                except Exception as e:
+                    logger.warning(f"Warm-up step {step['name']} failed: {e}")
+                    step['state'] = 'failed'
+                    step['error'] = str(e)
+                step['seconds'] = round(time.monotonic() - started, 3)
+        finally:
+            self._finished_at = time.monotonic()
+            logger.info(f"Warm-up finished in {self._finished_at - self._started_at:.2f}s")
+    
+    def _call(self, step: Callable[[], Any]) -> Any:
+        self.yield_to_foreground()
+        return step()
+
+
+def prefetch_files(paths: Iterable[Any], max_bytes: Optional[int] = None,
+                   pause: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+    """
+    Read files into the OS page cache, in the given order, until max_bytes have
+    been read. pause() is called before every chunk. Unreadable files are skipped.
+    """
+    buffer = bytearray(PREFETCH_CHUNK_SIZE)
+    files = 0
+    total = 0
+    for path in paths:
+        if max_bytes is not None and total >= max_bytes:
+            break
+        try:
+            with open(path, 'rb', buffering=0) as f:
+                while max_bytes is None or total < max_bytes:
+                    if pause is not None:
+                        pause()
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    total += read
+        except OSError:
+            continue
+        files += 1
+    return {'files': files, 'bytes': total}
@@ -2,8 +2,13 @@ import unittest
 from pathlib import Path
 import tempfile
 import shutil
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from src.tools.logseq_tools import LogseqTools
-from src.utils.file_utils import read_markdown_file
+from src.utils.outline_map import OutlineMap
+from src.utils.traversal import Traversal
+from src.utils.file_utils import read_markdown_file, read_versioned, write_if_unchanged, WriteConflictError
 
 
 class TestLogseqTools(unittest.TestCase):
@@ -49,6 +54,333 @@ class TestLogseqTools(unittest.TestCase):
         self.assertNotIn(":", safe_name)
         self.assertNotIn("/", safe_name)
         self.assertNotIn("?", safe_name)
+    
+    
+    def test_query_tasks_tags_and_properties(self):
+        self.logseq.create_page("Alpha", "status:: active\n\n- TODO ship #project\n- DONE plan #project\n- TODO unrelated")
+        self.logseq.create_page("Beta", "status:: paused\n\n- TODO ship #project")
+        
+        result = self.logseq.query("task:TODO tag:project prop:status=active")
+        self.assertEqual(result['total_blocks'], 1)
+        self.assertEqual(result['blocks'][0]['page'], "Alpha")
+        self.assertEqual(result['blocks'][0]['line'], 3)
+        
+        result = self.logseq.query("task:TODO,DONE #project -page:Beta")
+        self.assertEqual(result['total_blocks'], 2)
+    
+    def test_list_tasks(self):
+        self.logseq.create_page("Alpha", (
+            "- TODO [#B] ship release\n  SCHEDULED: <2024-03-04 Mon>\n"
+            "- DOING [#A] fix login\n  DEADLINE: <2024-03-01 Fri 10:00>\n"
+            "- DONE plan\n- TODO someday"
+        ))
+        self.logseq.create_journal_entry("- LATER call Ana\n  DEADLINE: <2024-02-20 Tue>", date="2024_02_15")
+        
+        result = self.logseq.list_tasks()
+        self.assertEqual(result['total_tasks'], 4)
+        self.assertEqual([task['title'] for task in result['tasks']],
+                         ["call Ana", "fix login", "ship release", "someday"])
+        login = result['tasks'][1]
+        self.assertEqual((login['marker'], login['priority'], login['deadline'], login['page'], login['line']),
+                         ("DOING", "A", "2024-03-01", "Alpha", 3))
+        self.assertEqual(result['by_marker'], {'LATER': 1, 'DOING': 1, 'TODO': 2})
+        
+        self.assertEqual(self.logseq.list_tasks(markers=["done"])['tasks'][0]['title'], "plan")
+        self.assertEqual(self.logseq.list_tasks(sort="priority")['tasks'][0]['title'], "fix login")
+        self.assertEqual(self.logseq.list_tasks(priorities=["B"])['total_tasks'], 1)
+        self.assertEqual(self.logseq.list_tasks(scheduled="2024-03-01..2024-03-31")['tasks'][0]['title'], "ship release")
+        self.assertEqual(self.logseq.list_tasks(journal_date="2024-02-01..2024-02-29")['tasks'][0]['title'], "call Ana")
+        overdue = self.logseq.list_tasks(overdue=True, today=date(2024, 3, 2))
+        self.assertEqual([task['title'] for task in overdue['tasks']], ["call Ana", "fix login"])
+        
+        # Edits are picked up incrementally with the page.
+        self.logseq.update_block("Alpha", "DONE [#A] fix login", match="DOING [#A] fix login")
+        self.assertEqual(self.logseq.list_tasks(page="alpha")['total_tasks'], 2)
+        with self.assertRaises(ValueError):
+            self.logseq.list_tasks(sort="size")
+    
+    def test_query_journal_dates(self):
+        self.logseq.create_journal_entry("- TODO call Ana", date="2024_01_15")
+        self.logseq.create_journal_entry("- TODO call Bob", date="2024_02_15")
+        
+        result = self.logseq.query("call date:2024-01-01..2024-01-31")
+        self.assertEqual(result['total_blocks'], 1)
+        self.assertIn("Ana", result['blocks'][0]['content'])
+        self.assertEqual(result['blocks'][0]['journal_date'], "2024-01-15")
+    
+    
+    def test_journal_range(self):
+        for day in ("2024_01_10", "2024_01_20", "2024_02_01"):
+            self.logseq.create_journal_entry(f"- entry {day}\n\t- detail", date=day)
+        
+        entries = list(self.logseq.iter_journal_range(start="2024-01-01", end="2024-01-31"))
+        self.assertEqual([e['date'] for e in entries], ["2024-01-10", "2024-01-20"])
+        self.assertEqual(entries[0]['block_count'], 2)
+        
+        self.logseq.create_journal_entry("- late entry", date="2024_01_15")
+        entries = list(self.logseq.iter_journal_range(date_range="2024-01-12..", newest_first=True))
+        self.assertEqual([e['date'] for e in entries], ["2024-02-01", "2024-01-20", "2024-01-15"])
+        
+        # A journal larger than a page is read in parts cut at top-level blocks.
+        self.logseq.create_journal_entry("\n".join(f"- block {i} " + "x" * 40 for i in range(10)), date="2024_03_01")
+        parts = list(self.logseq.iter_journal_range(date_range="2024-03-01..2024-03-01", max_bytes=120))
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(part['content'].startswith("- block") for part in parts))
+        self.assertEqual(parts[0]['block_count'], 10)
+        self.assertEqual("".join(part['content'] for part in parts),
+                         read_markdown_file(self.test_dir / "journals" / "2024_03_01.md"))
+        
+        page = self.logseq.journal_page(120, date(2024, 1, 1), date(2024, 3, 31))
+        pages = [page['items']]
+        while page['next']:
+            page = self.logseq.journal_page(120, date(2024, 1, 1), date(2024, 3, 31), resume=page['next'])
+            pages.append(page['items'])
+        self.assertEqual(page['days'], 5)
+        self.assertEqual(sum(len(items) for items in pages), len(parts) + 4)
+    
+    def test_concurrent_appends_are_not_lost(self):
+        self.logseq.create_page("Shared", "- start")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: self.logseq.update_page("Shared", f"- entry {i}"), range(40)))
+            list(pool.map(lambda i: self.logseq.create_journal_entry(f"- log {i}", date="2024_01_01"), range(40)))
+        
+        page = read_markdown_file(self.test_dir / "pages" / "Shared.md")
+        journal = read_markdown_file(self.test_dir / "journals" / "2024_01_01.md")
+        for i in range(40):
+            self.assertIn(f"- entry {i}\n", page + "\n")
+            self.assertIn(f"- log {i}\n", journal + "\n")
+        self.assertEqual([p.name for p in (self.test_dir / "pages").iterdir()], ["Shared.md"])
+    
+    def test_written_pages_follow_umask_and_keep_mode(self):
+        previous = os.umask(0o027)
+        try:
+            result = self.logseq.create_page("Private", "- start")
+        finally:
+            os.umask(previous)
+        page_path = Path(result['path'])
+        self.assertEqual(page_path.stat().st_mode & 0o777, 0o640)
+        
+        page_path.chmod(0o600)
+        self.logseq.update_page("Private", "- more")
+        self.assertEqual(page_path.stat().st_mode & 0o777, 0o600)
+        self.assertEqual([path.name for path in page_path.parent.iterdir()], ["Private.md"])
+    
+    def test_external_write_is_merged(self):
+        page_path = self.test_dir / "pages" / "Shared.md"
+        self.logseq.create_page("Shared", "- start")
+        
+        # Logseq saves the page while we are between reading and writing it.
+        original = self.logseq._format_content_as_outline
+        def format_and_race(content):
+            if "external" not in read_markdown_file(page_path):
+                page_path.write_text(read_markdown_file(page_path) + "\n- external", encoding='utf-8')
+            return original(content)
+        self.logseq._format_content_as_outline = format_and_race
+        
+        self.logseq.create_page_with_context("Shared", "ours")
+        content = read_markdown_file(page_path)
+        self.assertIn("- external", content)
+        self.assertIn("- ours", content)
+        
+        _, version = read_versioned(page_path)
+        os.utime(page_path, ns=(1, 1))
+        write_if_unchanged(page_path, "touched only", version)
+        with self.assertRaises(WriteConflictError):
+            write_if_unchanged(page_path, "stale", version)
+    
+    def test_template_scan_follows_ignore_rules(self):
+        templates = self.test_dir / "templates"
+        templates.mkdir()
+        (templates / "meeting.md").write_text("type:: meeting", encoding='utf-8')
+        (templates / "draft.md").write_text("type:: draft", encoding='utf-8')
+        (templates / "notes.txt").write_text("not a page", encoding='utf-8')
+        
+        logseq = LogseqTools(self.test_dir, traversal=Traversal(ignore=["draft.md"]))
+        self.assertEqual(logseq.list_available_templates(), ["meeting"])
+    
+    def test_bulk_upsert_pages(self):
+        (self.test_dir / "templates").mkdir()
+        (self.test_dir / "templates" / "meeting.md").write_text("type:: meeting\n\n## Notes", encoding='utf-8')
+        self.logseq.create_page("Existing", "- old")
+        self.logseq.index.refresh()
+        
+        result = self.logseq.bulk_upsert_pages([
+            {'title': "Existing", 'content': "new line"},
+            {'title': f"Meeting 1", 'content': "agenda", 'template_name': "meeting"},
+            {'title': "Twice", 'content': "first"},
+            {'title': "Twice", 'content': "second"},
+            {'date': "2024_03_01", 'content': "- journal"},
+            {'title': "Plain", 'content': "text", 'template_name': "nope"}
+        ])
+        
+        self.assertEqual((result['total'], result['created'], result['updated']), (6, 4, 2))
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(result['missing_templates'], ["nope"])
+        self.assertEqual([page['index'] for page in result['pages']], list(range(6)))
+        
+        self.assertIn("- old", read_markdown_file(self.test_dir / "pages" / "Existing.md"))
+        self.assertIn("type:: meeting", read_markdown_file(self.test_dir / "pages" / "Meeting 1.md"))
+        twice = read_markdown_file(self.test_dir / "pages" / "Twice.md")
+        self.assertLess(twice.index("first"), twice.index("second"))
+        self.assertEqual(self.logseq.query("agenda")['total_pages'], 1)
+        self.assertEqual(len(self.logseq.journals.span(None, None)), 1)
+    
+    def test_find_pages_and_fuzzy_resolution(self):
+        self.logseq.create_page("Project Phoenix", "alias:: phx, Firebird\n- status")
+        # Logseq stores namespaced pages with '___' in the file name.
+        (self.test_dir / "pages" / "work___Roadmap 2024.md").write_text("- items", encoding='utf-8')
+        self.logseq.create_page("Photography", "- cameras")
+        
+        self.assertEqual(self.logseq.find_pages("project phoenix", mode='exact')[0]['title'], "Project Phoenix")
+        self.assertEqual(self.logseq.find_pages("firebird", mode='exact')[0]['kind'], "alias")
+        self.assertCountEqual(
+            [page['title'] for page in self.logseq.find_pages("ph", mode='prefix')],
+            ["Project Phoenix", "Photography"]
+        )
+        self.assertEqual(self.logseq.find_pages("roadmap", mode='prefix')[0]['kind'], "namespace")
+        self.assertEqual(self.logseq.find_pages("projct phonix")[0]['title'], "Project Phoenix")
+        
+        self.assertIsNone(self.logseq.get_page_context("Projct Phonix"))
+        context = self.logseq.get_page_context("Projct Phonix", fuzzy=True)
+        self.assertEqual(context['title'], "Project Phoenix")
+        self.assertEqual(context['resolved_from'], "Projct Phonix")
+        self.assertEqual(self.logseq.get_page_context("PHX")['title'], "Project Phoenix")
+        self.assertIsNone(self.logseq.get_page_context("zzzz", fuzzy=True))
+        
+        self.logseq.index.refresh()
+        (self.test_dir / "pages" / "Photography.md").unlink()
+        self.logseq.index.refresh()
+        self.assertEqual(self.logseq.find_pages("photography"), [])
+    
+    def test_graph_snapshot_restart(self):
+        cache_dir = self.test_dir / "cache"
+        first = LogseqTools(self.test_dir, cache_dir=cache_dir)
+        first.create_page("Alpha", "- links to [[Beta]] #project")
+        first.create_page("Meeting", "template:: meeting\n- Agenda")
+        first.create_page("Gamma", "- plain page")
+        self.assertEqual(first.index.refresh()['parsed'], 3)
+        
+        second = LogseqTools(self.test_dir, cache_dir=cache_dir)
+        self.assertEqual(second.index.refresh(), {'parsed': 0, 'removed': 0, 'unchanged': 3})
+        self.assertTrue(second.index.stats()['from_snapshot'])
+        self.assertEqual(second.index.backlinks("beta"), {"pages/Alpha.md"})
+        self.assertEqual(second.list_available_templates(), ["Meeting"])
+        self.assertEqual(second.query("#project")['total_pages'], 1)
+        
+        # A touched but unchanged file is not re-parsed; an edited one is.
+        gamma = self.test_dir / "pages" / "Gamma.md"
+        os.utime(gamma, (1, 1))
+        (self.test_dir / "pages" / "Alpha.md").write_text("- now links to [[Delta]]", encoding='utf-8')
+        self.assertEqual(second.index.refresh()['parsed'], 1)
+        self.assertEqual(second.index.backlinks("beta"), set())
+        
+        third = LogseqTools(self.test_dir, cache_dir=cache_dir)
+        self.assertEqual(third.index.refresh()['parsed'], 0)
+        self.assertEqual(third.index.backlinks("delta"), {"pages/Alpha.md"})
+        
+        # A corrupt snapshot is ignored and the graph is parsed from scratch.
+        snapshot = third.index.snapshot_path
+        snapshot.write_bytes(snapshot.read_bytes()[:40])
+        fourth = LogseqTools(self.test_dir, cache_dir=cache_dir)
+        self.assertEqual(fourth.index.refresh()['parsed'], 3)
+        self.assertFalse(fourth.index.stats()['from_snapshot'])
+    
+    def test_block_patches(self):
+        page = self.test_dir / "pages" / "Project.md"
+        page.write_text(
+            "status:: draft\n"
+            "\n"
+            "- ## Notes\n"
+            "\t- first note\n"
+            "\t  id:: 6571a3f0-0000-4000-8000-000000000001\n"
+            "\t\t- detail\n"
+            "- ## Tasks\n"
+            "\t- TODO write report\n",
+            encoding='utf-8'
+        )
+        
+        result = self.logseq.update_block("Project", "first note, revised", match="first note")
+        self.assertEqual(result['line'], 4)
+        self.logseq.insert_under_section("Project", "Notes", "second note\n  with a child")
+        self.logseq.insert_under_section("Project", "Tasks", "TODO review", position="start")
+        self.logseq.replace_property("Project", "status", "active")
+        self.logseq.replace_property(
+            "Project", "priority", "high", block_id="6571a3f0-0000-4000-8000-000000000001"
+        )
+        result = self.logseq.insert_under_section("Project", "Links", "[[Other]]")
+        self.assertTrue(result['created_section'])
+        
+        self.assertEqual(read_markdown_file(page), (
+            "status:: active\n"
+            "\n"
+            "- ## Notes\n"
+            "\t- first note, revised\n"
+            "\t  id:: 6571a3f0-0000-4000-8000-000000000001\n"
+            "\t  priority:: high\n"
+            "\t\t- detail\n"
+            "\t- second note\n"
+            "\t\t- with a child\n"
+            "- ## Tasks\n"
+            "\t- TODO review\n"
+            "\t- TODO write report\n"
+            "- Links\n"
+            "\t- [[Other]]\n"
+        ))
+        # Each patch after the first reused the outline map left by the previous one.
+        self.assertEqual(self.logseq.outlines.misses, 1)
+        cached = self.logseq.outlines.get(str(page), read_markdown_file(page))
+        fresh = OutlineMap(read_markdown_file(page))
+        self.assertEqual((cached.starts, cached.ends, cached.lines, cached.ranks, cached.texts, cached.ids),
+                         (fresh.starts, fresh.ends, fresh.lines, fresh.ranks, fresh.texts, fresh.ids))
+        self.assertEqual(self.logseq.query("task:TODO")['total_blocks'], 2)
+        
+        # Patches that change nothing do not write the file.
+        mtime = page.stat().st_mtime_ns
+        result = self.logseq.replace_property("Project", "status", "active")
+        self.assertFalse(result['changed'])
+        self.assertEqual(page.stat().st_mtime_ns, mtime)
+        
+        self.logseq.replace_property("Project", "status", None)
+        self.assertTrue(read_markdown_file(page).startswith("- ## Notes"))
+        with self.assertRaises(ValueError):
+            self.logseq.update_block("Project", "x", match="missing block")
+    
+    def test_outline_splice_keeps_duplicate_ids(self):
+        content = "- a\n  id:: x1\n- b\n- c\n  id:: x1"
+        outline = OutlineMap(content)
+        self.assertEqual(outline.ids, {'x1': [0, 2]})
+        with self.assertRaises(ValueError):
+            outline.select(block_id='x1')
+        
+        start = content.index("  id:: x1", 10) - 1
+        new_content, spliced = outline.splice(content, start, len(content), "")
+        self.assertEqual(spliced.ids, OutlineMap(new_content).ids)
+        self.assertEqual(spliced.select(block_id='x1'), 0)
+        
+        # A first space-indented child switches the page to spaces.
+        content = "- a\n- b"
+        outline = OutlineMap(content)
+        self.assertEqual(outline.indent_unit, '\t')
+        new_content, spliced = outline.splice(content, len(content), len(content), "\n  - child")
+        self.assertEqual(spliced.indent_unit, OutlineMap(new_content).indent_unit)
+        self.assertEqual(spliced.indent_unit, '  ')
+    
+    def test_page_context_outline(self):
+        content = "title:: Plan\n\n- ## Goals\n\t- ship\n\t\t- soon\n- ## Risks\n  - scope\n"
+        (self.test_dir / "pages" / "Plan.md").write_text(content, encoding='utf-8')
+        
+        outline = self.logseq.get_page_context("Plan")['analysis']['outline']
+        self.assertEqual(len(outline), 6)
+        self.assertEqual(outline[2], {'level': 1, 'content': 'ship', 'raw': '\t- ship'})
+        self.assertEqual([item['level'] for item in outline], [0, 1, 1, 2, 1, 1])
+        self.assertEqual(outline.to_list()[-1], {'line': 7, 'level': 1, 'content': 'scope'})
+        
+        summary = self.logseq.get_page_context("Plan", outline='summary', top=1)['analysis']['outline']
+        self.assertEqual(summary['blocks'], 6)
+        self.assertEqual(summary['by_level'], {'0': 1, '1': 4, '2': 1})
+        self.assertEqual(summary['headings'], [{'line': 3, 'depth': 2, 'title': 'Goals'}])
+        self.assertEqual([block['line'] for block in summary['top_blocks']], [1])
+        self.assertNotIn('outline', self.logseq.get_page_context("Plan", outline='none')['analysis'])
 
 
 if __name__ == '__main__':
@@ -2,8 +2,18 @@ import unittest
 from pathlib import Path
 import tempfile
 import shutil
+import gzip
+import os
+import re
+import threading
+import tracemalloc
 from src.tools.notes_tools import NotesTools
 from src.utils.file_utils import write_markdown_file
+from src.utils.readers import get_reader
+from src.utils.stream_scan import scan_file
+from src.utils.query_planner import plan_query, file_may_match
+from src.utils.cancellation import OperationCancelled
+from src.utils.traversal import Traversal
 
 
 class TestNotesTools(unittest.TestCase):
@@ -32,6 +42,200 @@ class TestNotesTools(unittest.TestCase):
         results = self.notes.list_recent_notes(limit=5)
         self.assertLessEqual(len(results), 5)
         self.assertTrue(all('relative_path' in r for r in results))
+    
+    
+    def test_search_other_file_types(self):
+        write_markdown_file(self.test_dir / "plain.txt", "El salto en texto plano")
+        write_markdown_file(self.test_dir / "agenda.org", "* El salto en org")
+        with gzip.open(self.test_dir / "archive.md.gz", 'wt', encoding='utf-8') as f:
+            f.write("# Archivo\n\nEl salto comprimido")
+        self.notes.refresh_index()
+        
+        results = self.notes.search_notes("El salto")
+        paths = {r['relative_path'] for r in results}
+        self.assertIn("plain.txt", paths)
+        self.assertIn("agenda.org", paths)
+        self.assertIn("archive.md.gz", paths)
+        self.assertEqual(self.notes.get_note_content("archive.md.gz")['content'], "# Archivo\n\nEl salto comprimido")
+    
+    def test_search_reports_undecodable_files(self):
+        (self.test_dir / "broken.md").write_bytes(b"El salto \xff\xfe roto")
+        self.notes.refresh_index()
+        
+        errors = []
+        results = self.notes.search_notes("El salto", errors=errors)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0]['path'].endswith("broken.md"))
+    
+    
+    def test_retrieve_blocks(self):
+        write_markdown_file(self.test_dir / "meeting.md", "# Reunión\n\n- Presupuesto aprobado para Q3\n- Contratar dos personas\n\nOtro tema sin relación.")
+        self.notes.refresh_index()
+        
+        blocks = self.notes.retrieve_blocks("presupuesto Q3", top_k=2)
+        self.assertEqual(blocks[0]['path'], "meeting.md")
+        self.assertEqual(blocks[0]['line'], 3)
+        self.assertIn("Presupuesto", blocks[0]['text'])
+        
+        blocks = self.notes.retrieve_blocks("salto", paths=["subfolder/note3.md"])
+        self.assertEqual({b['path'] for b in blocks}, {"subfolder/note3.md"})
+        
+        blocks = self.notes.retrieve_blocks("libro", search="El salto")
+        self.assertEqual([b['path'] for b in blocks], ["note1.md"])
+    
+    def test_stream_scan_long_lines(self):
+        path = self.test_dir / "long.md"
+        # One 3 MB line with a match straddling every segment boundary.
+        path.write_text(("x" * 1020 + "needle") * 3000 + "\nneedle at the end\n", encoding='utf-8')
+        
+        tracemalloc.start()
+        scan = scan_file(get_reader(path), path, re.compile("needle"), chunk_size=4096, max_segment=1024)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        self.assertEqual(scan['matches_count'], 3001)
+        self.assertEqual([line['line_number'] for line in scan['matching_lines']], [1, 2])
+        self.assertLessEqual(len(scan['matching_lines'][0]['content']), 500)
+        self.assertLess(peak, 1 << 20)
+    
+    def test_search_context_and_spans(self):
+        lines = ["intro", "  - alpha beta alpha", "uno", "dos", "alpha again", "tres", "cuatro", "cinco", "seis", "alpha end"]
+        write_markdown_file(self.test_dir / "context.md", "\n".join(lines))
+        self.notes.refresh_index()
+        
+        result = self.notes.search_notes("alpha", context_before=1, context_after=2)[0]
+        self.assertEqual(result['matches_count'], 4)
+        first = result['matching_lines'][0]
+        self.assertEqual(first['content'], "- alpha beta alpha")
+        self.assertEqual(first['spans'], [[2, 7], [13, 18]])
+        # Windows around lines 2 and 5 overlap and are merged; line 10 gets its own.
+        self.assertEqual(result['context'], [
+            {'start_line': 1, 'end_line': 7, 'lines': ["intro", "- alpha beta alpha", "uno", "dos", "alpha again", "tres", "cuatro"]},
+            {'start_line': 9, 'end_line': 10, 'lines': ["seis", "alpha end"]}
+        ])
+        
+        self.assertNotIn('context', self.notes.search_notes("alpha")[0])
+    
+    def test_search_case_sensitivity(self):
+        write_markdown_file(self.test_dir / "case.md", "Python python PYTHON")
+        self.notes.refresh_index()
+        
+        by_path = lambda results: {r['relative_path']: r['matches_count'] for r in results}
+        self.assertEqual(by_path(self.notes.search_notes("python"))["case.md"], 3)
+        self.assertEqual(by_path(self.notes.search_notes("python", case_sensitive=True)), {"case.md": 1})
+        self.assertEqual(by_path(self.notes.search_notes("(?i)python", case_sensitive=True))["case.md"], 3)
+    
+    def test_query_plan_literals(self):
+        self.assertEqual(plan_query("El salto", True).literals, (b"El salto",))
+        self.assertEqual(plan_query(r"\bfoo(bar)+baz?", True).literals, (b"foo", b"bar", b"ba"))
+        self.assertEqual(plan_query("foo|bar", True).literals, ())
+        self.assertEqual(plan_query("Programación", False).literals, (b"programac",))
+        # Letters that case-fold to non-ASCII characters are never searched as bytes.
+        self.assertEqual(plan_query("kelvin", False).literals, (b"elv",))
+        self.assertIs(plan_query("x+y", False), plan_query("x+y", False))
+        
+        path = self.test_dir / "fold.md"
+        path.write_text("Temperature: 300 \u212aelvin", encoding='utf-8')
+        reader = get_reader(path)
+        self.assertTrue(file_may_match(plan_query("kelvin", False), reader, path))
+        self.assertFalse(file_may_match(plan_query("celsius", False), reader, path))
+        
+        gz_path = self.test_dir / "fold.md.gz"
+        with gzip.open(gz_path, 'wt', encoding='utf-8') as f:
+            f.write("Celsius")
+        self.assertTrue(file_may_match(plan_query("celsius", False), get_reader(gz_path), gz_path))
+        self.assertFalse(file_may_match(plan_query("Kelvin", True), get_reader(gz_path), gz_path))
+        self.assertEqual(self.notes.search_notes("kelvin")[0]['relative_path'], "fold.md")
+    
+    def test_search_cancellation(self):
+        cancel = threading.Event()
+        self.assertTrue(self.notes.search_notes("python", cancel=cancel))
+        
+        cancel.set()
+        with self.assertRaises(OperationCancelled):
+            self.notes.search_notes("python", cancel=cancel)
+        with self.assertRaises(OperationCancelled):
+            self.notes.retrieve_blocks("python", cancel=cancel)
+    
+    def test_find_duplicates(self):
+        article = " ".join(f"word{i} appears in the clipped article number {i % 7}" for i in range(60))
+        write_markdown_file(self.test_dir / "clip1.md", f"# Clipped\n\n{article}")
+        write_markdown_file(self.test_dir / "clip2.md", f"# Clipped again\n\n{article} with a short trailing remark")
+        paragraph = "this paragraph was appended twice by an import and should be reported as a repeated block"
+        write_markdown_file(self.test_dir / "appended.md", f"{paragraph}\n\n---\n\n{paragraph}")
+        self.notes.refresh_index()
+        
+        clusters = self.notes.find_duplicates(threshold=0.8)
+        self.assertEqual([cluster['members'] for cluster in clusters], [["clip1.md", "clip2.md"]])
+        self.assertEqual(
+            [entry['relative_path'] for entry in self.notes.find_duplicates(path="clip1.md")], ["clip2.md"]
+        )
+        
+        blocks = self.notes.find_duplicates(level="block", threshold=0.9)
+        members = [member for cluster in blocks for member in cluster['members']]
+        self.assertIn({'relative_path': "appended.md", 'line': 1, 'end_line': 1}, members)
+        self.assertIn({'relative_path': "appended.md", 'line': 5, 'end_line': 5}, members)
+        
+        results = self.notes.search_notes("clipped", collapse_duplicates=True)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(results[0]['duplicates']), 1)
+        self.assertEqual(len(self.notes.search_notes("clipped")), 2)
+        
+        # Only changed files are signed again.
+        write_markdown_file(self.test_dir / "clip2.md", "completely different content now")
+        self.notes.refresh_index()
+        self.assertEqual(self.notes.find_duplicates(threshold=0.8), [])
+        self.assertEqual(
+            self.notes.duplicates.update(self.notes.index.entries(), self.notes._read_blocks)['signed'], 0
+        )
+    
+    def test_search_skips_oversized_files(self):
+        notes = NotesTools(self.test_dir, max_file_size=60)
+        write_markdown_file(self.test_dir / "big.md", "El salto " * 10)
+        
+        errors = []
+        results = notes.search_notes("El salto", errors=errors)
+        self.assertEqual(len(results), 2)
+        self.assertEqual([e['path'].endswith("big.md") for e in errors], [True])
+    
+    def test_traversal_ignore_rules(self):
+        for relative in (".git/objects/pack.md", "logseq/bak/pages/old.md", "node_modules/pkg/README.md",
+                         ".hidden/secret.md", "drafts/wip.md", "drafts/keep.md", "scratch.tmp.md"):
+            write_markdown_file(self.test_dir / relative, "El salto")
+        
+        notes = NotesTools(self.test_dir, traversal=Traversal(ignore=["/drafts/*", "!keep.md", "*.tmp.md"]))
+        paths = sorted(entry['relative_path'] for entry in notes.index.entries())
+        self.assertEqual(paths, sorted(["note1.md", "note2.md", os.path.join("subfolder", "note3.md"),
+                                        os.path.join("drafts", "keep.md")]))
+        walk = notes.index.stats()['last_walk']
+        self.assertEqual((walk['pruned_directories'], walk['ignored_files']), (4, 2))
+        
+        # Symlinked folders are skipped unless followed, and a link back up is visited once.
+        os.symlink(self.test_dir, self.test_dir / "subfolder" / "loop")
+        self.assertEqual(len(NotesTools(self.test_dir).index.entries()), 6)
+        following = Traversal(follow_symlinks=True)
+        counts = {}
+        self.assertEqual(len(list(following.walk(self.test_dir, counts=counts))), 6)
+        self.assertEqual(counts['symlink_revisits'], 1)
+    
+    @unittest.skipUnless(os.environ.get('NOTES_MCP_LARGE_TESTS'), "set NOTES_MCP_LARGE_TESTS=1 to run")
+    def test_search_large_file_memory(self):
+        path = self.test_dir / "huge.md"
+        line = "- " + "lorem ipsum " * 40 + "\n"
+        with open(path, 'w', encoding='utf-8') as f:
+            for _ in range((500 << 20) // len(line)):
+                f.write(line)
+            f.write("- El salto final\n")
+        self.notes.refresh_index()
+        
+        tracemalloc.start()
+        results = self.notes.search_notes("El salto final")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        self.assertEqual(results[0]['relative_path'], "huge.md")
+        self.assertLess(peak, 16 << 20)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,59 @@
+import unittest
+from src.models.prompt import compact_content, estimate_tokens, prepare_content
+
+
+PAGE = """title:: Weekly Review
+collapsed:: true
+
+- Goals    for   the week
+  id:: 6500f1e2-1234-4abc-9def-0123456789ab
+	- Ship the ((6500f1e2-1234-4abc-9def-0123456789ab)) release
+	  collapsed:: true
+
+
+
+- Budget discussion with finance
+- Hiring plan for the platform team
+"""
+
+
+class TestPromptPreparation(unittest.TestCase):
+    def test_compact_strips_logseq_noise(self):
+        compacted = compact_content(PAGE)
+        self.assertNotIn("collapsed::", compacted)
+        self.assertNotIn("id::", compacted)
+        self.assertNotIn("6500f1e2", compacted)
+        self.assertNotIn("\n\n\n", compacted)
+        self.assertIn("title:: Weekly Review", compacted)
+        self.assertIn("- Goals for the week", compacted)
+        self.assertLess(estimate_tokens(compacted), estimate_tokens(PAGE))
+    
+    def test_compact_keeps_code_and_plain_lines(self):
+        note = (
+            "Notes  with  padding\n\n"
+            "```python\ndef f(x):\n    if x:\n        return  1\n\n\n    return 2\n```\n\n"
+            "| a    | b   |\n|------|-----|\n\n"
+            "- bullet    text\n\t- ```js\n\t  const  x = 1;\n\t      y();\n\t  ```\n\t- after   it"
+        )
+        compacted = compact_content(note)
+        self.assertIn("Notes  with  padding", compacted)
+        self.assertIn("def f(x):\n    if x:\n        return  1\n\n\n    return 2\n```", compacted)
+        self.assertIn("| a    | b   |", compacted)
+        self.assertIn("\t  const  x = 1;\n\t      y();", compacted)
+        self.assertIn("- bullet text", compacted)
+        self.assertIn(" - after it", compacted)
+    
+    def test_budget_keeps_blocks_relevant_to_query(self):
+        prepared = prepare_content(PAGE, max_tokens=10, query="hiring plan")
+        self.assertIn("Hiring plan", prepared)
+        self.assertNotIn("Budget", prepared)
+        self.assertLessEqual(estimate_tokens(prepared.replace("...", "")), 10)
+    
+    def test_budget_without_query_keeps_top(self):
+        prepared = prepare_content(PAGE, max_tokens=12)
+        self.assertTrue(prepared.startswith("title:: Weekly Review"))
+        self.assertTrue(prepared.endswith("..."))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import asyncio
+import unittest
+from aiohttp import web
+from src.models.ollama_client import OllamaClient
+from src.models.remote_client import RemoteClient
+from src.models.scheduler import ModelScheduler, SchedulerBackpressureError
+
+
+class FakeBackend:
+    """Local HTTP server answering like Ollama (/api/generate) and an OpenAI-style API."""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+        self.payloads = []
+        self.runner = None
+        self.url = None
+    
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/api/generate', self.generate)
+        app.router.add_post('/chat/completions', self.chat_completions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+    
+    async def stop(self):
+        await self.runner.cleanup()
+    
+    async def _answer(self, prompt):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.prompts.append(prompt)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+    
+    async def generate(self, request):
+        payload = await request.json()
+        self.payloads.append(payload)
+        await self._answer(payload['prompt'])
+        return web.json_response({'response': 'local answer', 'context': [len(self.prompts)]})
+    
+    async def chat_completions(self, request):
+        payload = await request.json()
+        await self._answer(payload['messages'][-1]['content'])
+        return web.json_response({'choices': [{'message': {'content': 'remote answer'}}]})
+
+
+class TestModelScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.local_backend = FakeBackend(delay=0.2)
+        self.remote_backend = FakeBackend()
+        await self.local_backend.start()
+        await self.remote_backend.start()
+        
+        self.local = OllamaClient(base_url=self.local_backend.url)
+        self.remote = RemoteClient(api_key="test")
+        self.remote.base_url = self.remote_backend.url
+    
+    async def asyncTearDown(self):
+        await self.local_backend.stop()
+        await self.remote_backend.stop()
+    
+    async def test_concurrency_limit(self):
+        scheduler = ModelScheduler({'local': self.local}, limits={'local': {'max_concurrency': 1}})
+        
+        results = await asyncio.gather(*[scheduler.summarize('local', f"doc {i}") for i in range(3)])
+        self.assertEqual(results, ['local answer'] * 3)
+        self.assertEqual(self.local_backend.max_in_flight, 1)
+        self.assertEqual(scheduler.metrics()['providers']['local']['completed'], 3)
+    
+    async def test_interactive_before_batch(self):
+        scheduler = ModelScheduler({'local': self.local}, limits={'local': {'max_concurrency': 1}})
+        
+        first = asyncio.create_task(scheduler.summarize('local', "first"))
+        await asyncio.sleep(0.05)
+        batch = asyncio.create_task(scheduler.summarize('local', "batch job", priority='batch'))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(scheduler.summarize('local', "interactive job"))
+        await asyncio.sleep(0.01)
+        
+        queued = scheduler.metrics()['providers']['local']['queued_by_priority']
+        self.assertEqual(queued, {'interactive': 1, 'batch': 1})
+        
+        await asyncio.gather(first, batch, interactive)
+        order = [p for p in self.local_backend.prompts if 'job' in p]
+        self.assertIn("interactive job", order[0])
+        self.assertIn("batch job", order[1])
+    
+    async def test_backpressure(self):
+        scheduler = ModelScheduler(
+            {'local': self.local},
+            limits={'local': {'max_concurrency': 1, 'max_queue_depth': 1}}
+        )
+        
+        running = [asyncio.create_task(scheduler.summarize('local', f"doc {i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        
+        with self.assertRaises(SchedulerBackpressureError):
+            await scheduler.summarize('local', "one too many")
+        
+        await asyncio.gather(*running)
+        self.assertEqual(scheduler.metrics()['providers']['local']['rejected'], 1)
+    
+    async def test_fallback_to_remote_when_local_wait_too_long(self):
+        scheduler = ModelScheduler(
+            {'local': self.local, 'remote': self.remote},
+            limits={'local': {'max_concurrency': 1}},
+            fallback_after=0.05
+        )
+        
+        results = await asyncio.gather(
+            scheduler.summarize('local', "doc 1"),
+            scheduler.summarize('local', "doc 2")
+        )
+        self.assertEqual(sorted(results), ['local answer', 'remote answer'])
+        
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics['fallbacks'], 1)
+        self.assertEqual(metrics['providers']['local']['timed_out'], 1)
+        self.assertEqual(metrics['providers']['remote']['completed'], 1)
+    
+    
+    async def test_identical_requests_are_coalesced(self):
+        scheduler = ModelScheduler({'local': self.local}, limits={'local': {'max_concurrency': 1}})
+        
+        results = await asyncio.gather(
+            scheduler.summarize('local', "daily journal"),
+            scheduler.summarize('local', "daily  journal "),
+            scheduler.summarize('local', "other page")
+        )
+        self.assertEqual(results, ['local answer'] * 3)
+        # Two documents: each primed once, then asked once.
+        self.assertEqual(len(self.local_backend.prompts), 4)
+        self.assertEqual(scheduler.metrics()['coalescing']['coalesced'], 1)
+        
+        # A cancelled caller does not cancel the request for the others.
+        first = asyncio.create_task(scheduler.summarize('local', "shared"))
+        second = asyncio.create_task(scheduler.summarize('local', "shared"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        self.assertEqual(await second, 'local answer')
+        self.assertEqual(scheduler.metrics()['coalescing']['in_flight'], 0)
+    
+    async def test_context_reuse(self):
+        self.local.keep_alive = "10m"
+        await self.local.summarize("Meeting notes about the launch")
+        await self.local.extract_info("Meeting notes about the launch", "dates")
+        await self.local.summarize("Meeting notes about the launch")
+        
+        primer, summary, extract, repeat = self.local_backend.payloads
+        self.assertIn("Meeting notes", primer['prompt'])
+        self.assertEqual(primer['options'], {'num_predict': 0})
+        self.assertNotIn("Meeting notes", summary['prompt'] + extract['prompt'])
+        self.assertIn("dates", extract['prompt'])
+        # The cached context holds the document only, so a repeated call sends the same request.
+        self.assertEqual([payload.get('context') for payload in self.local_backend.payloads], [None, [1], [1], [1]])
+        self.assertEqual(repeat, summary)
+        self.assertEqual({payload['keep_alive'] for payload in self.local_backend.payloads}, {"10m"})
+        self.assertEqual(self.local.metrics()['context_hits'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
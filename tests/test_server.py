@@ -0,0 +1,253 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from pathlib import Path
+
+import httpx
+from mcp.client.session import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from src.server import NotesLogseqServer
+from src.utils.logseq_index import LogseqIndex
+from src.utils.profiling import Capture
+from src.utils.warmup import WarmupPipeline
+from tests.test_scheduler import FakeBackend
+
+
+class TestProfiling(unittest.TestCase):
+    def test_tracemalloc_capture_leaves_outside_tracing_on(self):
+        tracemalloc.start()
+        try:
+            capture = Capture("tool", "tracemalloc")
+            capture.activate()
+            self.assertIsNotNone(capture.deactivate())
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        
+        capture = Capture("tool", "tracemalloc")
+        capture.activate()
+        capture.deactivate()
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+class TestServerTransport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend = FakeBackend(delay=2.0)
+        await self.backend.start()
+        
+        self.test_dir = Path(tempfile.mkdtemp())
+        (self.test_dir / "notes").mkdir()
+        (self.test_dir / "logseq").mkdir()
+        (self.test_dir / "notes" / "note.md").write_text("# Python\nPython is great", encoding='utf-8')
+        
+        config = {
+            "notes_path": str(self.test_dir / "notes"),
+            "logseq_path": str(self.test_dir / "logseq"),
+            "index": {"cache_dir": str(self.test_dir / "cache")},
+            "server": {"json_response": True, "stateless": True},
+            "profiling": {"directory": str(self.test_dir / "profiles"), "keep": 2},
+            "models": {
+                "ollama": {"base_url": self.backend.url, "model": "test"},
+                "remote": {"api_key": "YOUR_API_KEY", "model": "test"}
+            }
+        }
+        config_path = self.test_dir / "config.json"
+        config_path.write_text(json.dumps(config), encoding='utf-8')
+        self.server = NotesLogseqServer(str(config_path))
+    
+    async def asyncTearDown(self):
+        await self.server.warmup.stop()
+        await self.backend.stop()
+        shutil.rmtree(self.test_dir)
+    
+    async def test_concurrent_requests_and_timeout(self):
+        async with create_connected_server_and_client_session(self.server.server) as client:
+            started = time.monotonic()
+            slow = asyncio.create_task(
+                client.call_tool("summarize_content", {"content": "long text", "timeout": 0.5})
+            )
+            await asyncio.sleep(0.1)
+            
+            # A slow model call does not hold up other requests on the same session.
+            search = await client.call_tool("search_notes", {"query": "python"})
+            self.assertIn("note.md", search.content[0].text)
+            self.assertLess(time.monotonic() - started, 0.5)
+            
+            result = await slow
+            self.assertIn("timed out after 0.5 seconds", result.content[0].text)
+            self.assertLess(time.monotonic() - started, 1.5)
+        
+        # The abandoned model call released its slot.
+        lane = self.server.scheduler.metrics()['providers']['local']
+        self.assertEqual(lane['in_flight'], 0)
+    
+    async def test_paginated_results(self):
+        for number in range(30):
+            (self.test_dir / "notes" / f"python-{number:02}.md").write_text(
+                f"Python note {number}\n" + "filler line\n" * 20, encoding='utf-8'
+            )
+        self.server.vaults.refresh()
+        
+        async with create_connected_server_and_client_session(self.server.server) as client:
+            arguments = {"query": "python", "max_results": 100, "page_bytes": 2000}
+            first = json.loads((await client.call_tool("search_notes", arguments)).content[0].text)
+            self.assertEqual(first['total'], 31)
+            self.assertLess(first['returned'], 31)
+            
+            paths = [item['relative_path'] for item in first['items']]
+            cursor = first['next_cursor']
+            while cursor:
+                page = json.loads((await client.call_tool("search_notes", {**arguments, "cursor": cursor})).content[0].text)
+                self.assertEqual(page['offset'], len(paths))
+                self.assertLessEqual(len(json.dumps(page['items'])), 2000)
+                paths.extend(item['relative_path'] for item in page['items'])
+                cursor = page['next_cursor']
+            self.assertEqual(len(set(paths)), 31)
+            
+            # A cursor only reads its own snapshot: the same page again, never another tool's.
+            repeat = json.loads((await client.call_tool(
+                "search_notes", {**arguments, "cursor": first['next_cursor']}
+            )).content[0].text)
+            self.assertEqual(repeat['offset'], first['returned'])
+            wrong_tool = await client.call_tool("list_recent_notes", {"cursor": first['next_cursor']})
+            self.assertIn("belongs to search_notes", wrong_tool.content[0].text)
+            
+            self.server.cursors.ttl = 0
+            stale = json.loads((await client.call_tool("search_notes", arguments)).content[0].text)
+            expired = await client.call_tool("search_notes", {**arguments, "cursor": stale['next_cursor']})
+            self.assertIn("expired", expired.content[0].text)
+            
+            recent = json.loads((await client.call_tool("list_recent_notes", {"limit": 5})).content[0].text)
+            self.assertEqual((recent['total'], recent['next_cursor']), (5, None))
+    
+    async def test_profiled_calls(self):
+        async with create_connected_server_and_client_session(self.server.server) as client:
+            result = await client.call_tool("search_notes", {"query": "python", "profile": "cprofile"})
+            self.assertIn("note.md", result.content[0].text)
+            profile = json.loads(result.content[1].text)['profile']
+            self.assertEqual(set(profile['sections']), {'notes_scan', 'worker'})
+            self.assertIsNotNone(profile['sections']['notes_scan']['cpu_seconds'])
+            self.assertTrue(profile['top_functions'])
+            self.assertTrue(Path(profile['file']).exists())
+            
+            # Time spent waiting on the model is reported apart from CPU work, even when the call times out.
+            result = await client.call_tool("summarize_content", {"content": "text", "timeout": 0.3, "profile": "timing"})
+            self.assertIn("timed out", result.content[0].text)
+            model_io = json.loads(result.content[1].text)['profile']['sections']['model_io']
+            self.assertGreaterEqual(model_io['wall_seconds'], 0.25)
+            self.assertIsNone(model_io['cpu_seconds'])
+            
+            state = json.loads((await client.call_tool(
+                "set_profiling", {"mode": "tracemalloc", "tools": ["list_recent_notes"]}
+            )).content[0].text)
+            self.assertEqual(state['mode'], "tracemalloc")
+            result = await client.call_tool("list_recent_notes", {})
+            self.assertIn("top_allocations", json.loads(result.content[1].text)['profile'])
+            self.assertEqual(len((await client.call_tool("search_notes", {"query": "python"})).content), 1)
+            
+            await client.call_tool("search_notes", {"query": "great", "profile": "cprofile"})
+            await client.call_tool("set_profiling", {"mode": "off"})
+            self.assertEqual(len((await client.call_tool("list_recent_notes", {})).content), 1)
+        
+        # Only the newest `keep` files are kept.
+        self.assertEqual(len(list((self.test_dir / "profiles").iterdir())), 2)
+    
+    async def test_warmup_after_handshake(self):
+        self.assertEqual(self.server.warmup.status()['state'], 'pending')
+        async with create_connected_server_and_client_session(self.server.server) as client:
+            # The initialized notification that starts warm-up is handled asynchronously.
+            while self.server.warmup.status()['state'] == 'pending':
+                await asyncio.sleep(0.01)
+            await self.server.warmup.wait()
+            status = json.loads((await client.call_tool("get_warmup_status", {})).content[0].text)
+        
+        self.assertEqual(status['state'], 'ready')
+        steps = {step['name']: step for step in status['steps']}
+        self.assertEqual(steps['default: notes index']['result'], {'files': 1})
+        self.assertEqual(steps['recent files']['result']['files'], 1)
+        self.assertTrue(all(step['state'] == 'done' for step in status['steps']))
+        self.assertTrue(self.server.vaults.default.logseq.index.stats()['built'])
+    
+    async def test_warmup_yields_to_requests(self):
+        pipeline = WarmupPipeline()
+        progress = []
+        pipeline.add("first", lambda: progress.append("first"))
+        pipeline.add("second", lambda: progress.append("second"))
+        
+        with pipeline.foreground():
+            pipeline.start()
+            await asyncio.sleep(0.2)
+            self.assertEqual(progress, [])
+            self.assertEqual(pipeline.status()['state'], 'running')
+        await pipeline.wait()
+        
+        self.assertEqual(progress, ["first", "second"])
+        self.assertGreater(pipeline.status()['paused_for_requests_seconds'], 0.1)
+        await pipeline.stop()
+    
+    async def test_warmup_index_build_yields_inside_step(self):
+        pages = self.test_dir / "logseq" / "pages"
+        pages.mkdir(exist_ok=True)
+        for i in range(100):
+            (pages / f"page {i}.md").write_text(f"- block {i}", encoding='utf-8')
+        index = LogseqIndex(self.test_dir / "logseq")
+        
+        pipeline = WarmupPipeline()
+        reached = threading.Event()
+        go = threading.Event()
+        
+        def pause():
+            if not reached.is_set():
+                reached.set()
+                go.wait(5)
+            pipeline.yield_to_foreground()
+        
+        pipeline.add("logseq index", lambda: index.refresh(pause=pause))
+        pipeline.start()
+        await asyncio.to_thread(reached.wait, 5)
+        with pipeline.foreground():
+            go.set()
+            # The build is paused mid-step with the lock released, so the request builds the index itself.
+            await asyncio.wait_for(asyncio.to_thread(index.ensure_fresh), 5)
+            self.assertEqual(index.stats()['pages'], 100)
+            self.assertEqual(pipeline.status()['steps'][0]['state'], 'running')
+        await pipeline.wait()
+        
+        self.assertEqual(pipeline.status()['steps'][0]['state'], 'done')
+        self.assertEqual(index.stats()['pages'], 100)
+        await pipeline.stop()
+    
+    async def test_streamable_http_client(self):
+        app = self.server.create_http_app()
+        
+        def client_factory(headers=None, timeout=None, auth=None):
+            return httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://testserver",
+                headers=headers, timeout=timeout, auth=auth
+            )
+        
+        async with app.router.lifespan_context(app):
+            async with streamablehttp_client(
+                "http://testserver/mcp", httpx_client_factory=client_factory
+            ) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as client:
+                    await client.initialize()
+                    tools = await client.list_tools()
+                    self.assertIn("search_notes", [tool.name for tool in tools.tools])
+                    
+                    results = await asyncio.gather(*[
+                        client.call_tool("search_notes", {"query": "python"}) for _ in range(3)
+                    ])
+                    for result in results:
+                        self.assertIn("note.md", result.content[0].text)
+
+
+if __name__ == '__main__':
+    unittest.main()
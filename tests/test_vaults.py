@@ -0,0 +1,101 @@
+import unittest
+from pathlib import Path
+import tempfile
+import shutil
+import os
+import re
+from src.tools.vaults import VaultRegistry
+from src.utils.corpus_export import CorpusExporter, iter_bundle
+from src.utils.file_utils import write_markdown_file
+
+
+class TestVaultRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.team_a = self.test_dir / "team_a"
+        self.team_b = self.test_dir / "team_b"
+        
+        write_markdown_file(self.team_a / "roadmap.md", "# Roadmap\n\nLaunch launch launch.")
+        write_markdown_file(self.team_b / "notes.md", "# Notes\n\nLaunch date pending.")
+        write_markdown_file(self.team_b / "other.md", "# Other\n\nNothing here.")
+        
+        self.vaults = VaultRegistry([
+            {'name': 'team-a', 'notes_path': self.team_a, 'logseq_path': self.test_dir / "logseq_a"},
+            {'name': 'team-b', 'notes_path': self.team_b}
+        ])
+    
+    def tearDown(self):
+        self.vaults.close()
+        shutil.rmtree(self.test_dir)
+    
+    def test_search_fans_out_and_merges(self):
+        results = self.vaults.search_notes("launch")
+        self.assertEqual([r['vault'] for r in results], ['team-a', 'team-b'])
+        self.assertGreater(results[0]['matches_count'], results[1]['matches_count'])
+    
+    def test_search_selected_vault(self):
+        results = self.vaults.search_notes("launch", vaults=['team-b'])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['relative_path'], 'notes.md')
+    
+    def test_search_invalid_pattern_raises_across_vaults(self):
+        with self.assertRaises(re.error):
+            self.vaults.search_notes("foo([")
+        with self.assertRaises(re.error):
+            self.vaults.search_notes("foo([", vaults=['team-b'])
+    
+    def test_refresh_is_per_vault(self):
+        self.vaults.search_notes("launch")
+        write_markdown_file(self.team_b / "new.md", "Launch party")
+        
+        self.vaults.refresh('team-b')
+        results = self.vaults.search_notes("party")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['vault'], 'team-b')
+    
+    def test_unknown_vault(self):
+        with self.assertRaises(ValueError):
+            self.vaults.get('missing')
+        with self.assertRaises(ValueError):
+            self.vaults.get_logseq('team-b')
+    
+    def test_export_corpus_incremental(self):
+        write_markdown_file(self.test_dir / "logseq_a" / "pages" / "Plan.md", "status:: draft\n\n- ship it")
+        write_markdown_file(self.team_a / "meta.md", "---\ntitle: \"Meta\"\n---\nBody")
+        exporter = CorpusExporter(self.test_dir / "exports", keep=2)
+        vaults = [self.vaults.get(name) for name in self.vaults.names()]
+        
+        full = exporter.export(vaults, compression='gzip')
+        records = list(iter_bundle(full['path']))
+        self.assertEqual(records[0]['kind'], 'header')
+        self.assertEqual(records[-1], {'kind': 'end', 'records': 5})
+        self.assertEqual(full['records'], {'note': 4, 'logseq_page': 1, 'deleted': 0})
+        documents = {(r['vault'], r['path']): r for r in records[1:-1]}
+        self.assertEqual(documents[('team-a', 'pages/Plan.md')]['properties'], {'status': ['draft']})
+        self.assertEqual(documents[('team-a', 'meta.md')]['properties'], {'title': 'Meta'})
+        self.assertEqual(documents[('team-b', 'notes.md')]['content'], "# Notes\n\nLaunch date pending.")
+        
+        write_markdown_file(self.team_b / "notes.md", "# Notes\n\nLaunch date set.")
+        os.utime(self.team_b / "notes.md", (1, 1))
+        (self.team_b / "other.md").unlink()
+        self.vaults.refresh()
+        delta = exporter.export(vaults, since=full['snapshot_id'], compression='none')
+        records = list(iter_bundle(delta['path']))[1:-1]
+        self.assertEqual(
+            [(r['kind'], r['path']) for r in records],
+            [('note', 'notes.md'), ('deleted', 'other.md')]
+        )
+        self.assertEqual(delta['unchanged'], 3)
+        
+        # An export since the delta sees nothing new; the oldest manifest is rotated out.
+        self.assertEqual(exporter.export(vaults, since=delta['snapshot_id'])['unchanged'], 4)
+        self.assertEqual(len(exporter.snapshots()), 2)
+        with self.assertRaises(ValueError):
+            exporter.export(vaults, since=full['snapshot_id'])
+        with self.assertRaises(ValueError):
+            exporter.export(vaults, since="../../etc/passwd")
+
+
+
+if __name__ == '__main__':
+    unittest.main()